@@ -6,6 +6,8 @@ from flask_limiter.util import get_remote_address
 from flask_mail import Mail
 import os
 import logging
+import time
+from contextlib import contextmanager
 from logging.handlers import RotatingFileHandler
 from datetime import timedelta
 
@@ -17,14 +19,30 @@ limiter = Limiter(
     default_limits=["100 per hour"]
 )
 
+@contextmanager
+def startup_phase(app, name):
+    """Record how long one step of create_app takes, in app.extensions['startup_timings']"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = app.extensions.setdefault('startup_timings', {})
+        timings[name] = round((time.perf_counter() - started) * 1000, 2)
+
 def create_app(config_name='development'):
     app = Flask(__name__)
     
     # Load configuration
-    load_config(app, config_name)
+    with startup_phase(app, 'config'):
+        load_config(app, config_name)
     
     # Initialize extensions
-    initialize_extensions(app)
+    with startup_phase(app, 'extensions'):
+        initialize_extensions(app)
+        
+        # Request profiling: SQL timing per fingerprint, N+1 detection, Server-Timing (sampled)
+        from .utils.profiling import init_app as init_profiling
+        init_profiling(app)
     
     # Setup logging
     setup_logging(app)
@@ -32,16 +50,62 @@ def create_app(config_name='development'):
     # Create upload directories
     setup_upload_directories(app)
     
-    # Initialize database
-    from .database import init_db
-    init_db()
+    with startup_phase(app, 'workers'):
+        # Password hashing pool (used by migrations for the default admin)
+        from .utils.passwords import configure_password_hasher
+        configure_password_hasher(
+            workers=app.config['PASSWORD_HASH_WORKERS'],
+            max_pending=app.config['PASSWORD_HASH_QUEUE'],
+            rounds=app.config['BCRYPT_ROUNDS'],
+            timeout=app.config['PASSWORD_HASH_TIMEOUT']
+        )
+        
+        # Image variant workers (thumbnails, responsive widths, WebP/AVIF)
+        from .utils.images import configure_image_processor
+        configure_image_processor(
+            workers=app.config['IMAGE_WORKERS'],
+            widths=app.config['IMAGE_VARIANT_WIDTHS'],
+            thumbnail_sizes=app.config['IMAGE_THUMBNAIL_SIZES'],
+            avatar_sizes=app.config['AVATAR_SIZES'],
+            formats=app.config['IMAGE_VARIANT_FORMATS'],
+            quality=app.config['IMAGE_QUALITY'],
+            max_dimension=app.config['IMAGE_MAX_DIMENSION']
+        )
+    
+    # Initialize database; the schema is migrated by `flask db migrate` unless AUTO_MIGRATE is set
+    with startup_phase(app, 'database'):
+        from .database import init_app as init_database
+        from .migrations import check_schema, migrate
+        init_database(app)
+        if app.config['AUTO_MIGRATE']:
+            migrate()
+        else:
+            pending = check_schema()
+            if pending:
+                app.logger.warning('Database schema is %d migration(s) behind; run `flask db migrate`', len(pending))
+    
+    with startup_phase(app, 'caches'):
+        # Response cache for public read endpoints
+        from .utils.cache import init_app as init_response_cache
+        init_response_cache(app)
+        
+        from .utils.permissions import configure_principal_cache
+        from .utils.hierarchy import configure_hierarchy
+        configure_principal_cache(app.config['PRINCIPAL_CACHE_TTL'])
+        configure_hierarchy(app.config['HIERARCHY_MAX_AGE'])
     
     # Register blueprints
-    register_blueprints(app)
+    with startup_phase(app, 'blueprints'):
+        register_blueprints(app)
     
     # Setup error handlers
     setup_error_handlers(app)
     
+    # CLI commands (flask db migrate / status / counters)
+    from .cli import register_commands
+    register_commands(app)
+    
+    app.logger.info('Startup timings (ms): %s', app.extensions['startup_timings'])
     return app
 
 def load_config(app, config_name):
@@ -52,9 +116,26 @@ def load_config(app, config_name):
     # Basic Flask config
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
     app.config['DATABASE_URL'] = os.environ.get('DATABASE_URL', 'sqlite:///university.db')
-    app.config['UPLOAD_FOLDER'] = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'uploads')
+    app.config['UPLOAD_FOLDER'] = os.environ.get(
+        'UPLOAD_FOLDER', os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'uploads')
+    )
     app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_CONTENT_LENGTH', 16 * 1024 * 1024))
     
+    # Apply pending migrations in create_app (off in production: run `flask db migrate` once per deploy)
+    app.config['AUTO_MIGRATE'] = os.environ.get(
+        'AUTO_MIGRATE', 'False' if config_name == 'production' else 'True'
+    ).lower() == 'true'
+    
+    # Database connection pool and SQLite tuning
+    app.config['DATABASE_POOL_SIZE'] = int(os.environ.get('DATABASE_POOL_SIZE', 10))
+    app.config['DATABASE_POOL_TIMEOUT'] = float(os.environ.get('DATABASE_POOL_TIMEOUT', 30))
+    app.config['DATABASE_POOL_RECYCLE'] = int(os.environ.get('DATABASE_POOL_RECYCLE', 3600))
+    app.config['SQLITE_SYNCHRONOUS'] = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    app.config['SQLITE_CACHE_SIZE'] = int(os.environ.get('SQLITE_CACHE_SIZE', -16000))  # negative = KiB
+    app.config['SQLITE_MMAP_SIZE'] = int(os.environ.get('SQLITE_MMAP_SIZE', 128 * 1024 * 1024))
+    app.config['SQLITE_BUSY_TIMEOUT'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))  # ms
+    app.config['SQLITE_STATEMENT_CACHE'] = int(os.environ.get('SQLITE_STATEMENT_CACHE', 256))
+    
     # JWT Configuration
     app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'jwt-secret-change-in-production')
     app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(seconds=int(os.environ.get('JWT_ACCESS_TOKEN_EXPIRES', 3600)))
@@ -75,6 +156,97 @@ def load_config(app, config_name):
     app.config['MAIL_USERNAME'] = os.environ.get('MAIL_USERNAME')
     app.config['MAIL_PASSWORD'] = os.environ.get('MAIL_PASSWORD')
     
+    # Analytics ingest buffering
+    app.config['ANALYTICS_BUFFER_SIZE'] = int(os.environ.get('ANALYTICS_BUFFER_SIZE', 10000))
+    app.config['ANALYTICS_BATCH_SIZE'] = int(os.environ.get('ANALYTICS_BATCH_SIZE', 500))
+    app.config['ANALYTICS_FLUSH_INTERVAL'] = float(os.environ.get('ANALYTICS_FLUSH_INTERVAL', 1.0))
+    app.config['ANALYTICS_OVERFLOW_POLICY'] = os.environ.get('ANALYTICS_OVERFLOW_POLICY', 'reject')  # or drop_oldest
+    # Count unique visitors with COUNT(DISTINCT) instead of HyperLogLog sketches
+    app.config['ANALYTICS_EXACT_UNIQUES'] = os.environ.get('ANALYTICS_EXACT_UNIQUES', 'False').lower() == 'true'
+    
+    app.config['USER_AGENT_CACHE_SIZE'] = int(os.environ.get('USER_AGENT_CACHE_SIZE', 4096))
+    
+    # Real-time analytics (set a Redis URL to share counters across workers)
+    app.config['REALTIME_REDIS_URL'] = os.environ.get('REALTIME_REDIS_URL')
+    app.config['REALTIME_STREAM_INTERVAL'] = float(os.environ.get('REALTIME_STREAM_INTERVAL', 5))
+    
+    # Write-behind news view and file download counters
+    app.config['COUNTER_FLUSH_INTERVAL'] = float(os.environ.get('COUNTER_FLUSH_INTERVAL', 5.0))
+    
+    # Activity audit log (queued, batched, spilled to a file while the database is locked)
+    app.config['AUDIT_BUFFER_SIZE'] = int(os.environ.get('AUDIT_BUFFER_SIZE', 50000))
+    app.config['AUDIT_BATCH_SIZE'] = int(os.environ.get('AUDIT_BATCH_SIZE', 200))
+    app.config['AUDIT_FLUSH_INTERVAL'] = float(os.environ.get('AUDIT_FLUSH_INTERVAL', 1.0))
+    # Relative paths are resolved against the instance folder
+    app.config['AUDIT_SPILL_PATH'] = os.environ.get('AUDIT_SPILL_PATH', 'audit_spill.jsonl')
+    
+    # File serving: '' streams from the app, 'x-accel' (nginx) or 'x-sendfile' hands files to the proxy
+    app.config['FILE_SERVE_OFFLOAD'] = os.environ.get('FILE_SERVE_OFFLOAD', '')
+    app.config['FILE_SERVE_ACCEL_PREFIX'] = os.environ.get('FILE_SERVE_ACCEL_PREFIX', '/protected-uploads')
+    app.config['FILE_CACHE_MAX_AGE'] = int(os.environ.get('FILE_CACHE_MAX_AGE', 31536000))
+    
+    # Resumable chunked document uploads (each chunk must also fit in MAX_CONTENT_LENGTH)
+    app.config['CHUNKED_UPLOAD_CHUNK_SIZE'] = int(os.environ.get('CHUNKED_UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024))
+    app.config['CHUNKED_UPLOAD_MAX_SIZE'] = int(os.environ.get('CHUNKED_UPLOAD_MAX_SIZE', 1024 * 1024 * 1024))
+    app.config['CHUNKED_UPLOAD_TTL'] = int(os.environ.get('CHUNKED_UPLOAD_TTL', 86400))
+    
+    # Image variants; formats are listed best first, the last one is the <img src> fallback
+    app.config['IMAGE_WORKERS'] = int(os.environ.get('IMAGE_WORKERS', 2))
+    app.config['IMAGE_VARIANT_WIDTHS'] = [int(w) for w in os.environ.get('IMAGE_VARIANT_WIDTHS', '320,640,1280').split(',') if w]
+    app.config['IMAGE_THUMBNAIL_SIZES'] = [int(s) for s in os.environ.get('IMAGE_THUMBNAIL_SIZES', '150').split(',') if s]
+    app.config['AVATAR_SIZES'] = [int(s) for s in os.environ.get('AVATAR_SIZES', '150,300').split(',') if s]
+    app.config['IMAGE_VARIANT_FORMATS'] = [f for f in os.environ.get('IMAGE_VARIANT_FORMATS', 'webp,jpeg').split(',') if f]
+    app.config['IMAGE_QUALITY'] = int(os.environ.get('IMAGE_QUALITY', 82))
+    # Uploads over IMAGE_MAX_PIXELS are refused; the worker publishes a copy without metadata
+    # shrunk to fit IMAGE_MAX_DIMENSION, never the uploaded file itself
+    app.config['IMAGE_MAX_PIXELS'] = int(os.environ.get('IMAGE_MAX_PIXELS', 50000000))
+    app.config['IMAGE_MAX_DIMENSION'] = int(os.environ.get('IMAGE_MAX_DIMENSION', 2048))
+    # Sizes allowed for ?w=/?h= on image URLs, and the byte cap of the resized image cache
+    app.config['IMAGE_TRANSFORM_SIZES'] = [int(s) for s in os.environ.get('IMAGE_TRANSFORM_SIZES', '64,150,320,480,640,960,1280').split(',') if s]
+    app.config['IMAGE_TRANSFORM_CACHE_SIZE'] = int(os.environ.get('IMAGE_TRANSFORM_CACHE_SIZE', 512 * 1024 * 1024))
+    
+    # Password hashing (bcrypt cost factor; workers=0 hashes on the request thread)
+    app.config['BCRYPT_ROUNDS'] = int(os.environ.get('BCRYPT_ROUNDS', 12))
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+    app.config['PASSWORD_HASH_QUEUE'] = int(os.environ.get('PASSWORD_HASH_QUEUE', 32))
+    app.config['PASSWORD_HASH_TIMEOUT'] = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))
+    
+    # Seconds a resolved user principal (role, scope, grants) is reused across requests
+    app.config['PRINCIPAL_CACHE_TTL'] = float(os.environ.get('PRINCIPAL_CACHE_TTL', 30))
+    # Seconds before a worker reloads the college/faculty/department index written by another worker
+    app.config['HIERARCHY_MAX_AGE'] = float(os.environ.get('HIERARCHY_MAX_AGE', 60))
+    
+    # Response cache for public GET endpoints (set a Redis URL to share it across workers).
+    # Without Redis, entries stay per process and tag versions are shared through the
+    # cache_tags table so a write in one worker invalidates the copies in all of them.
+    app.config['RESPONSE_CACHE_ENABLED'] = os.environ.get('RESPONSE_CACHE_ENABLED', 'True').lower() == 'true'
+    app.config['RESPONSE_CACHE_SIZE'] = int(os.environ.get('RESPONSE_CACHE_SIZE', 1024))
+    app.config['RESPONSE_CACHE_TTL'] = int(os.environ.get('RESPONSE_CACHE_TTL', 300))
+    app.config['RESPONSE_CACHE_REDIS_URL'] = os.environ.get('RESPONSE_CACHE_REDIS_URL')
+    app.config['RESPONSE_CACHE_SHARED_TAGS'] = os.environ.get('RESPONSE_CACHE_SHARED_TAGS', 'True').lower() == 'true'
+    
+    # Request profiling (sample a fraction of requests in production)
+    app.config['PROFILING_ENABLED'] = os.environ.get('PROFILING_ENABLED', 'False').lower() == 'true'
+    app.config['PROFILING_SAMPLE_RATE'] = float(os.environ.get(
+        'PROFILING_SAMPLE_RATE', 0.01 if config_name == 'production' else 1.0
+    ))
+    # Same query issued this many times in one request is reported as a likely N+1
+    app.config['PROFILING_N_PLUS_ONE_THRESHOLD'] = int(os.environ.get('PROFILING_N_PLUS_ONE_THRESHOLD', 10))
+    app.config['PROFILING_SERVER_TIMING'] = os.environ.get(
+        'PROFILING_SERVER_TIMING', 'False' if config_name == 'production' else 'True'
+    ).lower() == 'true'
+    
+    # Seconds the admin dashboard snapshot is served before it is recomputed
+    app.config['DASHBOARD_SNAPSHOT_MAX_AGE'] = float(os.environ.get('DASHBOARD_SNAPSHOT_MAX_AGE', 60))
+    
+    # Prometheus metrics at /metrics (set a token to require `Authorization: Bearer <token>`)
+    app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED', 'True').lower() == 'true'
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+    
+    # List pagination (?total=cached / ?total=estimate)
+    app.config['PAGINATION_COUNT_CACHE_TTL'] = float(os.environ.get('PAGINATION_COUNT_CACHE_TTL', 30))
+    app.config['PAGINATION_ESTIMATE_LIMIT'] = int(os.environ.get('PAGINATION_ESTIMATE_LIMIT', 10000))
+    
     # File upload configuration
     app.config['ALLOWED_EXTENSIONS'] = set(os.environ.get('ALLOWED_EXTENSIONS', 'jpg,jpeg,png,gif,pdf,doc,docx').split(','))
 
@@ -119,7 +291,7 @@ def setup_logging(app):
 def setup_upload_directories(app):
     """Create upload directories"""
     upload_folder = app.config['UPLOAD_FOLDER']
-    directories = ['images', 'documents', 'avatars', 'temp']
+    directories = ['images', 'documents', 'avatars', 'blobs', 'temp']
     
     for directory in directories:
         dir_path = os.path.join(upload_folder, directory)
@@ -146,6 +318,10 @@ def register_blueprints(app):
     app.register_blueprint(incubator_bp, url_prefix='/api/incubator')
     app.register_blueprint(uploads_bp, url_prefix='/api/uploads')
     app.register_blueprint(admin_bp, url_prefix='/api/admin')
+    
+    if app.config['METRICS_ENABLED']:
+        from .routes.metrics import metrics_bp
+        app.register_blueprint(metrics_bp)
 
 def setup_error_handlers(app):
     """Setup error handlers"""
@@ -0,0 +1,60 @@
+import click
+from .migrations import current_version, latest_version, migrate, pending_migrations
+
+def register_commands(app):
+    """Register the ``flask db`` command group"""
+
+    @app.cli.group()
+    def db():
+        """Database schema commands"""
+
+    @db.command('migrate')
+    @click.option('--target', type=int, default=None, help='Stop at this schema version')
+    def migrate_command(target):
+        """Apply pending schema migrations"""
+        applied = migrate(target)
+        for number, name in applied:
+            click.echo(f'Applied {number:04d} {name}')
+        click.echo(f'Schema is at version {status()[0]}' if applied else 'Schema is up to date')
+
+    @db.command('status')
+    def status_command():
+        """Show the current schema version and pending migrations"""
+        version, pending = status()
+        click.echo(f'Schema version {version} (latest {latest_version()})')
+        for number, name in pending:
+            click.echo(f'Pending {number:04d} {name}')
+
+    @db.command('counters')
+    @click.option('--repair', is_flag=True, help='Fix drifted counts and install triggers for new tables')
+    def counters_command(repair):
+        """Check trigger-maintained counters against real counts"""
+        from .database import get_db_connection
+        from .utils.counters import install_counters, verify_counters
+        with get_db_connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                installed = install_counters(conn) if repair else []
+                results = verify_counters(conn, repair=repair)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        for name in installed:
+            click.echo(f'Installed {name}')
+        for result in results:
+            if not result['drifted']:
+                click.echo(f"OK {result['counter']}")
+                continue
+            state = 'repaired' if result['repaired'] else 'drifted'
+            examples = ', '.join(f'id {row_id}: {stored} != {actual}' for row_id, stored, actual in result['examples'])
+            click.echo(f"{state.upper()} {result['counter']}: {result['drifted']} row(s) ({examples})")
+        if not results:
+            click.echo('No counters installed (their tables are not in this database)')
+        if not repair and any(result['drifted'] for result in results):
+            raise click.exceptions.Exit(1)
+    
+    def status():
+        from .database import get_db_connection
+        with get_db_connection() as conn:
+            return current_version(conn), pending_migrations(conn)
@@ -1,313 +1,716 @@
 import sqlite3
 import os
-import bcrypt
+import queue
+import threading
+import time
 from datetime import datetime
-from contextlib import contextmanager
+from .utils.audit import audit_log, log_activity
+from .utils.blobstore import create_blob_table
+from .utils.resumable import create_session_table
+from .utils.hierarchy import create_closure_table, refresh_hierarchy
+from .utils.passwords import hash_password, verify_password
+from .utils.profiling import current_profile
+from .utils.rollups import create_rollup_tables
+from .utils.search import create_news_search_index
 
 DATABASE_PATH = 'university.db'
 
-@contextmanager
-def get_db_connection():
-    """Context manager for database connections"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
-    try:
-        yield conn
-    except Exception:
-        conn.rollback()
-        raise
-    finally:
-        conn.close()
+SYNCHRONOUS_MODES = {'OFF', 'NORMAL', 'FULL', 'EXTRA'}
 
-def hash_password(password):
-    """Hash password using bcrypt"""
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+class PoolTimeoutError(sqlite3.OperationalError):
+    """Raised when no pooled connection becomes available in time"""
 
-def verify_password(password, hashed):
-    """Verify password against hash"""
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+class PooledConnection:
+    """A pooled sqlite3 connection.
 
-def init_db():
-    """Initialize database with all tables"""
-    with get_db_connection() as conn:
-        # Users table with enhanced role management
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                email TEXT UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL,
-                name TEXT NOT NULL,
-                role TEXT NOT NULL DEFAULT 'department_admin',
-                college_id INTEGER,
-                faculty_id INTEGER,
-                department_id INTEGER,
-                is_active BOOLEAN DEFAULT 1,
-                last_login TIMESTAMP,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (college_id) REFERENCES colleges (id),
-                FOREIGN KEY (faculty_id) REFERENCES faculties (id),
-                FOREIGN KEY (department_id) REFERENCES departments (id)
-            )
-        ''')
-        
-        # Add missing columns to existing users table if they don't exist
-        try:
-            conn.execute('ALTER TABLE users ADD COLUMN college_id INTEGER')
-        except sqlite3.OperationalError:
-            pass  # Column already exists
-            
-        try:
-            conn.execute('ALTER TABLE users ADD COLUMN department_id INTEGER')
-        except sqlite3.OperationalError:
-            pass  # Column already exists
-        
-        # Page views table for analytics
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS page_views (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                page TEXT NOT NULL,
-                title TEXT,
-                referrer TEXT,
-                referrer_domain TEXT,
-                ip_address TEXT,
-                user_agent TEXT,
-                device_type TEXT, -- mobile, tablet, desktop
-                browser TEXT,
-                os TEXT,
-                screen_resolution TEXT,
-                language TEXT,
-                session_id TEXT,
-                user_id INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            )
-        ''')
-        
-        # User sessions table
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS user_sessions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                session_id TEXT UNIQUE NOT NULL,
-                ip_address TEXT,
-                user_agent TEXT,
-                device_type TEXT,
-                browser TEXT,
-                os TEXT,
-                country TEXT,
-                city TEXT,
-                first_visit TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_activity TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                page_views INTEGER DEFAULT 0,
-                duration INTEGER DEFAULT 0, -- in seconds
-                is_bounce BOOLEAN DEFAULT 1,
-                user_id INTEGER,
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            )
-        ''')
+    Works both as a context manager (``with get_db_connection() as conn``) and
+    as a plain connection whose ``close()`` hands it back to the pool.
+
+    A nested checkout that starts while the caller has uncommitted work runs
+    inside a SAVEPOINT: its ``commit()`` folds its writes into the caller's
+    transaction, and its ``rollback()`` (or an exception leaving the ``with``
+    block) undoes only its own writes. Only the outermost scope really
+    commits or rolls back.
+    """
+
+    __slots__ = ('_pool', '_conn', 'created_at', 'checked_out_at', 'depth', 'traced', 'savepoints')
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+        self.created_at = time.monotonic()
+        self.checked_out_at = None
+        self.depth = 0
+        self.traced = False
+        self.savepoints = []  # One entry per nested scope: its savepoint name, or None
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def execute(self, sql, parameters=()):
+        profile = current_profile()
+        if profile is None:
+            return self._conn.execute(sql, parameters)
+        return profile.execute(self._conn, 'execute', sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        profile = current_profile()
+        if profile is None:
+            return self._conn.executemany(sql, seq_of_parameters)
+        return profile.execute(self._conn, 'executemany', sql, seq_of_parameters)
+
+    def _savepoint(self):
+        return self.savepoints[-1] if self.savepoints else None
+
+    def commit(self):
+        savepoint = self._savepoint()
+        if savepoint is None:
+            self._conn.commit()
+        else:
+            # Keep the writes in the caller's transaction and start a fresh savepoint
+            self._conn.execute(f'RELEASE SAVEPOINT {savepoint}')
+            self._conn.execute(f'SAVEPOINT {savepoint}')
+
+    def rollback(self):
+        savepoint = self._savepoint()
+        if savepoint is None or not self._conn.in_transaction:
+            self._conn.rollback()
+        else:
+            self._conn.execute(f'ROLLBACK TO SAVEPOINT {savepoint}')
+
+    def enter_scope(self):
+        """Start a nested checkout, under a savepoint if the caller has uncommitted work"""
+        self.depth += 1
+        savepoint = None
+        if self._conn.in_transaction:
+            savepoint = f'checkout_{self.depth}'
+            self._conn.execute(f'SAVEPOINT {savepoint}')
+        self.savepoints.append(savepoint)
+
+    def exit_scope(self):
+        """End a nested checkout, keeping whatever its savepoint still holds"""
+        self.depth -= 1
+        savepoint = self.savepoints.pop() if self.savepoints else None
+        if savepoint is not None and self._conn.in_transaction:
+            try:
+                self._conn.execute(f'RELEASE SAVEPOINT {savepoint}')
+            except sqlite3.OperationalError:
+                pass  # The transaction holding it already ended
+
+    def close(self):
+        """Return the connection to the pool"""
+        self._pool.release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.rollback()
+        self.close()
+        return False
+
+class ConnectionPool:
+    """Bounded pool of WAL-mode SQLite connections.
+
+    Idle connections are kept in a LIFO queue so the most recently used (and
+    therefore cache-warm) connection is handed out first. A thread that already
+    holds a connection gets the same one back on nested checkouts, so helpers
+    join the caller's transaction (under a savepoint) instead of waiting on
+    its write lock.
+    """
+
+    def __init__(self, database, size=10, timeout=30.0, recycle=3600,
+                 synchronous='NORMAL', cache_size=-16000, mmap_size=134217728,
+                 busy_timeout=5000, cached_statements=256):
+        synchronous = str(synchronous).upper()
+        if synchronous not in SYNCHRONOUS_MODES:
+            raise ValueError(f'Invalid SQLite synchronous mode: {synchronous}')
         
-        # Roles and permissions table
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS roles (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT UNIQUE NOT NULL,
-                description TEXT,
-                permissions TEXT, -- JSON string of permissions
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+        self.database = database
+        self.size = max(int(size), 1)
+        self.timeout = float(timeout)
+        self.recycle = recycle
+        self.synchronous = synchronous
+        self.cache_size = int(cache_size)
+        self.mmap_size = int(mmap_size)
+        self.busy_timeout = int(busy_timeout)
+        self.cached_statements = int(cached_statements)
         
-        # User permissions table
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS user_permissions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                resource_type TEXT NOT NULL, -- 'faculty', 'department', 'news', etc.
-                resource_id INTEGER,
-                permission TEXT NOT NULL, -- 'read', 'write', 'delete', 'admin'
-                granted_by INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (id),
-                FOREIGN KEY (granted_by) REFERENCES users (id)
-            )
-        ''')
+        self._idle = queue.LifoQueue()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._closed = False
         
-        # Colleges table (multiple colleges support)
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS colleges (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                name_ar TEXT,
-                name_fr TEXT,
-                description TEXT,
-                description_ar TEXT,
-                description_fr TEXT,
-                logo TEXT,
-                website_url TEXT,
-                contact_email TEXT,
-                contact_phone TEXT,
-                address TEXT,
-                established_year INTEGER,
-                is_active BOOLEAN DEFAULT 1,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+        # Metrics
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._timeouts = 0
+        self._created = 0
+        self._recycled = 0
+        self._in_use = 0
+        self._hold_time = 0.0
+        self._releases = 0
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.database,
+            timeout=self.busy_timeout / 1000,
+            check_same_thread=False,
+            cached_statements=self.cached_statements
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(f'PRAGMA synchronous={self.synchronous}')
+        conn.execute(f'PRAGMA cache_size={self.cache_size}')
+        conn.execute(f'PRAGMA mmap_size={self.mmap_size}')
+        conn.execute(f'PRAGMA busy_timeout={self.busy_timeout}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        with self._lock:
+            self._created += 1
+        return PooledConnection(self, conn)
+
+    def _expired(self, pooled):
+        return self.recycle and time.monotonic() - pooled.created_at > self.recycle
+
+    def _discard(self, pooled):
+        try:
+            pooled._conn.close()
+        finally:
+            with self._lock:
+                self._opened -= 1
+
+    def acquire(self):
+        """Check out a connection, blocking up to ``timeout`` seconds"""
+        pooled = getattr(self._local, 'conn', None)
+        if pooled is not None:
+            pooled.enter_scope()
+            return pooled
         
-        # Faculties table (updated to belong to colleges)
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS faculties (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                college_id INTEGER NOT NULL,
-                name TEXT NOT NULL,
-                name_ar TEXT,
-                name_fr TEXT,
-                description TEXT,
-                description_ar TEXT,
-                description_fr TEXT,
-                image TEXT,
-                dean_name TEXT,
-                contact_email TEXT,
-                contact_phone TEXT,
-                students_count INTEGER DEFAULT 0,
-                departments_count INTEGER DEFAULT 0,
-                is_active BOOLEAN DEFAULT 1,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (college_id) REFERENCES colleges (id)
-            )
-        ''')
+        if self._closed:
+            raise sqlite3.ProgrammingError('Connection pool is closed')
         
-        # Enhanced news table
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS news (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT NOT NULL,
-                title_ar TEXT,
-                title_fr TEXT,
-                content TEXT NOT NULL,
-                content_ar TEXT,
-                content_fr TEXT,
-                excerpt TEXT,
-                excerpt_ar TEXT,
-                excerpt_fr TEXT,
-                image TEXT,
-                category TEXT DEFAULT 'general',
-                tags TEXT, -- JSON array of tags
-                author_id INTEGER NOT NULL,
-                author_name TEXT NOT NULL,
-                college_id INTEGER,
-                faculty_id INTEGER,
-                department_id INTEGER,
-                is_published BOOLEAN DEFAULT 1,
-                is_featured BOOLEAN DEFAULT 0,
-                publish_date TIMESTAMP,
-                views_count INTEGER DEFAULT 0,
-                likes_count INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (author_id) REFERENCES users (id),
-                FOREIGN KEY (college_id) REFERENCES colleges (id),
-                FOREIGN KEY (faculty_id) REFERENCES faculties (id),
-                FOREIGN KEY (department_id) REFERENCES departments (id)
-            )
-        ''')
+        acquire_started = time.perf_counter()
+        pooled = None
+        try:
+            pooled = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_open = self._opened < self.size
+                if can_open:
+                    self._opened += 1
+            if can_open:
+                try:
+                    pooled = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._opened -= 1
+                    raise
+            else:
+                started = time.perf_counter()
+                try:
+                    pooled = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    with self._lock:
+                        self._timeouts += 1
+                    raise PoolTimeoutError(
+                        f'Timed out after {self.timeout}s waiting for a database connection'
+                    )
+                finally:
+                    with self._lock:
+                        self._waits += 1
+                        self._wait_time += time.perf_counter() - started
         
-        # Enhanced files table with security features
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS files (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                filename TEXT NOT NULL,
-                original_filename TEXT NOT NULL,
-                file_path TEXT NOT NULL,
-                file_type TEXT NOT NULL,
-                file_size INTEGER NOT NULL,
-                mime_type TEXT NOT NULL,
-                file_hash TEXT NOT NULL,
-                uploaded_by INTEGER NOT NULL,
-                category TEXT DEFAULT 'general',
-                description TEXT,
-                college_id INTEGER,
-                faculty_id INTEGER,
-                department_id INTEGER,
-                is_public BOOLEAN DEFAULT 0,
-                is_scanned BOOLEAN DEFAULT 0,
-                scan_result TEXT,
-                download_count INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (uploaded_by) REFERENCES users (id),
-                FOREIGN KEY (college_id) REFERENCES colleges (id),
-                FOREIGN KEY (faculty_id) REFERENCES faculties (id),
-                FOREIGN KEY (department_id) REFERENCES departments (id)
-            )
-        ''')
-
-        # File access logs for audit trail
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS file_access_logs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                file_id INTEGER NOT NULL,
-                user_id INTEGER,
-                action TEXT NOT NULL, -- 'download', 'view', 'delete'
-                ip_address TEXT,
-                user_agent TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (file_id) REFERENCES files (id),
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            )
-        ''')
-
-        # Quarantine table for suspicious files
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS quarantine_files (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                original_file_id INTEGER,
-                filename TEXT NOT NULL,
-                file_path TEXT NOT NULL,
-                reason TEXT NOT NULL,
-                detected_by TEXT,
-                quarantined_by INTEGER NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (quarantined_by) REFERENCES users (id)
-            )
-        ''')
+        if self._expired(pooled):
+            self._discard(pooled)
+            with self._lock:
+                self._opened += 1
+                self._recycled += 1
+            try:
+                pooled = self._connect()
+            except Exception:
+                with self._lock:
+                    self._opened -= 1
+                raise
         
-        # Activity logs for audit trail
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS activity_logs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                action TEXT NOT NULL,
-                resource_type TEXT,
-                resource_id INTEGER,
-                details TEXT,
-                ip_address TEXT,
-                user_agent TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            )
-        ''')
+        pooled.depth = 1
+        pooled.checked_out_at = time.perf_counter()
+        self._local.conn = pooled
+        profile = current_profile()
+        if profile is not None:
+            # Sampled request: charge the wait to it and trace every statement SQLite runs
+            profile.connect += pooled.checked_out_at - acquire_started
+            pooled._conn.set_trace_callback(profile.trace)
+            pooled.traced = True
+        with self._lock:
+            self._checkouts += 1
+            self._in_use += 1
+        return pooled
+
+    def release(self, pooled):
+        """Return a connection to the pool once its outermost checkout ends"""
+        if pooled.depth <= 0:
+            return
+        if pooled.depth > 1:
+            pooled.exit_scope()
+            return
+        pooled.depth = 0
+        pooled.savepoints.clear()
         
-        # Create indexes for better performance
-        conn.execute('CREATE INDEX IF NOT EXISTS idx_page_views_page ON page_views(page)')
-        conn.execute('CREATE INDEX IF NOT EXISTS idx_page_views_created_at ON page_views(created_at)')
-        conn.execute('CREATE INDEX IF NOT EXISTS idx_page_views_ip ON page_views(ip_address)')
-        conn.execute('CREATE INDEX IF NOT EXISTS idx_user_sessions_session_id ON user_sessions(session_id)')
-        conn.execute('CREATE INDEX IF NOT EXISTS idx_activity_logs_user_id ON activity_logs(user_id)')
-        conn.execute('CREATE INDEX IF NOT EXISTS idx_activity_logs_created_at ON activity_logs(created_at)')
+        if getattr(self._local, 'conn', None) is pooled:
+            self._local.conn = None
+        with self._lock:
+            self._in_use -= 1
+            self._releases += 1
+            self._hold_time += time.perf_counter() - pooled.checked_out_at
         
-        # Create default roles
-        create_default_roles(conn)
+        if pooled.traced:
+            pooled._conn.set_trace_callback(None)
+            pooled.traced = False
         
-        # Create default admin user if not exists
-        create_default_admin(conn)
+        try:
+            # Uncommitted work is discarded, just like closing a connection
+            if pooled._conn.in_transaction:
+                pooled._conn.rollback()
+        except sqlite3.Error:
+            self._discard(pooled)
+            return
         
-        # Create sample college if not exists
-        create_sample_data(conn)
+        if self._closed or self._expired(pooled):
+            self._discard(pooled)
+            if not self._closed:
+                with self._lock:
+                    self._recycled += 1
+            return
+        self._idle.put(pooled)
+
+    def release_thread_connection(self):
+        """Release whatever connection the current thread still holds"""
+        pooled = getattr(self._local, 'conn', None)
+        if pooled is not None:
+            pooled.depth = 1
+            self.release(pooled)
+
+    def close(self):
+        """Close all idle connections; in-use ones are closed on release"""
+        self._closed = True
+        while True:
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(pooled)
+
+    def stats(self):
+        """Return a snapshot of pool metrics"""
+        now = time.monotonic()
+        idle = list(self._idle.queue)
+        with self._lock:
+            return {
+                'size': self.size,
+                'open': self._opened,
+                'in_use': self._in_use,
+                'idle': len(idle),
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'avg_wait_ms': round(self._wait_time / self._waits * 1000, 3) if self._waits else 0.0,
+                'timeouts': self._timeouts,
+                'connections_created': self._created,
+                'connections_recycled': self._recycled,
+                'avg_checkout_ms': round(self._hold_time / self._releases * 1000, 3) if self._releases else 0.0,
+                'max_idle_connection_age': round(max((now - c.created_at for c in idle), default=0.0), 1),
+                'recycle_after': self.recycle
+            }
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Return the process-wide connection pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DATABASE_PATH)
+    return _pool
+
+def configure_pool(database=None, **options):
+    """Replace the process-wide pool with one built from ``options``"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool = ConnectionPool(database or DATABASE_PATH, **options)
+    return _pool
+
+def init_app(app):
+    """Configure the connection pool from app config and release leaked checkouts"""
+    configure_pool(
+        size=app.config.get('DATABASE_POOL_SIZE', 10),
+        timeout=app.config.get('DATABASE_POOL_TIMEOUT', 30),
+        recycle=app.config.get('DATABASE_POOL_RECYCLE', 3600),
+        synchronous=app.config.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        cache_size=app.config.get('SQLITE_CACHE_SIZE', -16000),
+        mmap_size=app.config.get('SQLITE_MMAP_SIZE', 134217728),
+        busy_timeout=app.config.get('SQLITE_BUSY_TIMEOUT', 5000),
+        cached_statements=app.config.get('SQLITE_STATEMENT_CACHE', 256)
+    )
+    
+    spill_path = app.config.get('AUDIT_SPILL_PATH')
+    if spill_path:
+        spill_path = os.path.join(app.instance_path, spill_path)
+    audit_log.configure(
+        spill_path=spill_path,
+        capacity=app.config.get('AUDIT_BUFFER_SIZE', 50000),
+        batch_size=app.config.get('AUDIT_BATCH_SIZE', 200),
+        flush_interval=app.config.get('AUDIT_FLUSH_INTERVAL', 1.0)
+    )
+    
+    @app.teardown_appcontext
+    def release_db_connection(exception=None):
+        get_pool().release_thread_connection()
+
+def get_db_connection():
+    """Check out a pooled database connection"""
+    return get_pool().acquire()
+
+def get_pool_stats():
+    """Return connection pool metrics"""
+    return get_pool().stats()
+
+def init_db():
+    """Initialize database with all tables (applies any pending migrations)"""
+    from .migrations import migrate
+    return migrate()
+
+def create_schema(conn):
+    """Create the baseline schema: every table, index and default row"""
+    # Users table with enhanced role management
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            name TEXT NOT NULL,
+            role TEXT NOT NULL DEFAULT 'department_admin',
+            college_id INTEGER,
+            faculty_id INTEGER,
+            department_id INTEGER,
+            is_active BOOLEAN DEFAULT 1,
+            last_login TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (college_id) REFERENCES colleges (id),
+            FOREIGN KEY (faculty_id) REFERENCES faculties (id),
+            FOREIGN KEY (department_id) REFERENCES departments (id)
+        )
+    ''')
+    
+    # Add missing columns to existing users table if they don't exist
+    try:
+        conn.execute('ALTER TABLE users ADD COLUMN college_id INTEGER')
+    except sqlite3.OperationalError:
+        pass  # Column already exists
         
-        conn.commit()
+    try:
+        conn.execute('ALTER TABLE users ADD COLUMN department_id INTEGER')
+    except sqlite3.OperationalError:
+        pass  # Column already exists
+    
+    try:
+        conn.execute('ALTER TABLE users ADD COLUMN avatar_url TEXT')
+    except sqlite3.OperationalError:
+        pass  # Column already exists
+    
+    # Page views table for analytics
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS page_views (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            page TEXT NOT NULL,
+            title TEXT,
+            referrer TEXT,
+            referrer_domain TEXT,
+            ip_address TEXT,
+            user_agent TEXT,
+            device_type TEXT, -- mobile, tablet, desktop
+            browser TEXT,
+            os TEXT,
+            screen_resolution TEXT,
+            language TEXT,
+            session_id TEXT,
+            user_id INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    
+    # User sessions table
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_sessions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT UNIQUE NOT NULL,
+            ip_address TEXT,
+            user_agent TEXT,
+            device_type TEXT,
+            browser TEXT,
+            os TEXT,
+            country TEXT,
+            city TEXT,
+            first_visit TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_activity TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            page_views INTEGER DEFAULT 0,
+            duration INTEGER DEFAULT 0, -- in seconds
+            is_bounce BOOLEAN DEFAULT 1,
+            user_id INTEGER,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    
+    # Roles and permissions table
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS roles (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL,
+            description TEXT,
+            permissions TEXT, -- JSON string of permissions
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # User permissions table
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_permissions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            resource_type TEXT NOT NULL, -- 'faculty', 'department', 'news', etc.
+            resource_id INTEGER,
+            permission TEXT NOT NULL, -- 'read', 'write', 'delete', 'admin'
+            granted_by INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            FOREIGN KEY (granted_by) REFERENCES users (id)
+        )
+    ''')
+    
+    # Colleges table (multiple colleges support)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS colleges (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            name_ar TEXT,
+            name_fr TEXT,
+            description TEXT,
+            description_ar TEXT,
+            description_fr TEXT,
+            logo TEXT,
+            website_url TEXT,
+            contact_email TEXT,
+            contact_phone TEXT,
+            address TEXT,
+            established_year INTEGER,
+            is_active BOOLEAN DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # Faculties table (updated to belong to colleges)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS faculties (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            college_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            name_ar TEXT,
+            name_fr TEXT,
+            description TEXT,
+            description_ar TEXT,
+            description_fr TEXT,
+            image TEXT,
+            dean_name TEXT,
+            contact_email TEXT,
+            contact_phone TEXT,
+            students_count INTEGER DEFAULT 0,
+            departments_count INTEGER DEFAULT 0,
+            is_active BOOLEAN DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (college_id) REFERENCES colleges (id)
+        )
+    ''')
+    
+    # Enhanced news table
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS news (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            title_ar TEXT,
+            title_fr TEXT,
+            content TEXT NOT NULL,
+            content_ar TEXT,
+            content_fr TEXT,
+            excerpt TEXT,
+            excerpt_ar TEXT,
+            excerpt_fr TEXT,
+            image TEXT,
+            category TEXT DEFAULT 'general',
+            tags TEXT, -- JSON array of tags
+            author_id INTEGER NOT NULL,
+            author_name TEXT NOT NULL,
+            college_id INTEGER,
+            faculty_id INTEGER,
+            department_id INTEGER,
+            is_published BOOLEAN DEFAULT 1,
+            is_featured BOOLEAN DEFAULT 0,
+            publish_date TIMESTAMP,
+            views_count INTEGER DEFAULT 0,
+            likes_count INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (author_id) REFERENCES users (id),
+            FOREIGN KEY (college_id) REFERENCES colleges (id),
+            FOREIGN KEY (faculty_id) REFERENCES faculties (id),
+            FOREIGN KEY (department_id) REFERENCES departments (id)
+        )
+    ''')
+    
+    # Enhanced files table with security features
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS files (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            filename TEXT NOT NULL,
+            original_filename TEXT NOT NULL,
+            file_path TEXT NOT NULL,
+            file_type TEXT NOT NULL,
+            file_size INTEGER NOT NULL,
+            mime_type TEXT NOT NULL,
+            file_hash TEXT NOT NULL,
+            uploaded_by INTEGER NOT NULL,
+            category TEXT DEFAULT 'general',
+            description TEXT,
+            college_id INTEGER,
+            faculty_id INTEGER,
+            department_id INTEGER,
+            is_public BOOLEAN DEFAULT 0,
+            is_scanned BOOLEAN DEFAULT 0,
+            scan_result TEXT,
+            download_count INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (uploaded_by) REFERENCES users (id),
+            FOREIGN KEY (college_id) REFERENCES colleges (id),
+            FOREIGN KEY (faculty_id) REFERENCES faculties (id),
+            FOREIGN KEY (department_id) REFERENCES departments (id)
+        )
+    ''')
+
+    # File access logs for audit trail
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS file_access_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            file_id INTEGER NOT NULL,
+            user_id INTEGER,
+            action TEXT NOT NULL, -- 'download', 'view', 'delete'
+            ip_address TEXT,
+            user_agent TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (file_id) REFERENCES files (id),
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+
+    # Quarantine table for suspicious files
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS quarantine_files (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            original_file_id INTEGER,
+            filename TEXT NOT NULL,
+            file_path TEXT NOT NULL,
+            reason TEXT NOT NULL,
+            detected_by TEXT,
+            quarantined_by INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (quarantined_by) REFERENCES users (id)
+        )
+    ''')
+    
+    # Uploaded images, documents and avatars (stored once per content hash in blobs;
+    # processing_status/variants track generated image sizes)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS uploads (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            filename TEXT NOT NULL,
+            original_filename TEXT NOT NULL,
+            file_path TEXT NOT NULL,
+            file_size INTEGER NOT NULL,
+            file_type TEXT NOT NULL,
+            uploaded_by INTEGER NOT NULL,
+            upload_type TEXT NOT NULL,
+            file_hash TEXT,
+            processing_status TEXT,
+            variants TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (uploaded_by) REFERENCES users (id)
+        )
+    ''')
+    for column in ('processing_status TEXT', 'variants TEXT'):
+        try:
+            conn.execute(f'ALTER TABLE uploads ADD COLUMN {column}')
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+    create_blob_table(conn)
+    create_session_table(conn)
+    
+    # Activity logs for audit trail
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS activity_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            action TEXT NOT NULL,
+            resource_type TEXT,
+            resource_id INTEGER,
+            details TEXT,
+            ip_address TEXT,
+            user_agent TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    
+    # Page view rollups for the analytics dashboard
+    create_rollup_tables(conn)
+    
+    # Full-text search index over every language variant of news
+    create_news_search_index(conn)
+    
+    # Create indexes for better performance
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_page_views_page ON page_views(page)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_page_views_created_at ON page_views(created_at)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_page_views_ip ON page_views(ip_address)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_user_sessions_session_id ON user_sessions(session_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_activity_logs_user_id ON activity_logs(user_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_activity_logs_created_at ON activity_logs(created_at)')
+    
+    # Keyset pagination indexes matching ORDER BY created_at DESC, id DESC
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_news_created_at_id ON news(created_at, id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_users_created_at_id ON users(created_at, id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_files_public_created_at_id ON files(is_public, created_at, id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_uploads_uploaded_by_created_at_id ON uploads(uploaded_by, created_at, id)')
+    
+    # Create default roles
+    create_default_roles(conn)
+    
+    # Create default admin user if not exists
+    create_default_admin(conn)
+    
+    # Create sample college if not exists
+    create_sample_data(conn)
+    
+    # Organizational closure table and in-memory hierarchy index
+    create_closure_table(conn)
+    refresh_hierarchy(conn)
 
 def create_default_roles(conn):
     """Create default system roles"""
@@ -379,12 +782,3 @@ def create_sample_data(conn):
                 INSERT INTO faculties (college_id, name, name_ar, name_fr, description, students_count, departments_count)
                 VALUES (?, ?, ?, ?, ?, ?, ?)
             ''', (college_id, faculty[0], faculty[1], faculty[2], f'Description for {faculty[0]}', 1000, 5))
-
-def log_activity(user_id, action, resource_type=None, resource_id=None, details=None, ip_address=None, user_agent=None):
-    """Log user activity"""
-    with get_db_connection() as conn:
-        conn.execute('''
-            INSERT INTO activity_logs (user_id, action, resource_type, resource_id, details, ip_address, user_agent)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (user_id, action, resource_type, resource_id, details, ip_address, user_agent))
-        conn.commit()
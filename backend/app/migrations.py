@@ -0,0 +1,100 @@
+import logging
+import sqlite3
+
+logger = logging.getLogger(__name__)
+
+def _baseline(conn):
+    from .database import create_schema
+    create_schema(conn)
+
+def _stats_snapshot(conn):
+    from .utils.dashboard import create_stats_snapshot_table
+    create_stats_snapshot_table(conn)
+
+def _counter_triggers(conn):
+    from .utils.counters import install_counters
+    install_counters(conn)
+
+def _uploads_file_hash_index(conn):
+    # Upload routes check a blob name against its uploads row on every request
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_uploads_file_hash ON uploads(file_hash, upload_type)')
+
+def _visitor_first_seen(conn):
+    from .utils.rollups import create_first_seen_table, get_rollup_watermark, update_first_seen
+    create_first_seen_table(conn)
+    update_first_seen(conn, 0, get_rollup_watermark(conn))
+
+def _cache_tags(conn):
+    from .utils.cache import create_cache_tags_table
+    create_cache_tags_table(conn)
+
+# Ordered (version, name, function) steps. Never edit an applied step; append a new one.
+MIGRATIONS = [
+    (1, 'baseline', _baseline),
+    (2, 'stats_snapshot', _stats_snapshot),
+    (3, 'counter_triggers', _counter_triggers),
+    (4, 'uploads_file_hash_index', _uploads_file_hash_index),
+    (5, 'visitor_first_seen', _visitor_first_seen),
+    (6, 'cache_tags', _cache_tags),
+]
+
+def create_version_table(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+def current_version(conn):
+    """Highest applied migration, 0 for a new database"""
+    try:
+        row = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()
+    except sqlite3.OperationalError:
+        return 0  # No schema_version table yet
+    return row[0] or 0
+
+def latest_version():
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+def pending_migrations(conn):
+    version = current_version(conn)
+    return [(number, name) for number, name, _ in MIGRATIONS if number > version]
+
+def migrate(target=None):
+    """Apply pending migrations in order; returns the (version, name) pairs applied.
+
+    Each step runs in its own immediate transaction and re-checks the
+    version first, so several processes migrating at once apply every
+    step exactly once.
+    """
+    from .database import get_db_connection
+    target = latest_version() if target is None else target
+    applied = []
+    with get_db_connection() as conn:
+        create_version_table(conn)
+        conn.commit()
+        for number, name, step in MIGRATIONS:
+            if number > target:
+                break
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                if current_version(conn) >= number:
+                    conn.rollback()
+                    continue
+                step(conn)
+                conn.execute('INSERT INTO schema_version (version, name) VALUES (?, ?)', (number, name))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            logger.info('Applied migration %d (%s)', number, name)
+            applied.append((number, name))
+    return applied
+
+def check_schema():
+    """Return the pending migrations without applying them (one cheap query at startup)"""
+    from .database import get_db_connection
+    with get_db_connection() as conn:
+        return pending_migrations(conn)
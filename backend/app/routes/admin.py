@@ -1,97 +1,30 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-import sqlite3
 import os
 from datetime import datetime, timedelta
-from ..utils.permissions import admin_required
-from werkzeug.security import generate_password_hash
+from ..database import audit_log, get_db_connection, get_pool_stats, hash_password
+from ..utils.cache import get_response_cache
+from ..utils.dashboard import get_dashboard_snapshot
+from ..utils.images import get_image_processor
+from ..utils.transforms import get_transform_cache
+from ..utils.passwords import PasswordHasherBusy, get_password_hasher
+from ..utils.pagination import InvalidCursorError, get_page_args, paginate
+from ..utils.permissions import admin_required, invalidate_principal, principal_cache
+from ..utils.profiling import get_profiler
+from ..utils.rollups import rollup_daily_series
 
 admin_bp = Blueprint('admin', __name__)
 
-def get_db_connection():
-    """Get database connection"""
-    db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'university.db')
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    return conn
-
 @admin_bp.route('/dashboard', methods=['GET'])
 @jwt_required()
 @admin_required
 def get_dashboard_stats():
-    """Get admin dashboard statistics"""
+    """Get admin dashboard statistics (served from a periodically refreshed snapshot)"""
     try:
-        conn = get_db_connection()
-        
-        # Get user statistics
-        total_users = conn.execute("SELECT COUNT(*) as count FROM users").fetchone()['count']
-        active_users = conn.execute("SELECT COUNT(*) as count FROM users WHERE active = 1").fetchone()['count']
-        new_users_today = conn.execute("""
-            SELECT COUNT(*) as count FROM users 
-            WHERE date(created_at) = date('now')
-        """).fetchone()['count']
-        
-        # Get content statistics
-        total_news = conn.execute("SELECT COUNT(*) as count FROM news").fetchone()['count']
-        published_news = conn.execute("SELECT COUNT(*) as count FROM news WHERE published = 1").fetchone()['count']
-        
-        total_faculties = conn.execute("SELECT COUNT(*) as count FROM faculties WHERE active = 1").fetchone()['count']
-        total_departments = conn.execute("SELECT COUNT(*) as count FROM departments WHERE active = 1").fetchone()['count']
-        
-        # Get AI House statistics
-        ai_projects = conn.execute("SELECT COUNT(*) as count FROM ai_projects WHERE active = 1").fetchone()['count']
-        ai_events = conn.execute("SELECT COUNT(*) as count FROM ai_events WHERE active = 1").fetchone()['count']
-        
-        # Get Incubator statistics
-        startups = conn.execute("SELECT COUNT(*) as count FROM startups WHERE active = 1").fetchone()['count']
-        incubator_programs = conn.execute("SELECT COUNT(*) as count FROM incubator_programs WHERE active = 1").fetchone()['count']
-        
-        # Get upload statistics
-        total_uploads = conn.execute("SELECT COUNT(*) as count FROM uploads").fetchone()['count']
-        total_upload_size = conn.execute("SELECT SUM(file_size) as size FROM uploads").fetchone()['size'] or 0
-        
-        # Get recent activity
-        recent_users = conn.execute("""
-            SELECT username, email, created_at FROM users 
-            ORDER BY created_at DESC LIMIT 5
-        """).fetchall()
-        
-        recent_news = conn.execute("""
-            SELECT title, created_at FROM news 
-            ORDER BY created_at DESC LIMIT 5
-        """).fetchall()
-        
-        conn.close()
-        
-        return jsonify({
-            'users': {
-                'total': total_users,
-                'active': active_users,
-                'new_today': new_users_today
-            },
-            'content': {
-                'total_news': total_news,
-                'published_news': published_news,
-                'faculties': total_faculties,
-                'departments': total_departments
-            },
-            'ai_house': {
-                'projects': ai_projects,
-                'events': ai_events
-            },
-            'incubator': {
-                'startups': startups,
-                'programs': incubator_programs
-            },
-            'uploads': {
-                'total_files': total_uploads,
-                'total_size': total_upload_size
-            },
-            'recent_activity': {
-                'users': [dict(user) for user in recent_users],
-                'news': [dict(article) for article in recent_news]
-            }
-        })
+        force = request.args.get('refresh', 'false').lower() == 'true'
+        with get_db_connection() as conn:
+            stats = get_dashboard_snapshot(conn, current_app.config['DASHBOARD_SNAPSHOT_MAX_AGE'], force=force)
+        return jsonify(stats)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -102,8 +35,7 @@ def get_dashboard_stats():
 def get_users():
     """Get all users with pagination"""
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = min(request.args.get('per_page', 20, type=int), 50)
+        page_args = get_page_args(default_per_page=20)
         search = request.args.get('search')
         role = request.args.get('role')
         active = request.args.get('active')
@@ -111,53 +43,33 @@ def get_users():
         conn = get_db_connection()
         
         # Build query
-        query = "SELECT id, username, email, role, active, created_at, last_login FROM users WHERE 1=1"
+        where = " WHERE 1=1"
         params = []
         
         if search:
-            query += " AND (username LIKE ? OR email LIKE ?)"
+            where += " AND (username LIKE ? OR email LIKE ?)"
             params.extend([f'%{search}%', f'%{search}%'])
         
         if role:
-            query += " AND role = ?"
+            where += " AND role = ?"
             params.append(role)
         
         if active is not None:
-            query += " AND active = ?"
+            where += " AND active = ?"
             params.append(1 if active.lower() == 'true' else 0)
         
-        query += " ORDER BY created_at DESC LIMIT ? OFFSET ?"
-        params.extend([per_page, (page - 1) * per_page])
-        
-        users = conn.execute(query, params).fetchall()
-        
-        # Get total count
-        count_query = "SELECT COUNT(*) FROM users WHERE 1=1"
-        count_params = []
-        
-        if search:
-            count_query += " AND (username LIKE ? OR email LIKE ?)"
-            count_params.extend([f'%{search}%', f'%{search}%'])
-        
-        if role:
-            count_query += " AND role = ?"
-            count_params.append(role)
-        
-        if active is not None:
-            count_query += " AND active = ?"
-            count_params.append(1 if active.lower() == 'true' else 0)
-        
-        total = conn.execute(count_query, count_params).fetchone()[0]
+        users, meta = paginate(
+            conn,
+            "SELECT id, username, email, role, active, created_at, last_login FROM users" + where,
+            "SELECT COUNT(*) FROM users" + where,
+            params, page_args
+        )
         conn.close()
         
-        return jsonify({
-            'users': [dict(user) for user in users],
-            'total': total,
-            'page': page,
-            'per_page': per_page,
-            'pages': (total + per_page - 1) // per_page
-        })
+        return jsonify({'users': [dict(user) for user in users], **meta})
         
+    except InvalidCursorError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -224,7 +136,7 @@ def create_user():
             return jsonify({'error': 'Username or email already exists'}), 400
         
         # Hash password
-        password_hash = generate_password_hash(data['password'])
+        password_hash = hash_password(data['password'])
         
         cursor = conn.execute("""
             INSERT INTO users (username, email, password_hash, role, active)
@@ -240,9 +152,12 @@ def create_user():
         user_id = cursor.lastrowid
         conn.commit()
         conn.close()
+        invalidate_principal(user_id)
         
         return jsonify({'message': 'User created successfully', 'id': user_id}), 201
         
+    except PasswordHasherBusy:
+        return jsonify({'error': 'Server busy, please retry'}), 503, {'Retry-After': '1'}
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -289,7 +204,7 @@ def update_user(user_id):
         
         if 'password' in data and data['password']:
             update_fields.append('password_hash = ?')
-            params.append(generate_password_hash(data['password']))
+            params.append(hash_password(data['password']))
         
         if not update_fields:
             conn.close()
@@ -302,9 +217,12 @@ def update_user(user_id):
         conn.execute(query, params)
         conn.commit()
         conn.close()
+        invalidate_principal(user_id)
         
         return jsonify({'message': 'User updated successfully'})
         
+    except PasswordHasherBusy:
+        return jsonify({'error': 'Server busy, please retry'}), 503, {'Retry-After': '1'}
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -332,6 +250,7 @@ def delete_user(user_id):
         conn.execute("UPDATE users SET active = 0 WHERE id = ?", (user_id,))
         conn.commit()
         conn.close()
+        invalidate_principal(user_id)
         
         return jsonify({'message': 'User deactivated successfully'})
         
@@ -375,6 +294,9 @@ def get_analytics():
             ORDER BY date
         """.format(days)).fetchall()
         
+        # Page view trends (served from the analytics rollups)
+        page_view_trends = rollup_daily_series(conn, datetime.utcnow() - timedelta(days=days))
+        
         # Most popular news categories
         popular_categories = conn.execute("""
             SELECT category, COUNT(*) as count
@@ -399,6 +321,7 @@ def get_analytics():
             'user_registrations': [dict(row) for row in user_registrations],
             'news_publications': [dict(row) for row in news_publications],
             'upload_trends': [dict(row) for row in upload_trends],
+            'page_view_trends': page_view_trends,
             'popular_categories': [dict(row) for row in popular_categories],
             'user_roles': [dict(row) for row in user_roles]
         })
@@ -481,15 +404,14 @@ def get_logs():
 def create_backup():
     """Create database backup"""
     try:
-        import shutil
+        import sqlite3
         from datetime import datetime
         
         # Create backup filename with timestamp
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         backup_filename = f'university_backup_{timestamp}.db'
         
-        # Source and destination paths
-        source_db = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'university.db')
+        # Destination path
         backup_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'backups')
         
         # Create backup directory if it doesn't exist
@@ -497,8 +419,13 @@ def create_backup():
         
         backup_path = os.path.join(backup_dir, backup_filename)
         
-        # Copy database file
-        shutil.copy2(source_db, backup_path)
+        # Use the online backup API so pages still in the WAL are included
+        with get_db_connection() as conn:
+            target = sqlite3.connect(backup_path)
+            try:
+                conn.backup(target)
+            finally:
+                target.close()
         
         return jsonify({
             'message': 'Backup created successfully',
@@ -508,3 +435,84 @@ def create_backup():
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/db-pool', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_db_pool_stats():
+    """Get database connection pool metrics"""
+    try:
+        return jsonify(get_pool_stats())
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/cache', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_cache_stats():
+    """Get response and principal cache metrics"""
+    try:
+        stats = get_response_cache().stats()
+        stats['principals'] = principal_cache.stats()
+        return jsonify(stats)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/password-hasher', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_password_hasher_stats():
+    """Get password hashing pool, latency and login metrics"""
+    try:
+        return jsonify(get_password_hasher().stats())
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/audit-log', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_audit_log_stats():
+    """Get activity audit log writer metrics"""
+    try:
+        return jsonify(audit_log.stats())
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/image-processor', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_image_processor_stats():
+    """Get image variant worker queue and resized image cache metrics"""
+    try:
+        return jsonify({**get_image_processor().stats(), 'transforms': get_transform_cache().stats()})
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/profiling', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_profiling_stats():
+    """Get sampled request timings, slowest query fingerprints and suspected N+1 queries"""
+    try:
+        limit = min(request.args.get('limit', 20, type=int), 100)
+        return jsonify(get_profiler().stats(limit))
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/profiling', methods=['DELETE'])
+@jwt_required()
+@admin_required
+def reset_profiling_stats():
+    """Clear collected profiling data"""
+    try:
+        get_profiler().reset()
+        return jsonify({'message': 'Profiling data cleared'})
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
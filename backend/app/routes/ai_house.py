@@ -1,76 +1,47 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-import sqlite3
-import os
 from datetime import datetime
+from ..database import get_db_connection
+from ..utils.cache import cached_response, invalidate_tags
+from ..utils.pagination import InvalidCursorError, get_page_args, paginate
 from ..utils.permissions import admin_required
 from ..utils.validators import validate_ai_project_data
 
 ai_house_bp = Blueprint('ai_house', __name__)
 
-def get_db_connection():
-    """Get database connection"""
-    db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'university.db')
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    return conn
-
 @ai_house_bp.route('/projects', methods=['GET'])
 def get_projects():
     """Get all AI House projects"""
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = min(request.args.get('per_page', 10, type=int), 50)
+        page_args = get_page_args()
         category = request.args.get('category')
         status = request.args.get('status')
         
         conn = get_db_connection()
         
         # Build query
-        query = """
-            SELECT p.*, u.username as creator_name 
-            FROM ai_projects p 
-            LEFT JOIN users u ON p.creator_id = u.id 
-            WHERE p.active = 1
-        """
+        where = " WHERE p.active = 1"
         params = []
         
         if category:
-            query += " AND p.category = ?"
+            where += " AND p.category = ?"
             params.append(category)
             
         if status:
-            query += " AND p.status = ?"
+            where += " AND p.status = ?"
             params.append(status)
         
-        query += " ORDER BY p.created_at DESC LIMIT ? OFFSET ?"
-        params.extend([per_page, (page - 1) * per_page])
-        
-        projects = conn.execute(query, params).fetchall()
-        
-        # Get total count
-        count_query = "SELECT COUNT(*) FROM ai_projects WHERE active = 1"
-        count_params = []
-        
-        if category:
-            count_query += " AND category = ?"
-            count_params.append(category)
-            
-        if status:
-            count_query += " AND status = ?"
-            count_params.append(status)
-        
-        total = conn.execute(count_query, count_params).fetchone()[0]
+        projects, meta = paginate(conn, """
+            SELECT p.*, u.username as creator_name 
+            FROM ai_projects p 
+            LEFT JOIN users u ON p.creator_id = u.id
+        """ + where, "SELECT COUNT(*) FROM ai_projects p" + where, params, page_args, prefix='p.')
         conn.close()
         
-        return jsonify({
-            'projects': [dict(project) for project in projects],
-            'total': total,
-            'page': page,
-            'per_page': per_page,
-            'pages': (total + per_page - 1) // per_page
-        })
+        return jsonify({'projects': [dict(project) for project in projects], **meta})
         
+    except InvalidCursorError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -109,6 +80,7 @@ def get_project(project_id):
         return jsonify({'error': str(e)}), 500
 
 @ai_house_bp.route('/events', methods=['GET'])
+@cached_response('ai_events')
 def get_events():
     """Get all AI House events"""
     try:
@@ -158,15 +130,10 @@ def get_event(event_id):
             conn.close()
             return jsonify({'error': 'Event not found'}), 404
         
-        # Get event registrations count
-        registrations = conn.execute("""
-            SELECT COUNT(*) as count FROM ai_event_registrations WHERE event_id = ?
-        """, (event_id,)).fetchone()
-        
         conn.close()
         
         event_dict = dict(event)
-        event_dict['registrations_count'] = registrations['count']
+        event_dict['registrations_count'] = event['registration_count']
         
         return jsonify(event_dict)
         
@@ -279,6 +246,7 @@ def create_event():
         event_id = cursor.lastrowid
         conn.commit()
         conn.close()
+        invalidate_tags('ai_events')
         
         return jsonify({'message': 'Event created successfully', 'id': event_id}), 201
         
@@ -312,21 +280,18 @@ def register_for_event(event_id):
             conn.close()
             return jsonify({'error': 'Already registered for this event'}), 400
         
-        # Check if event is full
-        if event['max_participants'] > 0:
-            current_registrations = conn.execute("""
-                SELECT COUNT(*) as count FROM ai_event_registrations WHERE event_id = ?
-            """, (event_id,)).fetchone()
-            
-            if current_registrations['count'] >= event['max_participants']:
-                conn.close()
-                return jsonify({'error': 'Event is full'}), 400
-        
-        # Register user
-        conn.execute("""
+        # Register only while the event has room; the trigger-maintained
+        # registration_count makes the check a primary key lookup, and doing
+        # it in the INSERT keeps two concurrent registrations from overfilling it
+        registered = conn.execute("""
             INSERT INTO ai_event_registrations (event_id, user_id)
-            VALUES (?, ?)
-        """, (event_id, current_user_id))
+            SELECT id, ? FROM ai_events
+            WHERE id = ? AND (COALESCE(max_participants, 0) <= 0 OR registration_count < max_participants)
+        """, (current_user_id, event_id)).rowcount
+        
+        if not registered:
+            conn.close()
+            return jsonify({'error': 'Event is full'}), 400
         
         conn.commit()
         conn.close()
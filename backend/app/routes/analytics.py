@@ -1,70 +1,112 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, Response, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime, timedelta
 import json
+import time
 from ..database import get_db_connection, log_activity
+from ..utils.batching import BatchWriter
 from ..utils.permissions import check_permission
-try:
-    import user_agents
-    USER_AGENTS_AVAILABLE = True
-except ImportError:
-    USER_AGENTS_AVAILABLE = False
-    user_agents = None
+from ..utils.realtime import configure_realtime, get_realtime_counter
+from ..utils.user_agent import configure_user_agent_cache, parse_user_agent, user_agent_cache_stats
+from ..utils.rollups import (
+    new_visitors, refresh_page_view_rollups, rollup_counts, rollup_total, rollup_daily_series, unique_visitors
+)
 from urllib.parse import urlparse
 
 analytics_bp = Blueprint('analytics', __name__)
 
+PAGE_TITLES = {
+    '/': 'Home',
+    '/about': 'About',
+    '/faculties': 'Faculties',
+    '/news': 'News',
+    '/contact': 'Contact'
+}
+
+def exact_uniques_requested():
+    """Whether unique visitors should be counted exactly instead of from sketches"""
+    exact = request.args.get('exact')
+    if exact is None:
+        return current_app.config.get('ANALYTICS_EXACT_UNIQUES', False)
+    return exact.lower() == 'true'
+
+def beacon_field(data, field, default=''):
+    """Read a tracking beacon field as text; ValueError for objects and arrays"""
+    value = data.get(field, default)
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)):
+        return str(value)
+    raise ValueError(f'{field} must be a string')
+
+def top_counts(counts, limit=None):
+    """Sort a ``{value: count}`` mapping by count, highest first"""
+    ranked = sorted(counts.items(), key=lambda item: item[1], reverse=True)
+    return ranked[:limit] if limit else ranked
+
+def write_page_views(rows):
+    """Insert a batch of buffered page views in a single transaction"""
+    with get_db_connection() as conn:
+        conn.executemany('''
+            INSERT INTO page_views (
+                page, title, referrer, referrer_domain, ip_address,
+                user_agent, device_type, browser, os, screen_resolution,
+                language, session_id, created_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        # Keep hourly/daily rollups current in the same transaction
+        refresh_page_view_rollups(conn)
+        conn.commit()
+
+# Page views are buffered in memory and written by a background thread so the
+# tracking beacon never waits on an INSERT + fsync
+page_view_writer = BatchWriter('page-views', write_page_views)
+
+@analytics_bp.record_once
+def configure_ingest(state):
+    config = state.app.config
+    page_view_writer.configure(
+        capacity=config.get('ANALYTICS_BUFFER_SIZE', 10000),
+        batch_size=config.get('ANALYTICS_BATCH_SIZE', 500),
+        flush_interval=config.get('ANALYTICS_FLUSH_INTERVAL', 1.0),
+        overflow=config.get('ANALYTICS_OVERFLOW_POLICY', 'reject')
+    )
+    configure_realtime(config.get('REALTIME_REDIS_URL'))
+    configure_user_agent_cache(config.get('USER_AGENT_CACHE_SIZE', 4096))
+
+def realtime_stats():
+    """Real-time statistics served from the in-memory sliding window"""
+    counter = get_realtime_counter()
+    recent = counter.snapshot(5)
+    window = counter.snapshot(30)
+    return {
+        'activeUsers': recent['active_visitors'],
+        'currentPages': [{'page': page, 'views': views} for page, views in window['pages'].most_common(5)]
+    }
+
 @analytics_bp.route('/track', methods=['POST'])
 def track_page_view():
     """Track page view (public endpoint)"""
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'status': 'error', 'error': 'Expected a JSON object'}), 400
         
-        # Extract visitor information
-        page = data.get('page', '/')
-        referrer = data.get('referrer', '')
-        user_agent_string = data.get('userAgent', '')
-        screen_resolution = data.get('screenResolution', '')
-        language = data.get('language', 'en')
-        timestamp = data.get('timestamp', datetime.utcnow().isoformat())
+        # Extract visitor information (as text, so a bad beacon cannot poison the write batch)
+        try:
+            page = beacon_field(data, 'page', '/')
+            title = beacon_field(data, 'title')
+            referrer = beacon_field(data, 'referrer')
+            user_agent_string = beacon_field(data, 'userAgent')
+            screen_resolution = beacon_field(data, 'screenResolution')
+            language = beacon_field(data, 'language', 'en')
+            session_id = beacon_field(data, 'sessionId')
+            timestamp = beacon_field(data, 'timestamp', datetime.utcnow().isoformat())
+        except ValueError as e:
+            return jsonify({'status': 'error', 'error': str(e)}), 400
         
-        # Parse user agent
-        if USER_AGENTS_AVAILABLE and user_agent_string:
-            user_agent = user_agents.parse(user_agent_string)
-            device_type = 'mobile' if user_agent.is_mobile else 'tablet' if user_agent.is_tablet else 'desktop'
-            browser = user_agent.browser.family
-            os = user_agent.os.family
-        else:
-            # Fallback parsing without user_agents library
-            device_type = 'desktop'
-            browser = 'Unknown'
-            os = 'Unknown'
-            if user_agent_string:
-                ua_lower = user_agent_string.lower()
-                if 'mobile' in ua_lower or 'android' in ua_lower or 'iphone' in ua_lower:
-                    device_type = 'mobile'
-                elif 'tablet' in ua_lower or 'ipad' in ua_lower:
-                    device_type = 'tablet'
-                
-                if 'chrome' in ua_lower:
-                    browser = 'Chrome'
-                elif 'firefox' in ua_lower:
-                    browser = 'Firefox'
-                elif 'safari' in ua_lower:
-                    browser = 'Safari'
-                elif 'edge' in ua_lower:
-                    browser = 'Edge'
-                
-                if 'windows' in ua_lower:
-                    os = 'Windows'
-                elif 'mac' in ua_lower:
-                    os = 'macOS'
-                elif 'linux' in ua_lower:
-                    os = 'Linux'
-                elif 'android' in ua_lower:
-                    os = 'Android'
-                elif 'ios' in ua_lower:
-                    os = 'iOS'
+        # Parse user agent (memoized per distinct user agent string)
+        device_type, browser, os = parse_user_agent(user_agent_string or '')
         
         # Get IP address
         ip_address = request.headers.get('X-Forwarded-For', request.remote_addr)
@@ -80,22 +122,22 @@ def track_page_view():
             except:
                 pass
         
-        # Store page view
-        with get_db_connection() as conn:
-            conn.execute('''
-                INSERT INTO page_views (
-                    page, title, referrer, referrer_domain, ip_address,
-                    user_agent, device_type, browser, os, screen_resolution,
-                    language, session_id, created_at
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                page, data.get('title', ''), referrer, referrer_domain, ip_address,
-                user_agent_string, device_type, browser, os, screen_resolution,
-                language, data.get('sessionId', ''), timestamp
-            ))
-            conn.commit()
+        # Queue page view for the background writer
+        accepted = page_view_writer.submit((
+            page, title, referrer, referrer_domain, ip_address,
+            user_agent_string, device_type, browser, os, screen_resolution,
+            language, session_id, timestamp
+        ))
+        
+        if not accepted:
+            response = jsonify({'status': 'busy'})
+            response.headers['Retry-After'] = '1'
+            return response, 503
         
-        return jsonify({'status': 'success'})
+        # Feed the real-time sliding window
+        get_realtime_counter().record(session_id or ip_address, page)
+        
+        return jsonify({'status': 'success'}), 202
         
     except Exception as e:
         current_app.logger.error(f'Analytics tracking error: {str(e)}')
@@ -108,6 +150,7 @@ def get_dashboard_analytics():
     """Get dashboard analytics data"""
     try:
         time_range = request.args.get('timeRange', '7d')
+        exact = exact_uniques_requested()
         
         # Calculate date range
         if time_range == '1d':
@@ -122,81 +165,46 @@ def get_dashboard_analytics():
             start_date = datetime.utcnow() - timedelta(days=7)
         
         with get_db_connection() as conn:
-            # Overview stats
-            total_visits = conn.execute('''
-                SELECT COUNT(*) FROM page_views 
-                WHERE created_at >= ?
-            ''', (start_date,)).fetchone()[0]
+            # Overview stats (served from rollups)
+            total_visits = rollup_total(conn, start_date)
             
-            unique_visitors = conn.execute('''
-                SELECT COUNT(DISTINCT ip_address) FROM page_views 
-                WHERE created_at >= ?
-            ''', (start_date,)).fetchone()[0]
+            unique_count = unique_visitors(conn, start_date, exact=exact)
             
             # Calculate previous period for comparison
             prev_start = start_date - (datetime.utcnow() - start_date)
-            prev_visits = conn.execute('''
-                SELECT COUNT(*) FROM page_views 
-                WHERE created_at >= ? AND created_at < ?
-            ''', (prev_start, start_date)).fetchone()[0]
+            prev_visits = rollup_total(conn, prev_start, start_date)
             
-            prev_unique = conn.execute('''
-                SELECT COUNT(DISTINCT ip_address) FROM page_views 
-                WHERE created_at >= ? AND created_at < ?
-            ''', (prev_start, start_date)).fetchone()[0]
+            prev_unique = unique_visitors(conn, prev_start, start_date, exact=exact)
             
             # Calculate changes
             visits_change = ((total_visits - prev_visits) / max(prev_visits, 1)) * 100 if prev_visits > 0 else 0
-            visitors_change = ((unique_visitors - prev_unique) / max(prev_unique, 1)) * 100 if prev_unique > 0 else 0
+            visitors_change = ((unique_count - prev_unique) / max(prev_unique, 1)) * 100 if prev_unique > 0 else 0
             
             # Top pages
-            top_pages = conn.execute('''
-                SELECT page, COUNT(*) as views, 
-                       CASE 
-                           WHEN page = '/' THEN 'Home'
-                           WHEN page = '/about' THEN 'About'
-                           WHEN page = '/faculties' THEN 'Faculties'
-                           WHEN page = '/news' THEN 'News'
-                           WHEN page = '/contact' THEN 'Contact'
-                           ELSE page
-                       END as title
-                FROM page_views 
-                WHERE created_at >= ?
-                GROUP BY page 
-                ORDER BY views DESC 
-                LIMIT 10
-            ''', (start_date,)).fetchall()
+            top_pages = [
+                {'page': page, 'views': views, 'title': PAGE_TITLES.get(page, page)}
+                for page, views in top_counts(rollup_counts(conn, 'page', start_date), 10)
+            ]
             
             # Device types
-            device_types = conn.execute('''
-                SELECT device_type, COUNT(*) as count,
-                       ROUND(COUNT(*) * 100.0 / ?, 1) as percentage
-                FROM page_views 
-                WHERE created_at >= ?
-                GROUP BY device_type 
-                ORDER BY count DESC
-            ''', (max(total_visits, 1), start_date)).fetchall()
+            device_types = [
+                {'device_type': device, 'count': count,
+                 'percentage': round(count * 100.0 / max(total_visits, 1), 1)}
+                for device, count in top_counts(rollup_counts(conn, 'device_type', start_date))
+            ]
             
             # Top referrers
-            top_referrers = conn.execute('''
-                SELECT COALESCE(referrer_domain, 'Direct') as source, COUNT(*) as visits
-                FROM page_views 
-                WHERE created_at >= ?
-                GROUP BY referrer_domain 
-                ORDER BY visits DESC 
-                LIMIT 10
-            ''', (start_date,)).fetchall()
+            top_referrers = [
+                {'source': source or 'Direct', 'visits': visits}
+                for source, visits in top_counts(rollup_counts(conn, 'referrer_domain', start_date), 10)
+            ]
             
             # Browsers
-            browsers = conn.execute('''
-                SELECT browser, COUNT(*) as count,
-                       ROUND(COUNT(*) * 100.0 / ?, 1) as percentage
-                FROM page_views 
-                WHERE created_at >= ?
-                GROUP BY browser 
-                ORDER BY count DESC 
-                LIMIT 5
-            ''', (max(total_visits, 1), start_date)).fetchall()
+            browsers = [
+                {'browser': browser, 'count': count,
+                 'percentage': round(count * 100.0 / max(total_visits, 1), 1)}
+                for browser, count in top_counts(rollup_counts(conn, 'browser', start_date), 5)
+            ]
             
             # Countries (simplified - would need GeoIP for real implementation)
             countries = [
@@ -206,31 +214,21 @@ def get_dashboard_analytics():
                 {'name': 'Morocco', 'flag': '🇲🇦', 'visits': int(total_visits * 0.05)},
             ]
             
-            # Real-time stats (last hour)
-            active_users = conn.execute('''
-                SELECT COUNT(DISTINCT ip_address) FROM page_views 
-                WHERE created_at >= ?
-            ''', (datetime.utcnow() - timedelta(minutes=30),)).fetchone()[0]
-            
-            page_views_last_hour = conn.execute('''
-                SELECT COUNT(*) FROM page_views 
-                WHERE created_at >= ?
-            ''', (datetime.utcnow() - timedelta(hours=1),)).fetchone()[0]
+            # Real-time stats (last hour, from the in-memory sliding window)
+            counter = get_realtime_counter()
+            active_users = counter.snapshot(30)['active_visitors']
+            page_views_last_hour = counter.snapshot(60)['views']
             
-            new_visitors_today = conn.execute('''
-                SELECT COUNT(DISTINCT ip_address) FROM page_views 
-                WHERE created_at >= ? 
-                AND ip_address NOT IN (
-                    SELECT DISTINCT ip_address FROM page_views 
-                    WHERE created_at < ?
-                )
-            ''', (datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0),
-                  datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0))).fetchone()[0]
+            # Visitors first seen today (first-seen table plus the raw tail)
+            new_visitors_today = new_visitors(
+                conn, datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+            )
             
             analytics_data = {
                 'overview': {
                     'totalVisits': total_visits,
-                    'uniqueVisitors': unique_visitors,
+                    'uniqueVisitors': unique_count,
+                    'uniqueVisitorsExact': exact,
                     'avgSessionDuration': 5.2,  # Would calculate from session data
                     'bounceRate': 45.3,  # Would calculate from session data
                     'visitsChange': round(visits_change, 1),
@@ -238,9 +236,9 @@ def get_dashboard_analytics():
                     'durationChange': 2.1,
                     'bounceChange': -1.5
                 },
-                'topPages': [dict(page) for page in top_pages],
-                'deviceTypes': [dict(device) for device in device_types],
-                'topReferrers': [dict(ref) for ref in top_referrers],
+                'topPages': top_pages,
+                'deviceTypes': device_types,
+                'topReferrers': top_referrers,
                 'browsers': [{'name': browser['browser'], 'percentage': browser['percentage']} for browser in browsers],
                 'countries': countries,
                 'realTime': {
@@ -263,6 +261,7 @@ def get_page_analytics(page):
     """Get analytics for a specific page"""
     try:
         time_range = request.args.get('timeRange', '7d')
+        exact = exact_uniques_requested()
         
         # Calculate date range
         if time_range == '1d':
@@ -276,30 +275,18 @@ def get_page_analytics(page):
         
         with get_db_connection() as conn:
             # Page-specific stats
-            page_views = conn.execute('''
-                SELECT COUNT(*) FROM page_views 
-                WHERE page = ? AND created_at >= ?
-            ''', (f'/{page}', start_date)).fetchone()[0]
+            page_views = rollup_counts(conn, 'page', start_date, value=f'/{page}').get(f'/{page}', 0)
             
-            unique_visitors = conn.execute('''
-                SELECT COUNT(DISTINCT ip_address) FROM page_views 
-                WHERE page = ? AND created_at >= ?
-            ''', (f'/{page}', start_date)).fetchone()[0]
+            unique_count = unique_visitors(conn, start_date, page=f'/{page}', exact=exact)
             
             # Daily breakdown
-            daily_views = conn.execute('''
-                SELECT DATE(created_at) as date, COUNT(*) as views
-                FROM page_views 
-                WHERE page = ? AND created_at >= ?
-                GROUP BY DATE(created_at)
-                ORDER BY date
-            ''', (f'/{page}', start_date)).fetchall()
+            daily_views = rollup_daily_series(conn, start_date, 'page', f'/{page}')
             
             return jsonify({
                 'data': {
                     'pageViews': page_views,
-                    'uniqueVisitors': unique_visitors,
-                    'dailyViews': [dict(day) for day in daily_views]
+                    'uniqueVisitors': unique_count,
+                    'dailyViews': daily_views
                 }
             })
             
@@ -313,30 +300,41 @@ def get_page_analytics(page):
 def get_realtime_stats():
     """Get real-time statistics"""
     try:
-        with get_db_connection() as conn:
-            # Active users (last 5 minutes)
-            active_users = conn.execute('''
-                SELECT COUNT(DISTINCT ip_address) FROM page_views 
-                WHERE created_at >= ?
-            ''', (datetime.utcnow() - timedelta(minutes=5),)).fetchone()[0]
-            
-            # Current page views
-            current_pages = conn.execute('''
-                SELECT page, COUNT(*) as views
-                FROM page_views 
-                WHERE created_at >= ?
-                GROUP BY page 
-                ORDER BY views DESC 
-                LIMIT 5
-            ''', (datetime.utcnow() - timedelta(minutes=30),)).fetchall()
-            
-            return jsonify({
-                'data': {
-                    'activeUsers': active_users,
-                    'currentPages': [dict(page) for page in current_pages]
-                }
-            })
-            
+        return jsonify({'data': realtime_stats()})
+        
     except Exception as e:
         current_app.logger.error(f'Real-time stats error: {str(e)}')
         return jsonify({'error': 'Failed to fetch real-time stats'}), 500
+
+@analytics_bp.route('/realtime/stream', methods=['GET'])
+@jwt_required()
+@check_permission('analytics_view')
+def stream_realtime_stats():
+    """Stream real-time statistics as Server-Sent Events"""
+    interval = current_app.config.get('REALTIME_STREAM_INTERVAL', 5)
+    
+    def generate():
+        yield f'retry: {int(interval * 1000)}\n\n'
+        last_payload = None
+        while True:
+            payload = json.dumps(realtime_stats())
+            if payload != last_payload:
+                yield f'data: {payload}\n\n'
+                last_payload = payload
+            else:
+                yield ': keep-alive\n\n'
+            time.sleep(interval)
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@analytics_bp.route('/ingest', methods=['GET'])
+@jwt_required()
+@check_permission('analytics_view')
+def get_ingest_stats():
+    """Get page view ingest buffer and user agent cache statistics"""
+    stats = page_view_writer.stats()
+    stats['user_agent_cache'] = user_agent_cache_stats()
+    return jsonify({'data': stats})
@@ -6,9 +6,9 @@ from flask_jwt_extended import (
 )
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
-import bcrypt
 from datetime import datetime, timedelta
 from ..database import get_db_connection, hash_password, verify_password, log_activity
+from ..utils.passwords import PasswordHasherBusy, get_password_hasher
 from ..utils.validators import validate_email, validate_password
 from ..utils.permissions import check_permission
 
@@ -38,7 +38,11 @@ def login():
                 WHERE (u.username = ? OR u.email = ?) AND u.is_active = 1
             ''', (username, username)).fetchone()
             
-            if not user or not verify_password(password, user['password_hash']):
+            hasher = get_password_hasher()
+            valid, new_hash = hasher.verify_and_update(password, user['password_hash']) if user else (False, None)
+            hasher.record_login(valid)
+            
+            if not valid:
                 # Log failed login attempt
                 log_activity(
                     user_id=user['id'] if user else None,
@@ -49,11 +53,17 @@ def login():
                 )
                 return jsonify({'error': 'Invalid credentials'}), 401
             
-            # Update last login
-            conn.execute(
-                'UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE id = ?',
-                (user['id'],)
-            )
+            # Update last login, upgrading the stored hash if the cost factor changed
+            if new_hash:
+                conn.execute(
+                    'UPDATE users SET last_login = CURRENT_TIMESTAMP, password_hash = ? WHERE id = ?',
+                    (new_hash, user['id'])
+                )
+            else:
+                conn.execute(
+                    'UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE id = ?',
+                    (user['id'],)
+                )
             
             # Create tokens
             access_token = create_access_token(
@@ -96,6 +106,8 @@ def login():
             
             return response
             
+    except PasswordHasherBusy:
+        return jsonify({'error': 'Server busy, please retry'}), 503, {'Retry-After': '1'}
     except Exception as e:
         current_app.logger.error(f'Login error: {str(e)}')
         return jsonify({'error': 'Login failed'}), 500
@@ -241,6 +253,8 @@ def change_password():
             
             return jsonify({'message': 'Password changed successfully'})
             
+    except PasswordHasherBusy:
+        return jsonify({'error': 'Server busy, please retry'}), 503, {'Retry-After': '1'}
     except Exception as e:
         current_app.logger.error(f'Password change error: {str(e)}')
         return jsonify({'error': 'Password change failed'}), 500
@@ -1,11 +1,33 @@
-from flask import Blueprint, request, jsonify, send_file, current_app
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 import os
 from ..database import get_db_connection, log_activity
+from ..utils.batching import CounterAggregator
+from ..utils.cache import cached_response, invalidate_tags
+from ..utils.file_serving import is_continuation, serve_file
+from ..utils.hierarchy import closure_join
+from ..utils.pagination import InvalidCursorError, get_page_args, paginate
 from ..utils.permissions import check_permission
 
 downloads_bp = Blueprint('downloads', __name__)
 
+def write_download_counts(counts):
+    """Apply a batch of buffered download count increments in one transaction"""
+    with get_db_connection() as conn:
+        conn.executemany(
+            'UPDATE files SET download_count = download_count + ? WHERE id = ?',
+            [(downloads, file_id) for file_id, downloads in counts.items()]
+        )
+        conn.commit()
+    invalidate_tags('files')
+
+# Downloads are counted in memory and written behind in batches
+download_counter = CounterAggregator('file-downloads', write_download_counts)
+
+@downloads_bp.record_once
+def configure_download_counter(state):
+    download_counter.configure(flush_interval=state.app.config.get('COUNTER_FLUSH_INTERVAL', 5.0))
+
 @downloads_bp.route('/files', methods=['GET'])
 def get_files():
     """Get list of downloadable files"""
@@ -13,55 +35,53 @@ def get_files():
         search = request.args.get('search', '')
         category = request.args.get('category', '')
         faculty_id = request.args.get('faculty_id', '')
-        page = int(request.args.get('page', 1))
-        per_page = int(request.args.get('per_page', 20))
+        college_id = request.args.get('college_id', '')
+        page_args = get_page_args(default_per_page=20, max_per_page=100)
         
         with get_db_connection() as conn:
-            query = '''
-                SELECT f.*, u.name as uploaded_by_name, 
-                       fa.name as faculty_name, c.name as college_name
+            joins = '''
                 FROM files f
                 JOIN users u ON f.uploaded_by = u.id
                 LEFT JOIN faculties fa ON f.faculty_id = fa.id
                 LEFT JOIN colleges c ON f.college_id = c.id
-                WHERE f.is_public = 1
             '''
             params = []
             
+            # Scope through the closure table: a college covers the files of all its faculties
+            if faculty_id:
+                joins += ' ' + closure_join('f.faculty_id', 'faculty')
+                params.extend(['faculty', faculty_id])
+            elif college_id:
+                joins += ' ' + closure_join('f.faculty_id', 'faculty')
+                params.extend(['college', college_id])
+            
+            joins += ' WHERE f.is_public = 1'
+            
             if search:
-                query += ' AND (f.original_filename LIKE ? OR f.category LIKE ?)'
+                joins += ' AND (f.original_filename LIKE ? OR f.category LIKE ?)'
                 params.extend([f'%{search}%', f'%{search}%'])
             
             if category:
-                query += ' AND f.category = ?'
+                joins += ' AND f.category = ?'
                 params.append(category)
             
-            if faculty_id:
-                query += ' AND f.faculty_id = ?'
-                params.append(faculty_id)
-            
-            query += ' ORDER BY f.created_at DESC LIMIT ? OFFSET ?'
-            params.extend([per_page, (page - 1) * per_page])
-            
-            files = conn.execute(query, params).fetchall()
-            
-            # Get total count
-            count_query = query.split('ORDER BY')[0].replace('SELECT f.*, u.name as uploaded_by_name, fa.name as faculty_name, c.name as college_name', 'SELECT COUNT(*)')
-            total = conn.execute(count_query, params[:-2]).fetchone()[0]
+            files, meta = paginate(
+                conn,
+                'SELECT f.*, u.name as uploaded_by_name, fa.name as faculty_name, c.name as college_name' + joins,
+                'SELECT COUNT(*)' + joins,
+                params, page_args, prefix='f.'
+            )
             
-            return jsonify({
-                'data': [dict(file) for file in files],
-                'total': total,
-                'page': page,
-                'per_page': per_page,
-                'pages': (total + per_page - 1) // per_page
-            })
+            return jsonify({'data': [dict(file) for file in files], **meta})
             
+    except InvalidCursorError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         current_app.logger.error(f'Get files error: {str(e)}')
         return jsonify({'error': 'Failed to fetch files'}), 500
 
 @downloads_bp.route('/faculties', methods=['GET'])
+@cached_response('files', 'faculties')
 def get_faculties():
     """Get list of faculties for filtering"""
     try:
@@ -99,11 +119,21 @@ def download_file(file_id):
             if not os.path.exists(file_path):
                 return jsonify({'error': 'File not found on disk'}), 404
             
+            response = serve_file(
+                current_app.config['UPLOAD_FOLDER'],
+                file_record['file_path'],
+                mimetype=file_record['mime_type'],
+                etag=file_record['file_hash'],
+                download_name=file_record['original_filename'],
+                as_attachment=True
+            )
+            
+            # Revalidations and resumed ranges are not new downloads
+            if is_continuation(response):
+                return response
+            
             # Update download count
-            conn.execute('''
-                UPDATE files SET download_count = download_count + 1 
-                WHERE id = ?
-            ''', (file_id,))
+            download_counter.increment(file_id)
             
             # Log download activity
             user_id = None
@@ -123,20 +153,14 @@ def download_file(file_id):
                     user_agent=request.headers.get('User-Agent')
                 )
             
-            conn.commit()
-            
-            return send_file(
-                file_path,
-                as_attachment=True,
-                download_name=file_record['original_filename'],
-                mimetype=file_record['mime_type']
-            )
+            return response
             
     except Exception as e:
         current_app.logger.error(f'Download file error: {str(e)}')
         return jsonify({'error': 'Failed to download file'}), 500
 
 @downloads_bp.route('/stats', methods=['GET'])
+@cached_response('files', ttl=60)
 def get_download_stats():
     """Get download statistics"""
     try:
@@ -1,30 +1,24 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-import sqlite3
-import os
+from ..database import get_db_connection
+from ..utils.cache import cached_response, invalidate_tags
+from ..utils.hierarchy import refresh_hierarchy
 from ..utils.permissions import admin_required
 from ..utils.validators import validate_faculty_data
 
 faculties_bp = Blueprint('faculties', __name__)
 
-def get_db_connection():
-    """Get database connection"""
-    db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'university.db')
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    return conn
-
 @faculties_bp.route('/', methods=['GET'])
+@cached_response('faculties')
 def get_faculties():
     """Get all faculties"""
     try:
         conn = get_db_connection()
+        # departments_count is kept current by triggers (see utils/counters.py)
         faculties = conn.execute("""
-            SELECT f.*, COUNT(d.id) as department_count
+            SELECT f.*, f.departments_count as department_count
             FROM faculties f
-            LEFT JOIN departments d ON f.id = d.faculty_id
-            WHERE f.active = 1
-            GROUP BY f.id
+            WHERE f.is_active = 1
             ORDER BY f.name
         """).fetchall()
         conn.close()
@@ -75,11 +69,9 @@ def get_faculty_departments(faculty_id):
             return jsonify({'error': 'Faculty not found'}), 404
         
         departments = conn.execute("""
-            SELECT d.*, COUNT(p.id) as program_count
+            SELECT d.*
             FROM departments d
-            LEFT JOIN programs p ON d.id = p.department_id
             WHERE d.faculty_id = ? AND d.active = 1
-            GROUP BY d.id
             ORDER BY d.name
         """, (faculty_id,)).fetchall()
         
@@ -152,6 +144,8 @@ def create_faculty():
         faculty_id = cursor.lastrowid
         conn.commit()
         conn.close()
+        refresh_hierarchy()
+        invalidate_tags('faculties')
         
         return jsonify({'message': 'Faculty created successfully', 'id': faculty_id}), 201
         
@@ -198,6 +192,8 @@ def update_faculty(faculty_id):
         
         conn.commit()
         conn.close()
+        refresh_hierarchy()
+        invalidate_tags('faculties')
         
         return jsonify({'message': 'Faculty updated successfully'})
         
@@ -222,6 +218,8 @@ def delete_faculty(faculty_id):
         conn.execute("UPDATE faculties SET active = 0 WHERE id = ?", (faculty_id,))
         conn.commit()
         conn.close()
+        refresh_hierarchy()
+        invalidate_tags('faculties')
         
         return jsonify({'message': 'Faculty deleted successfully'})
         
@@ -263,6 +261,8 @@ def create_department(faculty_id):
         department_id = cursor.lastrowid
         conn.commit()
         conn.close()
+        refresh_hierarchy()
+        invalidate_tags('faculties')
         
         return jsonify({'message': 'Department created successfully', 'id': department_id}), 201
         
@@ -305,6 +305,8 @@ def update_department(department_id):
         
         conn.commit()
         conn.close()
+        refresh_hierarchy()
+        invalidate_tags('faculties')
         
         return jsonify({'message': 'Department updated successfully'})
         
@@ -329,6 +331,8 @@ def delete_department(department_id):
         conn.execute("UPDATE departments SET active = 0 WHERE id = ?", (department_id,))
         conn.commit()
         conn.close()
+        refresh_hierarchy()
+        invalidate_tags('faculties')
         
         return jsonify({'message': 'Department deleted successfully'})
         
@@ -1,76 +1,46 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-import sqlite3
-import os
 from datetime import datetime
+from ..database import get_db_connection
+from ..utils.pagination import InvalidCursorError, get_page_args, paginate
 from ..utils.permissions import admin_required
 from ..utils.validators import validate_startup_data
 
 incubator_bp = Blueprint('incubator', __name__)
 
-def get_db_connection():
-    """Get database connection"""
-    db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'university.db')
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    return conn
-
 @incubator_bp.route('/startups', methods=['GET'])
 def get_startups():
     """Get all incubator startups"""
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = min(request.args.get('per_page', 10, type=int), 50)
+        page_args = get_page_args()
         stage = request.args.get('stage')
         industry = request.args.get('industry')
         
         conn = get_db_connection()
         
         # Build query
-        query = """
-            SELECT s.*, u.username as founder_name 
-            FROM startups s 
-            LEFT JOIN users u ON s.founder_id = u.id 
-            WHERE s.active = 1
-        """
+        where = " WHERE s.active = 1"
         params = []
         
         if stage:
-            query += " AND s.stage = ?"
+            where += " AND s.stage = ?"
             params.append(stage)
             
         if industry:
-            query += " AND s.industry = ?"
+            where += " AND s.industry = ?"
             params.append(industry)
         
-        query += " ORDER BY s.created_at DESC LIMIT ? OFFSET ?"
-        params.extend([per_page, (page - 1) * per_page])
-        
-        startups = conn.execute(query, params).fetchall()
-        
-        # Get total count
-        count_query = "SELECT COUNT(*) FROM startups WHERE active = 1"
-        count_params = []
-        
-        if stage:
-            count_query += " AND stage = ?"
-            count_params.append(stage)
-            
-        if industry:
-            count_query += " AND industry = ?"
-            count_params.append(industry)
-        
-        total = conn.execute(count_query, count_params).fetchone()[0]
+        startups, meta = paginate(conn, """
+            SELECT s.*, u.username as founder_name 
+            FROM startups s 
+            LEFT JOIN users u ON s.founder_id = u.id
+        """ + where, "SELECT COUNT(*) FROM startups s" + where, params, page_args, prefix='s.')
         conn.close()
         
-        return jsonify({
-            'startups': [dict(startup) for startup in startups],
-            'total': total,
-            'page': page,
-            'per_page': per_page,
-            'pages': (total + per_page - 1) // per_page
-        })
+        return jsonify({'startups': [dict(startup) for startup in startups], **meta})
         
+    except InvalidCursorError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
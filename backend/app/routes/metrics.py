@@ -0,0 +1,155 @@
+from flask import Blueprint, Response, current_app, jsonify, request
+import hmac
+import sqlite3
+from .. import limiter
+from ..database import audit_log, get_db_connection, get_pool_stats
+from ..utils.cache import get_response_cache
+from ..utils.images import get_image_processor
+from ..utils.metrics import PrometheusText, RequestMetrics
+from ..utils.passwords import get_password_hasher
+from ..utils.permissions import principal_cache
+from ..utils.transforms import get_transform_cache
+from ..utils.user_agent import user_agent_cache_stats
+
+metrics_bp = Blueprint('metrics', __name__)
+
+request_metrics = RequestMetrics()
+
+@metrics_bp.record_once
+def instrument_requests(state):
+    app = state.app
+
+    @app.before_request
+    def start_request_timer():
+        request.environ['metrics.started'] = request_metrics.start()
+
+    @app.after_request
+    def record_request(response):
+        started = request.environ.pop('metrics.started', None)
+        if started is not None:
+            rule = request.url_rule
+            request_metrics.observe(
+                (request.blueprint or '', rule.rule if rule else 'unmatched', request.method, response.status_code),
+                started
+            )
+        return response
+
+def request_families(exposition):
+    series = request_metrics.snapshot()
+    labelled = [
+        ({'blueprint': blueprint, 'route': route, 'method': method, 'status': status}, snapshot)
+        for (blueprint, route, method, status), snapshot in sorted(series.items(), key=lambda item: str(item[0]))
+    ]
+    exposition.metric('http_requests_total', 'counter', 'HTTP requests by route and status',
+                      [(labels, snapshot['count']) for labels, snapshot in labelled])
+    exposition.histogram('http_request_duration_seconds', 'Time to build the response', labelled)
+    exposition.metric('http_requests_in_flight', 'gauge', 'Requests currently being handled',
+                      [({}, request_metrics.in_flight())])
+
+def database_families(exposition):
+    pool = get_pool_stats()
+    for key, kind, help_text in (
+        ('size', 'gauge', 'Maximum pooled connections'),
+        ('open', 'gauge', 'Open connections'),
+        ('in_use', 'gauge', 'Connections checked out'),
+        ('idle', 'gauge', 'Idle connections'),
+        ('checkouts', 'counter', 'Connection checkouts'),
+        ('waits', 'counter', 'Checkouts that waited for a free connection'),
+        ('timeouts', 'counter', 'Checkouts that timed out'),
+        ('connections_created', 'counter', 'Connections opened'),
+        ('connections_recycled', 'counter', 'Connections closed for age')
+    ):
+        name = f'db_pool_{key}_total' if kind == 'counter' else f'db_pool_{key}'
+        exposition.metric(name, kind, help_text, [({}, pool[key])])
+
+def cache_families(exposition):
+    caches = {
+        'response': get_response_cache().stats(),
+        'principal': principal_cache.stats(),
+        'user_agent': user_agent_cache_stats(),
+        'image_transform': get_transform_cache().stats()
+    }
+    exposition.metric('cache_hits_total', 'counter', 'Cache hits',
+                      [({'cache': name}, stats['hits']) for name, stats in caches.items()])
+    exposition.metric('cache_misses_total', 'counter', 'Cache misses',
+                      [({'cache': name}, stats['misses']) for name, stats in caches.items()])
+    exposition.metric('cache_hit_ratio', 'gauge', 'Hits over lookups since start',
+                      [({'cache': name}, stats['hit_rate']) for name, stats in caches.items()])
+    exposition.metric('cache_entries', 'gauge', 'Entries held',
+                      [({'cache': name}, stats.get('entries', stats.get('size'))) for name, stats in caches.items()])
+
+def queue_families(exposition):
+    from .analytics import page_view_writer
+    from .downloads import download_counter
+    from .news import news_view_counter
+
+    writers = {'page-views': page_view_writer.stats(), 'audit-log': audit_log.stats()}
+    for key, kind, help_text in (
+        ('queue_depth', 'gauge', 'Rows buffered and not yet written'),
+        ('capacity', 'gauge', 'Buffer capacity'),
+        ('submitted', 'counter', 'Rows accepted into the buffer'),
+        ('flushed', 'counter', 'Rows written to the database'),
+        ('dropped', 'counter', 'Rows rejected or dropped because the buffer was full'),
+        ('failed_flushes', 'counter', 'Batches that failed to write')
+    ):
+        name = f'write_behind_{key}_total' if kind == 'counter' else f'write_behind_{key}'
+        exposition.metric(name, kind, help_text,
+                          [({'queue': queue}, stats[key]) for queue, stats in writers.items()])
+
+    counters = {counter.name: counter.stats() for counter in (news_view_counter, download_counter)}
+    exposition.metric('write_behind_counter_pending', 'gauge', 'Counter increments not yet written',
+                      [({'counter': name}, stats['pending_increments']) for name, stats in counters.items()])
+
+def upload_families(exposition):
+    images = get_image_processor().stats()
+    exposition.metric('image_processing_pending', 'gauge', 'Uploads waiting for image variants',
+                      [({}, images['pending'])])
+    exposition.metric('image_processing_completed_total', 'counter', 'Uploads whose variants were generated',
+                      [({}, images['completed'])])
+    exposition.metric('image_processing_failed_total', 'counter', 'Uploads whose variants failed',
+                      [({}, images['failed'])])
+
+    # Backlog across all workers, from the database
+    try:
+        with get_db_connection() as conn:
+            pending = conn.execute(
+                "SELECT COUNT(*) FROM uploads WHERE processing_status = 'pending'"
+            ).fetchone()[0]
+            sessions = conn.execute(
+                'SELECT COUNT(*) FROM upload_sessions WHERE expires_at > CURRENT_TIMESTAMP'
+            ).fetchone()[0]
+    except sqlite3.Error as e:
+        current_app.logger.warning(f'Metrics upload backlog query failed: {str(e)}')
+        return
+    exposition.metric('uploads_processing_pending', 'gauge', 'Stored uploads still marked pending',
+                      [({}, pending)])
+    exposition.metric('upload_sessions_active', 'gauge', 'Unexpired chunked upload sessions',
+                      [({}, sessions)])
+
+def password_families(exposition):
+    hasher = get_password_hasher()
+    stats = hasher.stats()
+    exposition.metric('password_hash_pending', 'gauge', 'Hash or verify jobs queued or running',
+                      [({}, stats['pending'])])
+    exposition.metric('password_hash_shed_total', 'counter', 'Jobs rejected because the queue was full',
+                      [({}, stats['shed'])])
+    exposition.histogram('password_hash_duration_seconds', 'bcrypt hash and verify latency',
+                         [({'operation': kind}, histogram.snapshot()) for kind, histogram in hasher.latency.items()])
+
+@metrics_bp.route('/metrics', methods=['GET'])
+@limiter.exempt
+def get_metrics():
+    """Runtime metrics in the Prometheus text format"""
+    token = current_app.config.get('METRICS_TOKEN')
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    try:
+        exposition = PrometheusText('portal')
+        for families in (request_families, database_families, cache_families,
+                         queue_families, upload_families, password_families):
+            families(exposition)
+        return Response(exposition.render(), content_type=PrometheusText.CONTENT_TYPE)
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -2,77 +2,83 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
-import sqlite3
-import os
 from datetime import datetime
+from ..database import get_db_connection
+from ..utils.batching import CounterAggregator
+from ..utils.cache import cached_response, invalidate_tags
+from ..utils.pagination import InvalidCursorError, get_page_args, paginate
 from ..utils.permissions import admin_required
+from ..utils.search import NEWS_SEARCH_RANK, NEWS_SEARCH_SNIPPET, build_match_query, news_search_enabled
 from ..utils.validators import validate_news_data
 
 news_bp = Blueprint('news', __name__)
 
-def get_db_connection():
-    """Get database connection"""
-    db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'university.db')
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    return conn
+def write_news_views(counts):
+    """Apply a batch of buffered article view increments in one transaction"""
+    with get_db_connection() as conn:
+        conn.executemany(
+            "UPDATE news SET views = views + ? WHERE id = ?",
+            [(views, news_id) for news_id, views in counts.items()]
+        )
+        conn.commit()
+
+# Article views are counted in memory and written behind in batches so
+# reading an article never takes the SQLite write lock
+news_view_counter = CounterAggregator('news-views', write_news_views)
+
+@news_bp.record_once
+def configure_view_counter(state):
+    news_view_counter.configure(flush_interval=state.app.config.get('COUNTER_FLUSH_INTERVAL', 5.0))
 
 @news_bp.route('/', methods=['GET'])
+@cached_response('news')
 def get_news():
     """Get all news articles with pagination"""
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = min(request.args.get('per_page', 10, type=int), 50)
+        page_args = get_page_args()
         category = request.args.get('category')
         search = request.args.get('search')
         
         conn = get_db_connection()
         
         # Build query
-        query = """
-            SELECT n.*, u.username as author_name 
-            FROM news n 
-            LEFT JOIN users u ON n.author_id = u.id 
-            WHERE n.published = 1
-        """
+        match = build_match_query(search) if search else ''
+        use_index = bool(match) and news_search_enabled(conn)
+        
+        select = "SELECT n.*, u.username as author_name"
+        joins = " FROM news n LEFT JOIN users u ON n.author_id = u.id"
+        where = " WHERE n.published = 1"
         params = []
         
+        if use_index:
+            select += f", {NEWS_SEARCH_SNIPPET} as snippet"
+            joins += " JOIN news_fts ON news_fts.rowid = n.id"
+            where += " AND news_fts MATCH ?"
+            params.append(match)
+        elif search:
+            like_columns = ['n.title', 'n.title_ar', 'n.title_fr', 'n.content', 'n.content_ar', 'n.content_fr']
+            where += " AND (" + " OR ".join(f"{column} LIKE ?" for column in like_columns) + ")"
+            params.extend([f'%{search}%'] * len(like_columns))
+        
         if category:
-            query += " AND n.category = ?"
+            where += " AND n.category = ?"
             params.append(category)
-            
-        if search:
-            query += " AND (n.title LIKE ? OR n.content LIKE ?)"
-            params.extend([f'%{search}%', f'%{search}%'])
-        
-        query += " ORDER BY n.created_at DESC LIMIT ? OFFSET ?"
-        params.extend([per_page, (page - 1) * per_page])
         
-        news = conn.execute(query, params).fetchall()
+        count_query = "SELECT COUNT(*) FROM news n"
+        if use_index:
+            count_query += " JOIN news_fts ON news_fts.rowid = n.id"
         
-        # Get total count
-        count_query = "SELECT COUNT(*) FROM news WHERE published = 1"
-        count_params = []
-        
-        if category:
-            count_query += " AND category = ?"
-            count_params.append(category)
-            
-        if search:
-            count_query += " AND (title LIKE ? OR content LIKE ?)"
-            count_params.extend([f'%{search}%', f'%{search}%'])
-        
-        total = conn.execute(count_query, count_params).fetchone()[0]
+        # Search results are ranked in page mode; cursor mode walks them by date
+        news, meta = paginate(
+            conn, select + joins + where, count_query + where, params, page_args,
+            prefix='n.', order=NEWS_SEARCH_RANK if use_index else None
+        )
         conn.close()
         
-        return jsonify({
-            'news': [dict(article) for article in news],
-            'total': total,
-            'page': page,
-            'per_page': per_page,
-            'pages': (total + per_page - 1) // per_page
-        })
+        return jsonify({'news': [dict(article) for article in news], **meta})
         
+    except InvalidCursorError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -88,14 +94,13 @@ def get_news_article(news_id):
             WHERE n.id = ? AND n.published = 1
         """, (news_id,)).fetchone()
         
+        conn.close()
+        
         if not article:
-            conn.close()
             return jsonify({'error': 'Article not found'}), 404
         
         # Increment view count
-        conn.execute("UPDATE news SET views = views + 1 WHERE id = ?", (news_id,))
-        conn.commit()
-        conn.close()
+        news_view_counter.increment(news_id)
         
         return jsonify(dict(article))
         
@@ -103,6 +108,7 @@ def get_news_article(news_id):
         return jsonify({'error': str(e)}), 500
 
 @news_bp.route('/categories', methods=['GET'])
+@cached_response('news')
 def get_categories():
     """Get all news categories"""
     try:
@@ -122,6 +128,7 @@ def get_categories():
         return jsonify({'error': str(e)}), 500
 
 @news_bp.route('/featured', methods=['GET'])
+@cached_response('news')
 def get_featured_news():
     """Get featured news articles"""
     try:
@@ -176,6 +183,7 @@ def create_news():
         news_id = cursor.lastrowid
         conn.commit()
         conn.close()
+        invalidate_tags('news')
         
         return jsonify({'message': 'News article created successfully', 'id': news_id}), 201
         
@@ -221,6 +229,7 @@ def update_news(news_id):
         
         conn.commit()
         conn.close()
+        invalidate_tags('news')
         
         return jsonify({'message': 'News article updated successfully'})
         
@@ -244,6 +253,7 @@ def delete_news(news_id):
         conn.execute("DELETE FROM news WHERE id = ?", (news_id,))
         conn.commit()
         conn.close()
+        invalidate_tags('news')
         
         return jsonify({'message': 'News article deleted successfully'})
         
@@ -256,29 +266,21 @@ def delete_news(news_id):
 def get_admin_news():
     """Get all news articles for admin (including unpublished)"""
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = min(request.args.get('per_page', 10, type=int), 50)
+        page_args = get_page_args()
         
         conn = get_db_connection()
         
-        news = conn.execute("""
+        news, meta = paginate(conn, """
             SELECT n.*, u.username as author_name 
             FROM news n 
             LEFT JOIN users u ON n.author_id = u.id 
-            ORDER BY n.created_at DESC 
-            LIMIT ? OFFSET ?
-        """, (per_page, (page - 1) * per_page)).fetchall()
-        
-        total = conn.execute("SELECT COUNT(*) FROM news").fetchone()[0]
+            WHERE 1=1
+        """, "SELECT COUNT(*) FROM news n WHERE 1=1", [], page_args, prefix='n.')
         conn.close()
         
-        return jsonify({
-            'news': [dict(article) for article in news],
-            'total': total,
-            'page': page,
-            'per_page': per_page,
-            'pages': (total + per_page - 1) // per_page
-        })
+        return jsonify({'news': [dict(article) for article in news], **meta})
         
+    except InvalidCursorError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -1,52 +1,119 @@
-from flask import Blueprint, request, jsonify, send_from_directory, current_app
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
+import json
+import mimetypes
 import os
-import uuid
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
 from werkzeug.utils import secure_filename
-from PIL import Image
-import sqlite3
+from ..database import get_db_connection
+from ..utils.blobstore import blob_path, derived_path, digest_from_name, get_blob_store
+from ..utils.file_serving import serve_file
+from ..utils.images import InvalidImageError, build_srcset, check_image, get_image_processor, variants_url
+from ..utils.transforms import InvalidTransformError, configure_transform_cache, get_transform_cache
+from ..utils.resumable import UploadSessionError, resumable_uploads
+from ..utils.pagination import InvalidCursorError, get_page_args, paginate
 from ..utils.permissions import admin_required
 
 uploads_bp = Blueprint('uploads', __name__)
 
-def get_db_connection():
-    """Get database connection"""
-    db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'university.db')
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    return conn
+DOCUMENT_EXTENSIONS = {'pdf', 'doc', 'docx', 'txt', 'rtf', 'odt'}
+
+@uploads_bp.record_once
+def configure_resumable_uploads(state):
+    config = state.app.config
+    resumable_uploads.configure(
+        chunk_size=config.get('CHUNKED_UPLOAD_CHUNK_SIZE'),
+        max_size=config.get('CHUNKED_UPLOAD_MAX_SIZE'),
+        ttl=config.get('CHUNKED_UPLOAD_TTL')
+    )
+    configure_transform_cache(
+        os.path.join(config['UPLOAD_FOLDER'], 'cache'),
+        max_bytes=config.get('IMAGE_TRANSFORM_CACHE_SIZE', 512 * 1024 * 1024),
+        sizes=config.get('IMAGE_TRANSFORM_SIZES', (64, 150, 320, 480, 640, 960, 1280)),
+        quality=config.get('IMAGE_QUALITY', 82)
+    )
 
 def allowed_file(filename, allowed_extensions):
     """Check if file extension is allowed"""
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in allowed_extensions
 
-def generate_unique_filename(filename):
-    """Generate a unique filename"""
-    ext = filename.rsplit('.', 1)[1].lower()
-    unique_filename = f"{uuid.uuid4().hex}.{ext}"
-    return unique_filename
+def file_extension(filename):
+    return filename.rsplit('.', 1)[1].lower()
 
-def resize_image(image_path, max_width=1200, max_height=800, quality=85):
-    """Resize image to optimize file size"""
-    try:
-        with Image.open(image_path) as img:
-            # Convert RGBA to RGB if necessary
-            if img.mode in ('RGBA', 'LA'):
-                background = Image.new('RGB', img.size, (255, 255, 255))
-                background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                img = background
-            
-            # Calculate new dimensions
-            width, height = img.size
-            if width > max_width or height > max_height:
-                img.thumbnail((max_width, max_height), Image.Resampling.LANCZOS)
-            
-            # Save optimized image
-            img.save(image_path, optimize=True, quality=quality)
-            
-    except Exception as e:
-        print(f"Error resizing image: {e}")
+def find_upload_blob(upload_type, filename, digest):
+    """Check a blob name against the uploads table for one route.
+
+    Returns (upload, shared_with_private): the upload of ``upload_type``
+    stored under ``filename`` (a finished one if there are several, None if
+    there is none), and whether a private document references the same
+    bytes. Blobs are shared across upload types, so the route a request came
+    in on must not be enough to reach them.
+    """
+    conn = get_db_connection()
+    rows = conn.execute("""
+        SELECT upload_type, filename, processing_status, variants FROM uploads WHERE file_hash = ?
+    """, (digest,)).fetchall()
+    conn.close()
+    matches = [row for row in rows if row['upload_type'] == upload_type and row['filename'] == filename]
+    upload = max(matches, key=lambda row: row['processing_status'] == 'ready', default=None)
+    return upload, any(row['upload_type'] == 'document' for row in rows)
+
+def published_image(upload, digest):
+    """Path of the image to serve for an upload, or None until its worker job is ready.
+
+    That is the worker's copy without metadata; uploads processed before it
+    wrote one are served from the blob as before.
+    """
+    if upload['processing_status'] in ('pending', 'failed'):
+        return None
+    manifest = json.loads(upload['variants']) if upload['variants'] else {}
+    if manifest.get('clean'):
+        return f"{derived_path(digest)}/{manifest['clean']}"
+    return blob_path(digest)
+
+def serve_upload(folder, upload_type, filename, private=False, transformable=False):
+    """Serve a content-addressed blob, or a file saved under its old random name.
+
+    Images accept ``?w=&h=&fmt=`` and are then served from the resized image cache.
+    """
+    digest = digest_from_name(filename)
+    relative = f'{folder}/{filename}'
+    if digest:
+        upload, shared_with_private = find_upload_blob(upload_type, filename, digest)
+        if upload is None:
+            raise NotFound()
+        # Never let shared caches keep bytes that are also a private document
+        private = private or shared_with_private
+        relative = blob_path(digest) if upload_type == 'document' else published_image(upload, digest)
+        if relative is None:
+            raise NotFound()
+    if transformable:
+        cache = get_transform_cache()
+        transform = cache.parse(request.args, filename.rsplit('.', 1)[-1])
+        if transform:
+            source = safe_join(current_app.config['UPLOAD_FOLDER'], relative)
+            if source is None or not os.path.isfile(source):
+                raise NotFound()
+            source_key = digest or f'{relative}:{os.path.getmtime(source)}'
+            return serve_file(cache.root, cache.get(source, source_key, *transform),
+                              immutable=True, private=private)
+    if digest:
+        return serve_file(current_app.config['UPLOAD_FOLDER'], relative,
+                          mimetype=mimetypes.guess_type(filename)[0], etag=digest,
+                          immutable=True, private=private)
+    # Upload names are unique and never rewritten, so clients may cache them for good
+    return serve_file(current_app.config['UPLOAD_FOLDER'], relative, immutable=True, private=private)
+
+def remove_upload_file(conn, upload):
+    """Release an upload's blob (or delete its legacy file); returns a blob to collect after commit"""
+    if upload['file_hash']:
+        return upload['file_hash'] if get_blob_store().release(conn, upload['file_hash']) else None
+    file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], upload['file_path'])
+    if os.path.exists(file_path):
+        os.remove(file_path)
+    return None
 
 @uploads_bp.route('/image', methods=['POST'])
 @jwt_required()
@@ -65,50 +132,60 @@ def upload_image():
         if not allowed_file(file.filename, allowed_extensions):
             return jsonify({'error': 'Invalid file type. Allowed: jpg, jpeg, png, gif, webp'}), 400
         
-        # Generate unique filename
-        filename = generate_unique_filename(file.filename)
+        # Stream to a temp file, hashing while it is written
+        ext = file_extension(file.filename)
+        store = get_blob_store()
+        temp_path, file_hash, file_size = store.write(file.stream, suffix=f'.{ext}')
         
-        # Create upload directory if it doesn't exist
-        upload_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], 'images')
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        # Save file
-        file_path = os.path.join(upload_dir, filename)
-        file.save(file_path)
-        
-        # Resize image for optimization
-        resize_image(file_path)
+        # Cheap structural check here; the worker strips metadata before anything is published
+        try:
+            ext = check_image(temp_path, current_app.config['IMAGE_MAX_PIXELS'])
+            if ext not in ('jpg', 'png', 'gif', 'webp'):
+                raise InvalidImageError('Image content does not match an allowed type')
+        except InvalidImageError as e:
+            os.remove(temp_path)
+            return jsonify({'error': str(e)}), 400
         
-        # Get file info
-        file_size = os.path.getsize(file_path)
         current_user_id = get_jwt_identity()
         
-        # Save to database
+        # Store by content hash and save to database
         conn = get_db_connection()
+        file_path, file_hash, file_size, deduplicated = store.add(conn, temp_path, file_hash, file_size)
+        filename = f'{file_hash}.{ext}'
         cursor = conn.execute("""
             INSERT INTO uploads (filename, original_filename, file_path, file_size, 
-                               file_type, uploaded_by, upload_type)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
+                               file_type, uploaded_by, upload_type, file_hash, processing_status)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
         """, (
             filename,
             secure_filename(file.filename),
-            f'images/{filename}',
+            file_path,
             file_size,
             'image',
             current_user_id,
-            'image'
+            'image',
+            file_hash,
+            'pending'
         ))
         
         upload_id = cursor.lastrowid
         conn.commit()
         conn.close()
         
+        # Variants and the clean copy are made in the background; clients poll the status URL
+        status = get_image_processor().submit(
+            upload_id, store.root, file_hash, os.path.join(store.root, *file_path.split('/')), 'image'
+        )
+        
         return jsonify({
             'message': 'Image uploaded successfully',
             'id': upload_id,
             'filename': filename,
-            'url': f'/api/uploads/images/{filename}',
-            'size': file_size
+            'url': f'/api/uploads/images/{filename}' if status == 'ready' else None,
+            'size': file_size,
+            'deduplicated': deduplicated,
+            'status': status,
+            'status_url': f'/api/uploads/{upload_id}/variants'
         }), 201
         
     except Exception as e:
@@ -127,39 +204,168 @@ def upload_document():
             return jsonify({'error': 'No file selected'}), 400
         
         # Check file type
-        allowed_extensions = {'pdf', 'doc', 'docx', 'txt', 'rtf', 'odt'}
-        if not allowed_file(file.filename, allowed_extensions):
+        if not allowed_file(file.filename, DOCUMENT_EXTENSIONS):
+            return jsonify({'error': 'Invalid file type. Allowed: pdf, doc, docx, txt, rtf, odt'}), 400
+        
+        # Stream to a temp file, hashing while it is written
+        ext = file_extension(file.filename)
+        store = get_blob_store()
+        temp_path, file_hash, file_size = store.write(file.stream, suffix=f'.{ext}')
+        
+        current_user_id = get_jwt_identity()
+        
+        # Store by content hash and save to database
+        conn = get_db_connection()
+        file_path, file_hash, file_size, deduplicated = store.add(conn, temp_path, file_hash, file_size)
+        filename = f'{file_hash}.{ext}'
+        cursor = conn.execute("""
+            INSERT INTO uploads (filename, original_filename, file_path, file_size, 
+                               file_type, uploaded_by, upload_type, file_hash)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            filename,
+            secure_filename(file.filename),
+            file_path,
+            file_size,
+            'document',
+            current_user_id,
+            'document',
+            file_hash
+        ))
+        
+        upload_id = cursor.lastrowid
+        conn.commit()
+        conn.close()
+        
+        return jsonify({
+            'message': 'Document uploaded successfully',
+            'id': upload_id,
+            'filename': filename,
+            'url': f'/api/uploads/documents/{filename}',
+            'size': file_size,
+            'deduplicated': deduplicated
+        }), 201
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def session_error_response(error):
+    response = jsonify({'error': str(error), 'offset': error.offset})
+    if error.offset is not None:
+        response.headers['Upload-Offset'] = str(error.offset)
+    return response, error.status
+
+@uploads_bp.route('/sessions', methods=['POST'])
+@jwt_required()
+def create_upload_session():
+    """Start a resumable chunked document upload"""
+    try:
+        data = request.get_json() or {}
+        filename = secure_filename(data.get('filename', ''))
+        if not allowed_file(filename, DOCUMENT_EXTENSIONS):
             return jsonify({'error': 'Invalid file type. Allowed: pdf, doc, docx, txt, rtf, odt'}), 400
+        try:
+            size = int(data.get('size'))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'File size is required'}), 400
+        
+        conn = get_db_connection()
+        session = resumable_uploads.create(
+            conn, current_app.config['UPLOAD_FOLDER'], get_jwt_identity(),
+            filename, file_extension(filename), size
+        )
+        conn.close()
         
-        # Generate unique filename
-        filename = generate_unique_filename(file.filename)
+        response = jsonify({**session, 'upload_url': f"/api/uploads/sessions/{session['id']}"})
+        response.headers['Location'] = f"/api/uploads/sessions/{session['id']}"
+        response.headers['Upload-Offset'] = '0'
+        return response, 201
         
-        # Create upload directory if it doesn't exist
-        upload_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], 'documents')
-        os.makedirs(upload_dir, exist_ok=True)
+    except UploadSessionError as e:
+        return session_error_response(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@uploads_bp.route('/sessions/<session_id>', methods=['GET'])
+@jwt_required()
+def get_upload_session(session_id):
+    """Get the offset to resume a chunked upload from"""
+    try:
+        conn = get_db_connection()
+        session = resumable_uploads.get(conn, session_id, get_jwt_identity())
+        conn.close()
         
-        # Save file
-        file_path = os.path.join(upload_dir, filename)
-        file.save(file_path)
+        response = jsonify({
+            'id': session['id'],
+            'filename': session['filename'],
+            'offset': session['received'],
+            'size': session['total_size'],
+            'chunk_size': resumable_uploads.chunk_size,
+            'expires_at': session['expires_at']
+        })
+        response.headers['Upload-Offset'] = str(session['received'])
+        return response
+        
+    except UploadSessionError as e:
+        return session_error_response(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@uploads_bp.route('/sessions/<session_id>', methods=['PATCH'])
+@jwt_required()
+def append_upload_chunk(session_id):
+    """Append a raw chunk at the Upload-Offset header's position"""
+    try:
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+        except ValueError:
+            return jsonify({'error': 'Upload-Offset header is required'}), 400
         
-        # Get file info
-        file_size = os.path.getsize(file_path)
+        conn = get_db_connection()
+        session = resumable_uploads.get(conn, session_id, get_jwt_identity())
+        new_offset = resumable_uploads.append(
+            conn, current_app.config['UPLOAD_FOLDER'], session, offset,
+            request.stream, request.content_length
+        )
+        conn.close()
+        
+        response = jsonify({'offset': new_offset, 'size': session['total_size']})
+        response.headers['Upload-Offset'] = str(new_offset)
+        return response
+        
+    except UploadSessionError as e:
+        return session_error_response(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@uploads_bp.route('/sessions/<session_id>/complete', methods=['POST'])
+@jwt_required()
+def complete_upload_session(session_id):
+    """Finish a chunked upload and store it as a document"""
+    try:
         current_user_id = get_jwt_identity()
+        store = get_blob_store()
         
-        # Save to database
         conn = get_db_connection()
+        session = resumable_uploads.get(conn, session_id, current_user_id)
+        part_path, file_hash, file_size = resumable_uploads.complete(conn, store.root, session)
+        
+        # The part file is already in the upload folder, so storing it is a rename
+        file_path, file_hash, file_size, deduplicated = store.add(conn, part_path, file_hash, file_size)
+        filename = f"{file_hash}.{session['extension']}"
         cursor = conn.execute("""
             INSERT INTO uploads (filename, original_filename, file_path, file_size, 
-                               file_type, uploaded_by, upload_type)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
+                               file_type, uploaded_by, upload_type, file_hash)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
         """, (
             filename,
-            secure_filename(file.filename),
-            f'documents/{filename}',
+            session['filename'],
+            file_path,
             file_size,
             'document',
             current_user_id,
-            'document'
+            'document',
+            file_hash
         ))
         
         upload_id = cursor.lastrowid
@@ -171,9 +377,29 @@ def upload_document():
             'id': upload_id,
             'filename': filename,
             'url': f'/api/uploads/documents/{filename}',
-            'size': file_size
+            'size': file_size,
+            'deduplicated': deduplicated
         }), 201
         
+    except UploadSessionError as e:
+        return session_error_response(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@uploads_bp.route('/sessions/<session_id>', methods=['DELETE'])
+@jwt_required()
+def abort_upload_session(session_id):
+    """Cancel a chunked upload and discard what was received"""
+    try:
+        conn = get_db_connection()
+        session = resumable_uploads.get(conn, session_id, get_jwt_identity())
+        resumable_uploads.abort(conn, current_app.config['UPLOAD_FOLDER'], session['id'])
+        conn.close()
+        
+        return jsonify({'message': 'Upload cancelled'})
+        
+    except UploadSessionError as e:
+        return session_error_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -194,77 +420,60 @@ def upload_avatar():
         if not allowed_file(file.filename, allowed_extensions):
             return jsonify({'error': 'Invalid file type. Allowed: jpg, jpeg, png'}), 400
         
-        # Generate unique filename
-        filename = generate_unique_filename(file.filename)
-        
-        # Create upload directory if it doesn't exist
-        upload_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], 'avatars')
-        os.makedirs(upload_dir, exist_ok=True)
+        # Stream to a temp file, hashing while it is written
+        ext = file_extension(file.filename)
+        store = get_blob_store()
+        temp_path, file_hash, file_size = store.write(file.stream, suffix=f'.{ext}')
         
-        # Save file
-        file_path = os.path.join(upload_dir, filename)
-        file.save(file_path)
-        
-        # Resize avatar (square, 300x300)
+        # Cheap structural check here; the worker strips metadata before anything is published
         try:
-            with Image.open(file_path) as img:
-                # Convert to RGB if necessary
-                if img.mode in ('RGBA', 'LA'):
-                    background = Image.new('RGB', img.size, (255, 255, 255))
-                    background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                    img = background
-                
-                # Make square crop
-                width, height = img.size
-                size = min(width, height)
-                left = (width - size) // 2
-                top = (height - size) // 2
-                right = left + size
-                bottom = top + size
-                
-                img = img.crop((left, top, right, bottom))
-                img = img.resize((300, 300), Image.Resampling.LANCZOS)
-                img.save(file_path, optimize=True, quality=90)
-                
-        except Exception as e:
-            print(f"Error processing avatar: {e}")
-        
-        # Get file info
-        file_size = os.path.getsize(file_path)
+            ext = check_image(temp_path, current_app.config['IMAGE_MAX_PIXELS'])
+            if ext not in ('jpg', 'png'):
+                raise InvalidImageError('Image content does not match an allowed type')
+        except InvalidImageError as e:
+            os.remove(temp_path)
+            return jsonify({'error': str(e)}), 400
+        
         current_user_id = get_jwt_identity()
         
-        # Save to database
+        # Store by content hash and save to database
         conn = get_db_connection()
+        file_path, file_hash, file_size, deduplicated = store.add(conn, temp_path, file_hash, file_size)
+        filename = f'{file_hash}.{ext}'
         cursor = conn.execute("""
             INSERT INTO uploads (filename, original_filename, file_path, file_size, 
-                               file_type, uploaded_by, upload_type)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
+                               file_type, uploaded_by, upload_type, file_hash, processing_status)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
         """, (
             filename,
             secure_filename(file.filename),
-            f'avatars/{filename}',
+            file_path,
             file_size,
             'image',
             current_user_id,
-            'avatar'
+            'avatar',
+            file_hash,
+            'pending'
         ))
         
         upload_id = cursor.lastrowid
-        
-        # Update user avatar
-        conn.execute("""
-            UPDATE users SET avatar_url = ? WHERE id = ?
-        """, (f'/api/uploads/avatars/{filename}', current_user_id))
-        
         conn.commit()
         conn.close()
         
+        # Variants and the clean copy are made in the background; clients poll the status URL
+        status = get_image_processor().submit(
+            upload_id, store.root, file_hash, os.path.join(store.root, *file_path.split('/')), 'avatar'
+        )
+        
         return jsonify({
             'message': 'Avatar uploaded successfully',
             'id': upload_id,
             'filename': filename,
-            'url': f'/api/uploads/avatars/{filename}',
-            'size': file_size
+            'url': f'/api/uploads/avatars/{filename}' if status == 'ready' else None,
+            'size': file_size,
+            'deduplicated': deduplicated,
+            'status': status,
+            'status_url': f'/api/uploads/{upload_id}/variants'
         }), 201
         
     except Exception as e:
@@ -274,8 +483,9 @@ def upload_avatar():
 def serve_image(filename):
     """Serve uploaded images"""
     try:
-        upload_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], 'images')
-        return send_from_directory(upload_dir, filename)
+        return serve_upload('images', 'image', filename, transformable=True)
+    except InvalidTransformError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': 'File not found'}), 404
 
@@ -284,8 +494,7 @@ def serve_image(filename):
 def serve_document(filename):
     """Serve uploaded documents (requires authentication)"""
     try:
-        upload_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], 'documents')
-        return send_from_directory(upload_dir, filename)
+        return serve_upload('documents', 'document', filename, private=True)
     except Exception as e:
         return jsonify({'error': 'File not found'}), 404
 
@@ -293,11 +502,54 @@ def serve_document(filename):
 def serve_avatar(filename):
     """Serve avatar images"""
     try:
-        upload_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], 'avatars')
-        return send_from_directory(upload_dir, filename)
+        return serve_upload('avatars', 'avatar', filename, transformable=True)
+    except InvalidTransformError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': 'File not found'}), 404
+
+@uploads_bp.route('/variants/<digest>/<filename>')
+def serve_variant(digest, filename):
+    """Serve a generated image variant"""
+    try:
+        if not digest_from_name(digest):
+            return jsonify({'error': 'File not found'}), 404
+        return serve_file(current_app.config['UPLOAD_FOLDER'], f'{derived_path(digest)}/{filename}', immutable=True)
     except Exception as e:
         return jsonify({'error': 'File not found'}), 404
 
+@uploads_bp.route('/<int:upload_id>/variants', methods=['GET'])
+@jwt_required()
+def get_upload_variants(upload_id):
+    """Get image processing status and the srcset manifest of an upload"""
+    try:
+        conn = get_db_connection()
+        upload = conn.execute("""
+            SELECT id, filename, file_hash, upload_type, processing_status, variants FROM uploads WHERE id = ?
+        """, (upload_id,)).fetchone()
+        conn.close()
+        
+        if not upload or upload['processing_status'] is None:
+            return jsonify({'error': 'Upload not found'}), 404
+        
+        result = {'id': upload['id'], 'status': upload['processing_status'], 'url': None}
+        if upload['processing_status'] == 'ready':
+            result['url'] = f"/api/uploads/{upload['upload_type']}s/{upload['filename']}"
+        if upload['variants']:
+            manifest = json.loads(upload['variants'])
+            base_url = variants_url(upload['file_hash'])
+            result.update({
+                'src': f"{base_url}/{manifest['src']}" if manifest['src'] else None,
+                'srcset': build_srcset(manifest, base_url),
+                'width': manifest['original']['width'],
+                'height': manifest['original']['height'],
+                'variants': [dict(variant, url=f"{base_url}/{variant['file']}") for variant in manifest['variants']]
+            })
+        return jsonify(result)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @uploads_bp.route('/my-uploads', methods=['GET'])
 @jwt_required()
 def get_my_uploads():
@@ -305,42 +557,26 @@ def get_my_uploads():
     try:
         current_user_id = get_jwt_identity()
         upload_type = request.args.get('type')  # image, document, avatar
-        page = request.args.get('page', 1, type=int)
-        per_page = min(request.args.get('per_page', 20, type=int), 50)
+        page_args = get_page_args(default_per_page=20)
         
         conn = get_db_connection()
         
-        query = "SELECT * FROM uploads WHERE uploaded_by = ?"
+        where = " WHERE uploaded_by = ?"
         params = [current_user_id]
         
         if upload_type:
-            query += " AND upload_type = ?"
+            where += " AND upload_type = ?"
             params.append(upload_type)
         
-        query += " ORDER BY created_at DESC LIMIT ? OFFSET ?"
-        params.extend([per_page, (page - 1) * per_page])
-        
-        uploads = conn.execute(query, params).fetchall()
-        
-        # Get total count
-        count_query = "SELECT COUNT(*) FROM uploads WHERE uploaded_by = ?"
-        count_params = [current_user_id]
-        
-        if upload_type:
-            count_query += " AND upload_type = ?"
-            count_params.append(upload_type)
-        
-        total = conn.execute(count_query, count_params).fetchone()[0]
+        uploads, meta = paginate(
+            conn, "SELECT * FROM uploads" + where, "SELECT COUNT(*) FROM uploads" + where, params, page_args
+        )
         conn.close()
         
-        return jsonify({
-            'uploads': [dict(upload) for upload in uploads],
-            'total': total,
-            'page': page,
-            'per_page': per_page,
-            'pages': (total + per_page - 1) // per_page
-        })
+        return jsonify({'uploads': [dict(upload) for upload in uploads], **meta})
         
+    except InvalidCursorError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -362,16 +598,16 @@ def delete_upload(upload_id):
             conn.close()
             return jsonify({'error': 'Upload not found'}), 404
         
-        # Delete file from filesystem
-        file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], upload['file_path'])
-        if os.path.exists(file_path):
-            os.remove(file_path)
-        
-        # Delete from database
+        # Drop the reference to the stored file, then delete from database
+        orphaned = remove_upload_file(conn, upload)
         conn.execute("DELETE FROM uploads WHERE id = ?", (upload_id,))
         conn.commit()
         conn.close()
         
+        # Other uploads may still share the blob; it is only removed once unreferenced
+        if orphaned:
+            get_blob_store().collect(orphaned)
+        
         return jsonify({'message': 'Upload deleted successfully'})
         
     except Exception as e:
@@ -383,47 +619,29 @@ def delete_upload(upload_id):
 def get_all_uploads():
     """Get all uploads (admin only)"""
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = min(request.args.get('per_page', 20, type=int), 50)
+        page_args = get_page_args(default_per_page=20)
         upload_type = request.args.get('type')
         
         conn = get_db_connection()
         
-        query = """
-            SELECT u.*, us.username as uploader_name 
-            FROM uploads u 
-            LEFT JOIN users us ON u.uploaded_by = us.id
-        """
+        where = " WHERE 1=1"
         params = []
         
         if upload_type:
-            query += " WHERE u.upload_type = ?"
+            where += " AND u.upload_type = ?"
             params.append(upload_type)
         
-        query += " ORDER BY u.created_at DESC LIMIT ? OFFSET ?"
-        params.extend([per_page, (page - 1) * per_page])
-        
-        uploads = conn.execute(query, params).fetchall()
-        
-        # Get total count
-        count_query = "SELECT COUNT(*) FROM uploads"
-        count_params = []
-        
-        if upload_type:
-            count_query += " WHERE upload_type = ?"
-            count_params.append(upload_type)
-        
-        total = conn.execute(count_query, count_params).fetchone()[0]
+        uploads, meta = paginate(conn, """
+            SELECT u.*, us.username as uploader_name 
+            FROM uploads u 
+            LEFT JOIN users us ON u.uploaded_by = us.id
+        """ + where, "SELECT COUNT(*) FROM uploads u" + where, params, page_args, prefix='u.')
         conn.close()
         
-        return jsonify({
-            'uploads': [dict(upload) for upload in uploads],
-            'total': total,
-            'page': page,
-            'per_page': per_page,
-            'pages': (total + per_page - 1) // per_page
-        })
+        return jsonify({'uploads': [dict(upload) for upload in uploads], **meta})
         
+    except InvalidCursorError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -442,16 +660,16 @@ def admin_delete_upload(upload_id):
             conn.close()
             return jsonify({'error': 'Upload not found'}), 404
         
-        # Delete file from filesystem
-        file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], upload['file_path'])
-        if os.path.exists(file_path):
-            os.remove(file_path)
-        
-        # Delete from database
+        # Drop the reference to the stored file, then delete from database
+        orphaned = remove_upload_file(conn, upload)
         conn.execute("DELETE FROM uploads WHERE id = ?", (upload_id,))
         conn.commit()
         conn.close()
         
+        # Other uploads may still share the blob; it is only removed once unreferenced
+        if orphaned:
+            get_blob_store().collect(orphaned)
+        
         return jsonify({'message': 'Upload deleted successfully'})
         
     except Exception as e:
@@ -0,0 +1,184 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from .batching import BatchWriter, is_busy_error
+
+logger = logging.getLogger(__name__)
+
+AUDIT_COLUMNS = ('user_id', 'action', 'resource_type', 'resource_id', 'details',
+                 'ip_address', 'user_agent', 'created_at')
+
+class AuditLog:
+    """Queued activity log writer with a durable spill file.
+
+    Events are timestamped when recorded and written in batches by a single
+    BatchWriter thread, so they reach ``activity_logs`` in the order they were
+    recorded (and therefore in order per user). If the database is locked or
+    busy a batch is appended to a JSON-lines spill file and fsynced; the next
+    successful flush replays the spill file ahead of newer events; lines it
+    cannot parse (e.g. torn by a crash mid-append) are moved to a
+    ``.corrupt`` file. Any other error (a missing table, a read-only file)
+    will not go away by retrying, so it is logged and the batch is dropped.
+    """
+
+    def __init__(self, spill_path=None, capacity=50000, batch_size=200, flush_interval=1.0):
+        self.spill_path = spill_path
+        self._spill_lock = threading.Lock()
+        self.spilled = 0
+        self.replayed = 0
+        self.invalid = 0
+        self.failed = 0
+        self.corrupt = 0
+        self.writer = BatchWriter('audit-log', self._write, capacity=capacity,
+                                  batch_size=batch_size, flush_interval=flush_interval,
+                                  overflow='reject', max_retries=0)
+
+    def configure(self, spill_path=None, **options):
+        if spill_path is not None:
+            self.spill_path = spill_path
+        self.writer.configure(**options)
+
+    def reset(self):
+        """Drain and stop the writer, forget the spill file and zero the counters"""
+        self.writer.stop()
+        self.spill_path = None
+        self.spilled = self.replayed = self.invalid = self.failed = self.corrupt = 0
+
+    def record(self, user_id, action, resource_type=None, resource_id=None,
+               details=None, ip_address=None, user_agent=None):
+        row = (user_id, action, resource_type, resource_id, details, ip_address, user_agent,
+               datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'))
+        if not self.writer.submit(row):
+            # Queue full: keep the event on disk rather than drop it
+            self._spill([row])
+
+    def flush(self):
+        return self.writer.flush()
+
+    def stop(self):
+        self.writer.stop()
+
+    def _write(self, rows):
+        with self._spill_lock:
+            try:
+                spilled = self._read_spill()
+                self._insert(spilled + rows)
+            except Exception as e:
+                if is_busy_error(e):
+                    logger.warning('Audit log write failed, spilling %d events: %s', len(rows), e)
+                    self._append_spill(rows)
+                else:
+                    # Retrying will not help; never hand the batch back to the writer
+                    self.failed += len(rows)
+                    logger.error('Audit log write failed, dropping %d events: %s', len(rows), e)
+                return
+            if spilled:
+                self.replayed += len(spilled)
+                self._truncate_spill()
+
+    def _insert(self, rows):
+        from ..database import get_db_connection
+        query = f'''
+            INSERT INTO activity_logs ({', '.join(AUDIT_COLUMNS)})
+            VALUES ({', '.join('?' * len(AUDIT_COLUMNS))})
+        '''
+        with get_db_connection() as conn:
+            try:
+                conn.executemany(query, rows)
+            except (sqlite3.IntegrityError, sqlite3.InterfaceError, sqlite3.ProgrammingError):
+                # One bad event (e.g. a failed login for an unknown user) must not sink the batch
+                conn.rollback()
+                for row in rows:
+                    try:
+                        conn.execute(query, row)
+                    except (sqlite3.IntegrityError, sqlite3.InterfaceError, sqlite3.ProgrammingError) as e:
+                        self.invalid += 1
+                        logger.warning('Skipping invalid audit event %s: %s', row[1], e)
+            conn.commit()
+
+    def _spill(self, rows):
+        with self._spill_lock:
+            self._append_spill(rows)
+
+    def _append_spill(self, rows):
+        if not self.spill_path:
+            logger.error('Audit log has no spill file; %d events lost', len(rows))
+            return
+        directory = os.path.dirname(self.spill_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        torn = False
+        if os.path.exists(self.spill_path) and os.path.getsize(self.spill_path):
+            with open(self.spill_path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                torn = f.read(1) != b'\n'
+        with open(self.spill_path, 'a', encoding='utf-8') as f:
+            if torn:
+                # A crash mid-append left half a line; keep new events off it
+                f.write('\n')
+            for row in rows:
+                f.write(json.dumps(row, default=str) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self.spilled += len(rows)
+
+    def _read_spill(self):
+        if not self.spill_path or not os.path.exists(self.spill_path):
+            return []
+        rows, corrupt = [], []
+        with open(self.spill_path, encoding='utf-8', errors='replace') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    row = None
+                if isinstance(row, list) and len(row) == len(AUDIT_COLUMNS):
+                    rows.append(tuple(row))
+                else:
+                    corrupt.append(line if line.endswith('\n') else line + '\n')
+        if corrupt:
+            self._quarantine_spill(rows, corrupt)
+        return rows
+
+    def _quarantine_spill(self, rows, corrupt):
+        """Move unreadable spill lines to a .corrupt file and rewrite the spill without them"""
+        logger.error('Moving %d unreadable audit spill lines to %s.corrupt', len(corrupt), self.spill_path)
+        with open(self.spill_path + '.corrupt', 'a', encoding='utf-8') as f:
+            f.writelines(corrupt)
+            f.flush()
+            os.fsync(f.fileno())
+        temp_path = self.spill_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            for row in rows:
+                f.write(json.dumps(row, default=str) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.spill_path)
+        self.corrupt += len(corrupt)
+
+    def _truncate_spill(self):
+        os.remove(self.spill_path)
+
+    def stats(self):
+        stats = self.writer.stats()
+        stats.update({
+            'spill_path': self.spill_path,
+            'spilled': self.spilled,
+            'replayed': self.replayed,
+            'invalid': self.invalid,
+            'failed': self.failed,
+            'corrupt': self.corrupt,
+            'spill_pending': os.path.exists(self.spill_path) if self.spill_path else False
+        })
+        return stats
+
+audit_log = AuditLog()
+
+def log_activity(user_id, action, resource_type=None, resource_id=None, details=None, ip_address=None, user_agent=None):
+    """Log user activity (queued and written in the background)"""
+    audit_log.record(user_id, action, resource_type, resource_id, details, ip_address, user_agent)
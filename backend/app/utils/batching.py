@@ -0,0 +1,350 @@
+import atexit
+import logging
+import sqlite3
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ('reject', 'drop_oldest')
+
+def is_busy_error(error):
+    """True for database errors that a later retry can get past (busy, locked, pool exhausted)"""
+    if not isinstance(error, sqlite3.OperationalError):
+        return False
+    code = getattr(error, 'sqlite_errorcode', None)
+    if code is not None:
+        return code & 0xff in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+    message = str(error).lower()
+    return any(word in message for word in ('locked', 'busy', 'timed out'))
+
+class BatchWriter:
+    """Bounded in-memory buffer drained in batches by a background thread.
+
+    ``submit()`` only appends to a ring buffer under a lock, so callers on the
+    request path never touch the database. A daemon thread hands batches of up
+    to ``batch_size`` items to ``flush_func`` whenever the buffer reaches that
+    size or ``flush_interval`` seconds have passed, and once more at process
+    exit.
+
+    When the buffer is full the overflow policy decides what is lost:
+    ``reject`` refuses the new item (so the caller can push back on its
+    client) and ``drop_oldest`` evicts the oldest buffered item. Either way at
+    most ``capacity`` items can be lost on a crash, and every lost item is
+    counted in ``stats()``.
+
+    Only a busy or locked database puts a failed batch back in the buffer.
+    Any other error is retried one item at a time, and items that still fail
+    are dropped and counted as ``rejected`` so one bad item cannot block the
+    rest.
+    """
+
+    def __init__(self, name, flush_func, capacity=10000, batch_size=500,
+                 flush_interval=1.0, overflow='reject', max_retries=3):
+        self.name = name
+        self.flush_func = flush_func
+        self._buffer = deque()
+        self._cond = threading.Condition(threading.Lock())
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._stopping = False
+        self._atexit_registered = False
+        self._backoff = False
+
+        self._submitted = 0
+        self._dropped = 0
+        self._rejected = 0
+        self._flushed = 0
+        self._batches = 0
+        self._failed_flushes = 0
+        self._last_flush_ms = 0.0
+
+        self.configure(capacity=capacity, batch_size=batch_size,
+                       flush_interval=flush_interval, overflow=overflow,
+                       max_retries=max_retries)
+
+    def configure(self, capacity=None, batch_size=None, flush_interval=None,
+                  overflow=None, max_retries=None):
+        """Update buffer limits; unspecified options are left unchanged"""
+        if overflow is not None and overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f'Unknown overflow policy: {overflow}')
+        with self._cond:
+            if capacity is not None:
+                self.capacity = max(int(capacity), 1)
+            if batch_size is not None:
+                self.batch_size = max(int(batch_size), 1)
+            if flush_interval is not None:
+                self.flush_interval = float(flush_interval)
+            if overflow is not None:
+                self.overflow = overflow
+            if max_retries is not None:
+                self.max_retries = int(max_retries)
+
+    def submit(self, item):
+        """Buffer an item; returns False if it was rejected by backpressure"""
+        with self._cond:
+            if len(self._buffer) >= self.capacity:
+                self._dropped += 1
+                if self.overflow == 'reject':
+                    return False
+                self._buffer.popleft()
+            self._buffer.append(item)
+            self._submitted += 1
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify()
+
+        if self._thread is None:
+            self.start()
+        return True
+
+    def start(self):
+        """Start the background flusher if it is not already running"""
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping = False
+            self._thread = threading.Thread(
+                target=self._run, name=f'{self.name}-writer', daemon=True
+            )
+            self._thread.start()
+            if not self._atexit_registered:
+                atexit.register(self.stop)
+                self._atexit_registered = True
+
+    def stop(self, timeout=5.0):
+        """Stop the flusher and write out everything still buffered"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        self._thread = None
+        self.flush()
+
+    def flush(self):
+        """Synchronously drain the buffer; returns the number of items written"""
+        written = 0
+        while True:
+            with self._cond:
+                if not self._buffer:
+                    return written
+                batch = [self._buffer.popleft()
+                         for _ in range(min(self.batch_size, len(self._buffer)))]
+            if not self._write(batch):
+                return written
+            written += len(batch)
+
+    def _write(self, batch):
+        for attempt in range(self.max_retries + 1):
+            started = time.perf_counter()
+            try:
+                with self._flush_lock:
+                    self.flush_func(batch)
+            except Exception as e:
+                with self._cond:
+                    self._failed_flushes += 1
+                logger.warning('%s flush failed (attempt %d): %s', self.name, attempt + 1, e)
+                if not is_busy_error(e):
+                    batch = self._write_each(batch)
+                    if not batch:
+                        return True
+                if attempt < self.max_retries:
+                    time.sleep(min(0.05 * 2 ** attempt, 1.0))
+                continue
+
+            with self._cond:
+                self._backoff = False
+                self._flushed += len(batch)
+                self._batches += 1
+                self._last_flush_ms = (time.perf_counter() - started) * 1000
+            return True
+
+        # Give up on the batch but keep as much of it as the buffer allows
+        with self._cond:
+            self._backoff = True
+            room = max(self.capacity - len(self._buffer), 0)
+            keep = batch[-room:] if room else []
+            self._buffer.extendleft(reversed(keep))
+            lost = len(batch) - len(keep)
+            self._dropped += lost
+        if lost:
+            logger.error('%s dropped %d items after repeated flush failures', self.name, lost)
+        return False
+
+    def _write_each(self, batch):
+        """Write a batch item by item, dropping items that fail for good.
+
+        Returns the items left unwritten because the database became busy.
+        """
+        for index, item in enumerate(batch):
+            try:
+                with self._flush_lock:
+                    self.flush_func([item])
+            except Exception as e:
+                if is_busy_error(e):
+                    return batch[index:]
+                with self._cond:
+                    self._rejected += 1
+                logger.error('%s rejected an item that cannot be written: %s', self.name, e)
+                continue
+            with self._cond:
+                self._flushed += 1
+        with self._cond:
+            self._backoff = False
+            self._batches += 1
+        return []
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._stopping and (self._backoff or len(self._buffer) < self.batch_size):
+                    self._cond.wait(self.flush_interval)
+                if self._stopping:
+                    return
+            self.flush()
+
+    def stats(self):
+        """Return buffer and throughput counters"""
+        with self._cond:
+            return {
+                'queue_depth': len(self._buffer),
+                'capacity': self.capacity,
+                'batch_size': self.batch_size,
+                'flush_interval': self.flush_interval,
+                'overflow_policy': self.overflow,
+                'submitted': self._submitted,
+                'flushed': self._flushed,
+                'batches': self._batches,
+                'dropped': self._dropped,
+                'rejected': self._rejected,
+                'failed_flushes': self._failed_flushes,
+                'last_flush_ms': round(self._last_flush_ms, 3),
+                'running': self._thread is not None and self._thread.is_alive()
+            }
+
+class CounterAggregator:
+    """In-memory per-key increments written behind by a background thread.
+
+    ``increment()`` only bumps a dict entry under a lock. Every
+    ``flush_interval`` seconds (sooner once ``max_keys`` distinct keys are
+    pending, and once more at process exit) the pending deltas are swapped
+    out and handed to ``flush_func({key: delta})`` as one batch. A failed
+    flush merges its deltas back, so totals stay eventually accurate.
+    """
+
+    def __init__(self, name, flush_func, flush_interval=5.0, max_keys=10000):
+        self.name = name
+        self.flush_func = flush_func
+        self._pending = {}
+        self._cond = threading.Condition(threading.Lock())
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._stopping = False
+        self._atexit_registered = False
+
+        self._increments = 0
+        self._flushed = 0
+        self._batches = 0
+        self._failed_flushes = 0
+        self._last_flush_ms = 0.0
+
+        self.configure(flush_interval=flush_interval, max_keys=max_keys)
+
+    def configure(self, flush_interval=None, max_keys=None):
+        """Update flush settings; unspecified options are left unchanged"""
+        with self._cond:
+            if flush_interval is not None:
+                self.flush_interval = float(flush_interval)
+            if max_keys is not None:
+                self.max_keys = max(int(max_keys), 1)
+
+    def increment(self, key, amount=1):
+        with self._cond:
+            self._pending[key] = self._pending.get(key, 0) + amount
+            self._increments += amount
+            if len(self._pending) >= self.max_keys:
+                self._cond.notify()
+
+        if self._thread is None:
+            self.start()
+
+    def pending(self, key):
+        """Increments for ``key`` not yet written to the database"""
+        with self._cond:
+            return self._pending.get(key, 0)
+
+    def start(self):
+        """Start the background flusher if it is not already running"""
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping = False
+            self._thread = threading.Thread(
+                target=self._run, name=f'{self.name}-counter', daemon=True
+            )
+            self._thread.start()
+            if not self._atexit_registered:
+                atexit.register(self.stop)
+                self._atexit_registered = True
+
+    def stop(self, timeout=5.0):
+        """Stop the flusher and write out every pending increment"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        self._thread = None
+        self.flush()
+
+    def flush(self):
+        """Synchronously write pending increments; returns the number of keys written"""
+        with self._flush_lock:
+            with self._cond:
+                if not self._pending:
+                    return 0
+                batch, self._pending = self._pending, {}
+
+            started = time.perf_counter()
+            try:
+                self.flush_func(batch)
+            except Exception as e:
+                with self._cond:
+                    self._failed_flushes += 1
+                    for key, amount in batch.items():
+                        self._pending[key] = self._pending.get(key, 0) + amount
+                logger.warning('%s counter flush failed: %s', self.name, e)
+                return 0
+
+            with self._cond:
+                self._flushed += sum(batch.values())
+                self._batches += 1
+                self._last_flush_ms = (time.perf_counter() - started) * 1000
+            return len(batch)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._stopping and len(self._pending) < self.max_keys:
+                    self._cond.wait(self.flush_interval)
+                if self._stopping:
+                    return
+            self.flush()
+
+    def stats(self):
+        """Return pending and throughput counters"""
+        with self._cond:
+            return {
+                'pending_keys': len(self._pending),
+                'pending_increments': sum(self._pending.values()),
+                'flush_interval': self.flush_interval,
+                'increments': self._increments,
+                'flushed': self._flushed,
+                'batches': self._batches,
+                'failed_flushes': self._failed_flushes,
+                'last_flush_ms': round(self._last_flush_ms, 3),
+                'running': self._thread is not None and self._thread.is_alive()
+            }
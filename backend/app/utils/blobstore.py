@@ -0,0 +1,143 @@
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+from flask import current_app
+
+CHUNK_SIZE = 1024 * 1024
+DIGEST_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+def create_blob_table(conn):
+    """Create the reference-counted index of content-addressed blobs"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS blobs (
+            hash TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            ref_count INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID
+    ''')
+
+def blob_path(digest):
+    """Path of a blob relative to the upload folder, fanned out by hash prefix"""
+    return f'blobs/{digest[:2]}/{digest}'
+
+def derived_path(digest):
+    """Directory for files generated from a blob (image variants), removed with it"""
+    return f'derived/{digest[:2]}/{digest}'
+
+def digest_from_name(filename):
+    """The SHA-256 in a content-addressed name like ``<sha256>.pdf``, or None"""
+    stem = filename.split('.', 1)[0]
+    return stem if DIGEST_PATTERN.match(stem) else None
+
+class BlobStore:
+    """Upload storage keyed by the SHA-256 of the content.
+
+    Identical uploads share one file under ``blobs/`` and a row in ``blobs``
+    counts the uploads pointing at it. ``add`` and ``release`` run inside
+    the caller's transaction; the SQLite write lock they take is what keeps
+    a concurrent upload of the same content from racing a delete.
+    """
+
+    def __init__(self, root, chunk_size=CHUNK_SIZE):
+        self.root = root
+        self.chunk_size = chunk_size
+
+    def _path(self, digest):
+        return os.path.join(self.root, *blob_path(digest).split('/'))
+
+    def write(self, stream, suffix=''):
+        """Copy a stream to a temp file, hashing as it is written; returns (temp_path, digest, size)"""
+        temp_dir = os.path.join(self.root, 'temp')
+        os.makedirs(temp_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=temp_dir, prefix='blob-', suffix=suffix)
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                while True:
+                    chunk = stream.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+        except Exception:
+            os.remove(temp_path)
+            raise
+        return temp_path, digest.hexdigest(), size
+
+    def hash_file(self, path):
+        digest = hashlib.sha256()
+        size = 0
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(self.chunk_size), b''):
+                digest.update(chunk)
+                size += len(chunk)
+        return digest.hexdigest(), size
+
+    def add(self, conn, temp_path, digest=None, size=None):
+        """Move a temp file into the store and take a reference to it.
+
+        Pass the digest from ``write`` when the file was not changed since;
+        otherwise it is hashed here. Returns (relative_path, digest, size,
+        deduplicated). The caller commits.
+        """
+        try:
+            if digest is None:
+                digest, size = self.hash_file(temp_path)
+            conn.execute('''
+                INSERT INTO blobs (hash, size, ref_count) VALUES (?, ?, 1)
+                ON CONFLICT(hash) DO UPDATE SET ref_count = ref_count + 1
+            ''', (digest, size))
+
+            path = self._path(digest)
+            deduplicated = os.path.exists(path)
+            if deduplicated:
+                os.remove(temp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return blob_path(digest), digest, size, deduplicated
+
+    def release(self, conn, digest):
+        """Drop one reference; returns True when the blob is no longer referenced.
+
+        The caller commits and then calls ``collect`` to remove the file.
+        """
+        conn.execute('UPDATE blobs SET ref_count = ref_count - 1 WHERE hash = ?', (digest,))
+        row = conn.execute('SELECT ref_count FROM blobs WHERE hash = ?', (digest,)).fetchone()
+        if row is not None and row[0] > 0:
+            return False
+        conn.execute('DELETE FROM blobs WHERE hash = ?', (digest,))
+        return True
+
+    def collect(self, digest):
+        """Delete a blob's file if nothing references it any more.
+
+        Runs in its own write transaction so an upload of the same content
+        either lands before the check (and the file is kept) or after the
+        unlink (and writes the file again).
+        """
+        from ..database import get_db_connection
+        with get_db_connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                referenced = conn.execute('SELECT 1 FROM blobs WHERE hash = ?', (digest,)).fetchone()
+                path = self._path(digest)
+                removed = referenced is None and os.path.exists(path)
+                if removed:
+                    os.remove(path)
+                    shutil.rmtree(os.path.join(self.root, *derived_path(digest).split('/')), ignore_errors=True)
+            finally:
+                conn.commit()
+        return removed
+
+def get_blob_store():
+    return BlobStore(current_app.config['UPLOAD_FOLDER'])
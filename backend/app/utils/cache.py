@@ -0,0 +1,296 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlencode
+from flask import current_app, request
+from werkzeug.http import http_date
+
+logger = logging.getLogger(__name__)
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+    redis = None
+
+def create_cache_tags_table(conn):
+    """Create the table of response cache tag versions shared by every worker"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS cache_tags (
+            tag TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+
+class SqliteTagVersions:
+    """Tag versions kept in the ``cache_tags`` table, so a bump in one worker reaches all of them.
+
+    Costs one primary-key read of a tiny table per cached lookup. Errors are
+    logged and reported as None, which skips the cache for that request.
+    """
+
+    def get(self, tags):
+        from ..database import get_db_connection
+        try:
+            with get_db_connection() as conn:
+                rows = conn.execute(
+                    f"SELECT tag, version FROM cache_tags WHERE tag IN ({', '.join('?' * len(tags))})", tags
+                ).fetchall()
+        except sqlite3.Error as e:
+            logger.warning('Response cache tag read failed: %s', e)
+            return None
+        versions = {row[0]: row[1] for row in rows}
+        return [versions.get(tag, 0) for tag in tags]
+
+    def bump(self, tags):
+        from ..database import get_db_connection
+        try:
+            with get_db_connection() as conn:
+                conn.executemany('''
+                    INSERT INTO cache_tags (tag, version) VALUES (?, 1)
+                    ON CONFLICT (tag) DO UPDATE SET version = version + 1
+                ''', [(tag,) for tag in tags])
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.warning('Response cache invalidation failed: %s', e)
+
+class MemoryCacheBackend:
+    """Bounded in-process LRU of cached responses plus tag versions.
+
+    Tag versions live in this process unless a shared ``tag_versions`` store
+    is given; without one, invalidations in one worker process do not reach
+    the entries cached by the others until they expire.
+    """
+
+    def __init__(self, max_entries=1024, tag_versions=None):
+        self.max_entries = max_entries
+        self.shared_tags = tag_versions
+        self._entries = OrderedDict()
+        self._tags = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def tag_versions(self, tags):
+        if self.shared_tags is not None:
+            return self.shared_tags.get(tags)
+        with self._lock:
+            return [self._tags.get(tag, 0) for tag in tags]
+
+    def bump_tags(self, tags):
+        if self.shared_tags is not None:
+            self.shared_tags.bump(tags)
+            return
+        with self._lock:
+            for tag in tags:
+                self._tags[tag] = self._tags.get(tag, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+class RedisCacheBackend:
+    """Cached responses and tag versions shared by every worker through Redis"""
+
+    def __init__(self, client, prefix='response-cache'):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        try:
+            raw = self.client.get(f'{self.prefix}:entry:{key}')
+        except redis.RedisError as e:
+            logger.warning('Response cache read failed: %s', e)
+            return None
+        return json.loads(raw) if raw else None
+
+    def set(self, key, value, ttl):
+        try:
+            self.client.set(f'{self.prefix}:entry:{key}', json.dumps(value), ex=max(int(ttl), 1))
+        except redis.RedisError as e:
+            logger.warning('Response cache write failed: %s', e)
+
+    def tag_versions(self, tags):
+        try:
+            versions = self.client.mget([f'{self.prefix}:tag:{tag}' for tag in tags])
+        except redis.RedisError as e:
+            logger.warning('Response cache tag read failed: %s', e)
+            return None
+        return [int(version or 0) for version in versions]
+
+    def bump_tags(self, tags):
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for tag in tags:
+                pipe.incr(f'{self.prefix}:tag:{tag}')
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.warning('Response cache invalidation failed: %s', e)
+
+    def clear(self):
+        pass
+
+    def __len__(self):
+        return 0
+
+class ResponseCache:
+    """Response cache with tag invalidation by versioning.
+
+    Each entry's key embeds the current version of every tag it depends on,
+    so invalidating a tag just bumps its version: old entries are never read
+    again and age out of the LRU (or expire in Redis).
+    """
+
+    def __init__(self, backend=None, ttl=300):
+        self.backend = backend or MemoryCacheBackend()
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def key_for(self, tags):
+        """Key for the current request: path, normalized query args and tag versions"""
+        versions = self.backend.tag_versions(tags)
+        if versions is None:
+            return None
+        args = urlencode(sorted(
+            (name, value) for name in request.args for value in request.args.getlist(name)
+        ))
+        tag_part = ','.join(f'{tag}={version}' for tag, version in zip(tags, versions))
+        return f'{request.path}?{args}#{tag_part}'
+
+    def get(self, key):
+        entry = self.backend.get(key)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def set(self, key, entry, ttl=None):
+        self.backend.set(key, entry, ttl or self.ttl)
+
+    def invalidate(self, *tags):
+        self.invalidations += 1
+        self.backend.bump_tags(tags)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'backend': 'redis' if isinstance(self.backend, RedisCacheBackend) else 'memory',
+            'entries': len(self.backend),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'invalidations': self.invalidations
+        }
+
+response_cache = ResponseCache()
+
+def configure_response_cache(max_entries=1024, ttl=300, redis_url=None, shared_tags=False):
+    """Rebuild the response cache, using Redis when a URL is given and redis is installed.
+
+    Otherwise entries stay in process memory, with tag versions in the
+    ``cache_tags`` table when ``shared_tags`` is set.
+    """
+    global response_cache
+    if redis_url and REDIS_AVAILABLE:
+        backend = RedisCacheBackend(redis.Redis.from_url(redis_url))
+    else:
+        backend = MemoryCacheBackend(max_entries, SqliteTagVersions() if shared_tags else None)
+    response_cache = ResponseCache(backend, ttl)
+    return response_cache
+
+def init_app(app):
+    cache = configure_response_cache(
+        max_entries=app.config.get('RESPONSE_CACHE_SIZE', 1024),
+        ttl=app.config.get('RESPONSE_CACHE_TTL', 300),
+        redis_url=app.config.get('RESPONSE_CACHE_REDIS_URL'),
+        shared_tags=app.config.get('RESPONSE_CACHE_SHARED_TAGS', True)
+    )
+    backend = cache.backend
+    workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+    if isinstance(backend, MemoryCacheBackend) and backend.shared_tags is None and workers > 1:
+        logger.warning('Response cache tags are per process with %d workers; writes in one worker '
+                       'leave other workers serving cached responses for up to %ss',
+                       workers, cache.ttl)
+
+def get_response_cache():
+    return response_cache
+
+def invalidate_tags(*tags):
+    """Drop every cached response that depends on any of ``tags``"""
+    response_cache.invalidate(*tags)
+
+def cached_response(*tags, ttl=None):
+    """Cache a public GET view's successful JSON response under ``tags``.
+
+    Responses carry an ETag and Last-Modified from when the entry was built,
+    with ``Cache-Control: public, no-cache`` so browsers and CDNs revalidate
+    and receive 304s until a write handler invalidates one of the tags.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET' or not current_app.config.get('RESPONSE_CACHE_ENABLED', True):
+                return view(*args, **kwargs)
+
+            cache = response_cache
+            key = cache.key_for(tags)
+            entry = cache.get(key) if key else None
+            status = 'HIT'
+
+            if entry is None:
+                status = 'MISS'
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                body = response.get_data()
+                entry = {
+                    'body': body.decode('utf-8'),
+                    'mimetype': response.mimetype,
+                    'etag': hashlib.sha1(body).hexdigest(),
+                    'last_modified': int(time.time())
+                }
+                if key:
+                    cache.set(key, entry, ttl)
+
+            response = current_app.response_class(entry['body'], mimetype=entry['mimetype'])
+            response.set_etag(entry['etag'])
+            response.headers['Last-Modified'] = http_date(entry['last_modified'])
+            response.headers['Cache-Control'] = 'public, no-cache'
+            response.headers['X-Cache'] = status
+            return response.make_conditional(request)
+        return wrapper
+    return decorator
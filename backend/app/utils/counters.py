@@ -0,0 +1,92 @@
+# Denormalized child counts kept by SQLite triggers:
+# (parent table, counter column, child table, child column referencing parent.id)
+COUNTERS = (
+    ('faculties', 'departments_count', 'departments', 'faculty_id'),
+    ('departments', 'program_count', 'programs', 'department_id'),
+    ('ai_events', 'registration_count', 'ai_event_registrations', 'event_id'),
+    ('incubator_programs', 'participant_count', 'program_participants', 'program_id'),
+    ('startups', 'team_size', 'startup_team', 'startup_id'),
+)
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+
+def _trigger_prefix(child, counter):
+    return f'{child}_{counter}'
+
+def counter_name(parent, counter):
+    return f'{parent}.{counter}'
+
+def install_counters(conn):
+    """Add counter columns, indexes and triggers for every counter whose tables exist.
+
+    Safe to re-run: counters already installed are left alone, and a newly
+    installed one is recounted so it starts out correct. Returns the names
+    installed by this call. Must run inside the caller's write transaction.
+    """
+    installed = []
+    for parent, counter, child, key in COUNTERS:
+        parent_columns = _columns(conn, parent)
+        if not parent_columns or key not in _columns(conn, child):
+            continue  # Table not in this database (yet)
+        prefix = _trigger_prefix(child, counter)
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = ?",
+                        (f'{prefix}_insert',)).fetchone():
+            continue
+
+        if counter not in parent_columns:
+            conn.execute(f'ALTER TABLE {parent} ADD COLUMN {counter} INTEGER NOT NULL DEFAULT 0')
+        conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{child}_{key} ON {child}({key})')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {prefix}_insert AFTER INSERT ON {child} BEGIN
+                UPDATE {parent} SET {counter} = {counter} + 1 WHERE id = new.{key};
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {prefix}_delete AFTER DELETE ON {child} BEGIN
+                UPDATE {parent} SET {counter} = {counter} - 1 WHERE id = old.{key};
+            END
+        ''')
+        # Moving a row to another parent shifts one from the old count to the new one
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {prefix}_update AFTER UPDATE OF {key} ON {child}
+            WHEN old.{key} IS NOT new.{key} BEGIN
+                UPDATE {parent} SET {counter} = {counter} - 1 WHERE id = old.{key};
+                UPDATE {parent} SET {counter} = {counter} + 1 WHERE id = new.{key};
+            END
+        ''')
+        conn.execute(f'''
+            UPDATE {parent} SET {counter} = (SELECT COUNT(*) FROM {child} WHERE {key} = {parent}.id)
+        ''')
+        installed.append(counter_name(parent, counter))
+    return installed
+
+def verify_counters(conn, repair=False, sample=5):
+    """Compare each installed counter with a real COUNT and optionally fix drifted rows.
+
+    Returns one dict per installed counter: its name, how many parent rows
+    disagree, up to ``sample`` of them as (id, stored, actual), and whether
+    they were repaired. The caller commits a repair.
+    """
+    results = []
+    for parent, counter, child, key in COUNTERS:
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = ?",
+                            (f'{_trigger_prefix(child, counter)}_insert',)).fetchone():
+            continue
+        drifted = conn.execute(f'''
+            SELECT p.id, p.{counter}, COUNT(c.{key})
+            FROM {parent} p
+            LEFT JOIN {child} c ON c.{key} = p.id
+            GROUP BY p.id
+            HAVING p.{counter} IS NOT COUNT(c.{key})
+        ''').fetchall()
+        if drifted and repair:
+            conn.executemany(f'UPDATE {parent} SET {counter} = ? WHERE id = ?',
+                             [(actual, row_id) for row_id, _, actual in drifted])
+        results.append({
+            'counter': counter_name(parent, counter),
+            'drifted': len(drifted),
+            'examples': [tuple(row) for row in drifted[:sample]],
+            'repaired': bool(drifted) and repair
+        })
+    return results
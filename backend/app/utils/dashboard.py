@@ -0,0 +1,145 @@
+import json
+import re
+import threading
+import time
+from datetime import datetime, timezone
+
+SNAPSHOT_NAME = 'admin_dashboard'
+
+# (section, key, table, aggregate, filter). {active}/{published} in a filter
+# resolve to whichever flag column the table has; tables without one are
+# counted in full, and tables that do not exist yet count as 0.
+DASHBOARD_AGGREGATES = (
+    ('users', 'total', 'users', 'COUNT(*)', None),
+    ('users', 'active', 'users', 'COUNT(*)', '{active} = 1'),
+    ('users', 'new_today', 'users', 'COUNT(*)', "created_at >= date('now')"),
+    ('content', 'total_news', 'news', 'COUNT(*)', None),
+    ('content', 'published_news', 'news', 'COUNT(*)', '{published} = 1'),
+    ('content', 'faculties', 'faculties', 'COUNT(*)', '{active} = 1'),
+    ('content', 'departments', 'departments', 'COUNT(*)', '{active} = 1'),
+    ('ai_house', 'projects', 'ai_projects', 'COUNT(*)', '{active} = 1'),
+    ('ai_house', 'events', 'ai_events', 'COUNT(*)', '{active} = 1'),
+    ('incubator', 'startups', 'startups', 'COUNT(*)', '{active} = 1'),
+    ('incubator', 'programs', 'incubator_programs', 'COUNT(*)', '{active} = 1'),
+    ('uploads', 'total_files', 'uploads', 'COUNT(*)', None),
+    ('uploads', 'total_size', 'uploads', 'COALESCE(SUM(file_size), 0)', None),
+)
+
+FLAG_COLUMNS = {
+    'active': ('is_active', 'active'),
+    'published': ('is_published', 'published')
+}
+
+_FLAG = re.compile(r'\{(\w+)\}')
+
+def create_stats_snapshot_table(conn):
+    """Create the table holding precomputed aggregates (one JSON row per snapshot)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS stats_snapshot (
+            name TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            refreshed_at REAL NOT NULL,
+            duration_ms REAL NOT NULL DEFAULT 0
+        )
+    ''')
+
+def _resolve_filter(where, columns):
+    """Substitute flag placeholders; None when a flag column is missing (no filter)"""
+    for flag in _FLAG.findall(where):
+        column = next((name for name in FLAG_COLUMNS[flag] if name in columns), None)
+        if column is None:
+            return None
+        where = where.replace('{' + flag + '}', column)
+    return where
+
+def dashboard_query(conn):
+    """Build the single compound SELECT for the dashboard counters.
+
+    Returns (sql, [(section, key)] in column order, sorted missing tables).
+    """
+    columns = {}
+    for table in {table for _, _, table, _, _ in DASHBOARD_AGGREGATES}:
+        columns[table] = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+
+    selects, keys = [], []
+    for section, key, table, aggregate, where in DASHBOARD_AGGREGATES:
+        if not columns[table]:
+            selects.append('0')
+        else:
+            where = _resolve_filter(where, columns[table]) if where else None
+            selects.append(f'(SELECT {aggregate} FROM {table}' + (f' WHERE {where})' if where else ')'))
+        keys.append((section, key))
+    missing = sorted(table for table, names in columns.items() if not names)
+    return 'SELECT ' + ',\n       '.join(selects), keys, missing
+
+def compute_dashboard(conn):
+    """Run the compound aggregate query plus the two indexed recent-activity reads"""
+    sql, keys, missing = dashboard_query(conn)
+    row = conn.execute(sql).fetchone()
+
+    stats = {}
+    for (section, key), value in zip(keys, row):
+        stats.setdefault(section, {})[key] = value
+
+    recent_users = conn.execute('''
+        SELECT username, email, created_at FROM users
+        ORDER BY created_at DESC LIMIT 5
+    ''').fetchall()
+    recent_news = conn.execute('''
+        SELECT title, created_at FROM news
+        ORDER BY created_at DESC LIMIT 5
+    ''').fetchall()
+    stats['recent_activity'] = {
+        'users': [dict(user) for user in recent_users],
+        'news': [dict(article) for article in recent_news]
+    }
+    stats['missing_tables'] = missing
+    return stats
+
+def refresh_dashboard_snapshot(conn):
+    """Recompute the dashboard and store it as the current snapshot; the caller commits"""
+    started = time.perf_counter()
+    stats = compute_dashboard(conn)
+    refreshed_at = time.time()
+    duration_ms = round((time.perf_counter() - started) * 1000, 2)
+    conn.execute('''
+        INSERT INTO stats_snapshot (name, data, refreshed_at, duration_ms) VALUES (?, ?, ?, ?)
+        ON CONFLICT (name) DO UPDATE SET
+            data = excluded.data, refreshed_at = excluded.refreshed_at, duration_ms = excluded.duration_ms
+    ''', (SNAPSHOT_NAME, json.dumps(stats), refreshed_at, duration_ms))
+    return stats, refreshed_at, duration_ms
+
+def read_dashboard_snapshot(conn):
+    """Return (stats, refreshed_at, duration_ms) of the stored snapshot, or None"""
+    row = conn.execute(
+        'SELECT data, refreshed_at, duration_ms FROM stats_snapshot WHERE name = ?', (SNAPSHOT_NAME,)
+    ).fetchone()
+    if row is None:
+        return None
+    return json.loads(row[0]), row[1], row[2]
+
+# One refresh at a time per process; other requests keep serving the old snapshot
+_refresh_lock = threading.Lock()
+
+def get_dashboard_snapshot(conn, max_age, force=False):
+    """Serve the stored snapshot, recomputing it first when missing or older than ``max_age`` seconds.
+
+    Returns the stats dict with a ``snapshot`` entry giving its freshness.
+    """
+    snapshot = read_dashboard_snapshot(conn)
+    stale = snapshot is None or force or time.time() - snapshot[1] >= max_age
+    if stale and _refresh_lock.acquire(blocking=snapshot is None or force):
+        try:
+            snapshot = refresh_dashboard_snapshot(conn)
+            conn.commit()
+        finally:
+            _refresh_lock.release()
+
+    stats, refreshed_at, duration_ms = snapshot
+    stats['snapshot'] = {
+        'refreshed_at': datetime.fromtimestamp(refreshed_at, timezone.utc).isoformat(),
+        'age_seconds': round(max(time.time() - refreshed_at, 0.0), 3),
+        'max_age_seconds': max_age,
+        'refresh_ms': duration_ms
+    }
+    return stats
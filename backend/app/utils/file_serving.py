@@ -0,0 +1,91 @@
+import mimetypes
+import os
+import unicodedata
+from urllib.parse import quote
+from flask import current_app, request, send_file
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
+
+# How stored files reach the client: streamed by the app, or handed to the proxy
+OFFLOAD_MODES = ('', 'x-sendfile', 'x-accel')
+IMMUTABLE_MAX_AGE = 31536000
+
+def cache_control(immutable=False, private=False, max_age=IMMUTABLE_MAX_AGE):
+    """Cache-Control for a stored file; mutable files are revalidated every time"""
+    scope = 'private' if private else 'public'
+    if immutable:
+        return f'{scope}, max-age={max_age}, immutable'
+    return f'{scope}, no-cache'
+
+def content_disposition(download_name, as_attachment):
+    kind = 'attachment' if as_attachment else 'inline'
+    if not download_name:
+        return kind
+    try:
+        download_name.encode('ascii')
+        return f'{kind}; filename="{download_name}"'
+    except UnicodeEncodeError:
+        # Arabic/French names: ASCII fallback plus the RFC 5987 form
+        simple = unicodedata.normalize('NFKD', download_name).encode('ascii', 'ignore').decode('ascii')
+        return f"{kind}; filename=\"{simple or 'download'}\"; filename*=UTF-8''{quote(download_name, safe='')}"
+
+def _offload_response(path, relative_path, mode, mimetype, etag, download_name, as_attachment):
+    """Headers-only response telling the proxy to send the file itself with sendfile(2)"""
+    stat = os.stat(path)
+    mimetype = mimetype or mimetypes.guess_type(download_name or path)[0] or 'application/octet-stream'
+    response = current_app.response_class(mimetype=mimetype)
+    response.last_modified = int(stat.st_mtime)
+    response.set_etag(etag or f'{int(stat.st_mtime)}-{stat.st_size}')
+    if download_name or as_attachment:
+        response.headers['Content-Disposition'] = content_disposition(download_name, as_attachment)
+
+    # Validators are checked here so 304s never reach the disk; ranges are left to the proxy
+    response = response.make_conditional(request)
+    if response.status_code == 200:
+        if mode == 'x-accel':
+            prefix = current_app.config.get('FILE_SERVE_ACCEL_PREFIX', '/protected-uploads').rstrip('/')
+            response.headers['X-Accel-Redirect'] = f"{prefix}/{relative_path.replace(os.sep, '/')}"
+        else:
+            response.headers['X-Sendfile'] = path
+    return response
+
+def serve_file(root, relative_path, mimetype=None, etag=None, download_name=None,
+               as_attachment=False, immutable=False, private=False):
+    """Serve a file below ``root`` with Range, conditional GET and optional proxy offload.
+
+    ``etag`` should be a content hash when one is stored so the validator is
+    strong and stable across servers. ``immutable`` marks names that never
+    change content (unique upload names) as cacheable for a year without
+    revalidation. With ``FILE_SERVE_OFFLOAD`` set to ``x-accel`` (nginx) or
+    ``x-sendfile`` (Apache, lighttpd) the app only answers with headers and
+    the proxy pushes the bytes.
+    """
+    path = safe_join(root, relative_path)
+    if path is None or not os.path.isfile(path):
+        raise NotFound()
+
+    mode = current_app.config.get('FILE_SERVE_OFFLOAD', '')
+    if mode and mode in OFFLOAD_MODES:
+        response = _offload_response(path, relative_path, mode, mimetype, etag, download_name, as_attachment)
+    else:
+        response = send_file(
+            path,
+            mimetype=mimetype,
+            as_attachment=as_attachment,
+            download_name=download_name,
+            conditional=True,
+            etag=etag or True
+        )
+    response.headers['Cache-Control'] = cache_control(
+        immutable, private, current_app.config.get('FILE_CACHE_MAX_AGE', IMMUTABLE_MAX_AGE)
+    )
+    if immutable:
+        response.headers.pop('Expires', None)
+    return response
+
+def is_continuation(response):
+    """Whether a response only revalidates or resumes a file the client already started"""
+    if response.status_code == 304:
+        return True
+    byte_range = request.range
+    return bool(byte_range and byte_range.ranges and byte_range.ranges[0][0] != 0)
@@ -0,0 +1,145 @@
+import sqlite3
+import threading
+import time
+
+# Levels of the organizational tree, top down
+LEVELS = ('college', 'faculty', 'department')
+LEVEL_DEPTH = {level: depth for depth, level in enumerate(LEVELS)}
+
+def create_closure_table(conn):
+    """Create the ancestor/descendant closure table for colleges, faculties and departments"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS org_closure (
+            ancestor_type TEXT NOT NULL,
+            ancestor_id INTEGER NOT NULL,
+            descendant_type TEXT NOT NULL,
+            descendant_id INTEGER NOT NULL,
+            depth INTEGER NOT NULL,
+            PRIMARY KEY (ancestor_type, ancestor_id, descendant_type, descendant_id)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_org_closure_descendant
+        ON org_closure(descendant_type, descendant_id, ancestor_type)
+    ''')
+
+def load_edges(conn):
+    """Return (college ids, {faculty: college}, {department: faculty})"""
+    colleges = [row[0] for row in conn.execute('SELECT id FROM colleges')]
+    faculties = {row[0]: row[1] for row in conn.execute('SELECT id, college_id FROM faculties')}
+    try:
+        departments = {row[0]: row[1] for row in conn.execute('SELECT id, faculty_id FROM departments')}
+    except sqlite3.OperationalError:
+        departments = {}  # Older databases have no departments table
+    return colleges, faculties, departments
+
+class HierarchyIndex:
+    """Immutable snapshot of the college -> faculty -> department tree.
+
+    Every node maps to its full ancestor chain and every scope to its
+    descendants grouped by level, so "is X under Y" is a set lookup and
+    "all descendants of Y" is proportional to the answer.
+    """
+
+    def __init__(self, colleges=(), faculties=None, departments=None):
+        faculties = faculties or {}
+        departments = departments or {}
+        self.parents = {}
+        for faculty_id, college_id in faculties.items():
+            self.parents[('faculty', faculty_id)] = ('college', college_id)
+        for department_id, faculty_id in departments.items():
+            self.parents[('department', department_id)] = ('faculty', faculty_id)
+
+        nodes = ([('college', college_id) for college_id in colleges]
+                 + [('faculty', faculty_id) for faculty_id in faculties]
+                 + [('department', department_id) for department_id in departments])
+        self.ancestors = {}
+        self.descendants = {}
+        for node in nodes:
+            chain = [node]
+            while chain[-1] in self.parents:
+                chain.append(self.parents[chain[-1]])
+            self.ancestors[node] = {ancestor[0]: ancestor[1] for ancestor in chain}
+            for ancestor in chain:
+                levels = self.descendants.setdefault(ancestor, {})
+                levels.setdefault(node[0], set()).add(node[1])
+        self.loaded_at = time.monotonic()
+
+    def contains(self, resource_type, resource_id):
+        return (resource_type, resource_id) in self.ancestors
+
+    def ancestry(self, resource_type, resource_id):
+        """Return ``{level: id}`` for a node and all its ancestors, or None if unknown"""
+        return self.ancestors.get((resource_type, resource_id))
+
+    def is_under(self, resource_type, resource_id, scope_type, scope_id):
+        """Whether a resource is the scope itself or one of its descendants"""
+        ancestry = self.ancestors.get((resource_type, resource_id))
+        return ancestry is not None and ancestry.get(scope_type) == scope_id
+
+    def descendant_ids(self, scope_type, scope_id, resource_type):
+        """Ids of every ``resource_type`` node within the scope"""
+        return self.descendants.get((scope_type, scope_id), {}).get(resource_type, set())
+
+    def closure_rows(self):
+        for (node_type, node_id), ancestry in self.ancestors.items():
+            for level, ancestor_id in ancestry.items():
+                yield (level, ancestor_id, node_type, node_id, LEVEL_DEPTH[node_type] - LEVEL_DEPTH[level])
+
+_index = HierarchyIndex()
+_index.loaded_at = float('-inf')  # Loaded from the database on first use
+_index_lock = threading.Lock()
+_max_age = 60.0
+
+def refresh_hierarchy(conn=None):
+    """Reload the in-memory index and rewrite the closure table from the source tables"""
+    global _index
+    if conn is None:
+        from ..database import get_db_connection
+        with get_db_connection() as conn:
+            index = refresh_hierarchy(conn)
+            conn.commit()
+            return index
+
+    with _index_lock:
+        index = HierarchyIndex(*load_edges(conn))
+        conn.execute('DELETE FROM org_closure')
+        conn.executemany('''
+            INSERT INTO org_closure (ancestor_type, ancestor_id, descendant_type, descendant_id, depth)
+            VALUES (?, ?, ?, ?, ?)
+        ''', index.closure_rows())
+        _index = index
+    return index
+
+def configure_hierarchy(max_age=60.0):
+    """Set how many seconds a worker trusts its index before reloading it"""
+    global _max_age
+    _max_age = float(max_age)
+
+def get_hierarchy():
+    """Current hierarchy index, reloaded when older than the configured max age.
+
+    Writes in this process refresh it immediately; the age limit bounds how
+    long other worker processes can serve a stale tree.
+    """
+    global _index
+    index = _index
+    if time.monotonic() - index.loaded_at > _max_age:
+        from ..database import get_db_connection
+        with get_db_connection() as conn:
+            index = HierarchyIndex(*load_edges(conn))
+        _index = index
+    return index
+
+def closure_join(column, descendant_type, alias='oc'):
+    """SQL join restricting ``column`` (a ``descendant_type`` id) to one scope.
+
+    Bind the scope's type and id as the two parameters, e.g.
+    ``closure_join('f.faculty_id', 'faculty')`` with ``['college', 1]`` keeps
+    files from every faculty of college 1.
+    """
+    return (
+        f"JOIN org_closure {alias} ON {alias}.descendant_type = '{descendant_type}' "
+        f"AND {alias}.descendant_id = {column} "
+        f"AND {alias}.ancestor_type = ? AND {alias}.ancestor_id = ?"
+    )
@@ -0,0 +1,353 @@
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from .blobstore import derived_path
+
+logger = logging.getLogger(__name__)
+
+# Pillow format name and file extension per output format
+FORMATS = {
+    'jpeg': ('JPEG', 'jpg'),
+    'webp': ('WEBP', 'webp'),
+    'avif': ('AVIF', 'avif'),
+    'png': ('PNG', 'png')
+}
+MANIFEST_NAME = 'manifest.json'
+
+def supported_formats(formats):
+    """Keep the formats this Pillow build can encode, in order"""
+    from PIL import Image
+    extensions = Image.registered_extensions()
+    supported = []
+    for name in formats:
+        if name in FORMATS and f'.{FORMATS[name][1]}' in extensions:
+            supported.append(name)
+        else:
+            logger.warning('Image format %s is not supported by Pillow; skipping it', name)
+    return supported
+
+def flatten(img):
+    """Composite transparency onto white for formats without alpha"""
+    from PIL import Image
+    if img.mode in ('RGBA', 'LA', 'P'):
+        img = img.convert('RGBA')
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.split()[-1])
+        return background
+    return img.convert('RGB') if img.mode != 'RGB' else img
+
+def save_image(img, path, fmt, quality):
+    pil_format = FORMATS[fmt][0]
+    if fmt == 'jpeg':
+        flatten(img).save(path, pil_format, quality=quality, optimize=True, progressive=True)
+    elif fmt == 'png':
+        img.save(path, pil_format, optimize=True)
+    else:
+        img = img if img.mode in ('RGB', 'RGBA') else img.convert('RGBA')
+        img.save(path, pil_format, quality=quality)
+
+class InvalidImageError(ValueError):
+    pass
+
+# Upload formats accepted as images, with the extension they are stored under
+UPLOAD_FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+
+def check_image(path, max_pixels=50000000):
+    """Cheap request-time check that an upload is an image we accept.
+
+    Only the header is parsed and the file structure verified; decoding,
+    the metadata strip and the re-encode happen in the worker. Returns the
+    extension for the detected format.
+    """
+    from PIL import Image, UnidentifiedImageError
+    try:
+        with Image.open(path) as img:
+            extension = UPLOAD_FORMATS.get(img.format)
+            if extension is None:
+                raise InvalidImageError(f'Unsupported image format: {img.format}')
+            if img.width * img.height > max_pixels:
+                raise InvalidImageError(f'Image is larger than {max_pixels} pixels')
+            img.verify()
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError) as e:
+        raise InvalidImageError(f'Invalid image file: {e}')
+    return extension
+
+def save_clean_copy(img, source_path, out_dir, source_format, icc_profile, max_dimension, quality):
+    """Write the publishable full-size image and return its file name.
+
+    ``img`` is already upright; it is shrunk in place to fit ``max_dimension``
+    and re-encoded in its own format without EXIF/GPS, XMP or text chunks
+    (the ICC profile is kept so colours survive). GIFs are copied as they
+    are, since re-encoding would drop their animation and they carry no EXIF.
+    """
+    from PIL import Image
+    name = f'full.{UPLOAD_FORMATS[source_format]}'
+    path = os.path.join(out_dir, name)
+    if source_format == 'GIF':
+        shutil.copyfile(source_path, path)
+        return name
+
+    img.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+    # Some encoders fall back to img.info for EXIF/XMP; keep only what the pixels need
+    img.info = {key: value for key, value in img.info.items() if key == 'transparency'}
+    options = {'icc_profile': icc_profile} if icc_profile else {}
+    if source_format == 'JPEG':
+        flatten(img).save(path, 'JPEG', quality=quality, optimize=True, progressive=True, **options)
+    elif source_format == 'WEBP':
+        img.save(path, 'WEBP', quality=quality, **options)
+    else:
+        img.save(path, source_format, optimize=True, **options)
+    return name
+
+def render_variants(source_path, out_dir, widths=(), square_sizes=(), formats=('webp', 'jpeg'), quality=82,
+                    max_dimension=None):
+    """Write resized copies of an image and return its manifest.
+
+    Runs in a worker process. Width variants keep the aspect ratio and are
+    never upscaled; square variants are centre crops (thumbnails, avatars).
+    With ``max_dimension`` a metadata-free copy of the whole image is written
+    too (manifest ``clean``); that copy, not the upload, is what gets
+    published. Big JPEGs are decoded with ``draft()`` at the smallest DCT
+    scale that still covers every output. An existing manifest for the same
+    spec is reused, so duplicate uploads are processed once.
+    """
+    # Pillow is imported here (in the worker) so web processes only load it when they need it
+    from PIL import Image, ImageOps
+    spec = {'widths': list(widths), 'square_sizes': list(square_sizes),
+            'formats': list(formats), 'quality': quality, 'max_dimension': max_dimension}
+    manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('spec') == spec:
+            return manifest
+
+    os.makedirs(out_dir, exist_ok=True)
+    variants = []
+    with Image.open(source_path) as img:
+        original_width, original_height = img.size
+        source_format = img.format
+        icc_profile = img.info.get('icc_profile')
+        largest = max(list(widths) + list(square_sizes) or [original_width])
+        if img.format == 'JPEG':
+            # Sized against the short side so the draft covers every variant even after EXIF rotation
+            scale = largest / min(original_width, original_height)
+            if max_dimension:
+                scale = max(scale, max_dimension / max(original_width, original_height))
+            img.draft('RGB', (int(original_width * min(scale, 1.0)) + 1, int(original_height * min(scale, 1.0)) + 1))
+        img = ImageOps.exif_transpose(img)
+        img.load()
+
+        targets = []
+        for width in sorted({min(w, img.width) for w in widths}, reverse=True):
+            height = max(1, round(img.height * width / img.width))
+            targets.append(('width', width, height, img))
+        if square_sizes:
+            side = min(img.size)
+            left, top = (img.width - side) // 2, (img.height - side) // 2
+            square = img.crop((left, top, left + side, top + side))
+            for size in sorted(set(square_sizes), reverse=True):
+                size = min(size, side)
+                targets.append(('square', size, size, square))
+
+        for crop, width, height, base in targets:
+            resized = base.resize((width, height), Image.Resampling.LANCZOS) if base.size != (width, height) else base
+            for fmt in formats:
+                name = f"{'sq' if crop == 'square' else 'w'}{width}.{FORMATS[fmt][1]}"
+                path = os.path.join(out_dir, name)
+                save_image(resized, path, fmt, quality)
+                variants.append({'crop': crop, 'width': width, 'height': height, 'format': fmt,
+                                 'file': name, 'size': os.path.getsize(path)})
+
+        clean = None
+        if max_dimension:
+            clean = save_clean_copy(img, source_path, out_dir, source_format, icc_profile, max_dimension, quality)
+
+    fallback = formats[-1] if formats else None
+    main_crop = 'width' if widths else 'square'
+    candidates = [v for v in variants if v['crop'] == main_crop and v['format'] == fallback]
+    manifest = {
+        'spec': spec,
+        'original': {'width': original_width, 'height': original_height},
+        'crop': main_crop,
+        'src': max(candidates, key=lambda v: v['width'])['file'] if candidates else None,
+        'clean': clean,
+        'variants': variants
+    }
+    temp_path = manifest_path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    os.replace(temp_path, manifest_path)
+    return manifest
+
+def build_srcset(manifest, base_url):
+    """``srcset`` strings per format for the manifest's main crop, smallest first"""
+    srcset = {}
+    for variant in sorted(manifest['variants'], key=lambda v: v['width']):
+        if variant['crop'] == manifest['crop']:
+            srcset.setdefault(variant['format'], []).append(f"{base_url}/{variant['file']} {variant['width']}w")
+    return {fmt: ', '.join(entries) for fmt, entries in srcset.items()}
+
+def variants_url(digest):
+    return f'/api/uploads/variants/{digest}'
+
+class ImageProcessor:
+    """Generates image variants in a pool of worker processes.
+
+    Uploads are stored first and recorded as ``pending``; the worker's
+    result is written back to ``uploads.processing_status`` and
+    ``uploads.variants`` when it finishes, and only then is the upload
+    published (its clean copy served, an avatar set on the profile).
+    ``workers=0`` renders inline, which is what tests and single-process
+    scripts use.
+    """
+
+    def __init__(self, workers=2, widths=(320, 640, 1280), thumbnail_sizes=(150,),
+                 avatar_sizes=(150, 300), formats=('webp', 'jpeg'), quality=82, max_dimension=2048):
+        self.workers = workers
+        self.profiles = {
+            'image': {'widths': tuple(widths), 'square_sizes': tuple(thumbnail_sizes)},
+            'avatar': {'widths': (), 'square_sizes': tuple(avatar_sizes)}
+        }
+        self.max_dimension = max_dimension
+        self._requested_formats = tuple(formats)
+        self._formats = None
+        self.quality = quality
+        self._executor = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+
+    @property
+    def formats(self):
+        # Resolved on first use; checking encoders imports Pillow
+        if self._formats is None:
+            self._formats = tuple(supported_formats(self._requested_formats))
+        return self._formats
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._executor
+
+    def submit(self, upload_id, root, digest, source_path, profile='image'):
+        """Queue variant generation for an upload; returns its status"""
+        args = (source_path, os.path.join(root, *derived_path(digest).split('/')))
+        kwargs = dict(self.profiles[profile], formats=self.formats, quality=self.quality,
+                      max_dimension=self.max_dimension)
+        with self._lock:
+            self.pending += 1
+
+        if self.workers <= 0:
+            try:
+                manifest = render_variants(*args, **kwargs)
+            except Exception as e:
+                self._finish(upload_id, digest, profile, error=e)
+                return 'failed'
+            self._finish(upload_id, digest, profile, manifest=manifest)
+            return 'ready'
+
+        error = None
+        for attempt in range(2):
+            executor = self._get_executor()
+            try:
+                future = executor.submit(render_variants, *args, **kwargs)
+            except BrokenProcessPool as e:
+                # A worker died (e.g. OOM-killed); start a fresh pool and try once more
+                logger.warning('Image worker pool broke; restarting it')
+                self._discard_executor(executor)
+                error = e
+                continue
+            except Exception as e:
+                error = e
+                break
+            future.add_done_callback(partial(self._done, executor, upload_id, digest, profile))
+            return 'pending'
+        self._finish(upload_id, digest, profile, error=error)
+        return 'failed'
+
+    def _done(self, executor, upload_id, digest, profile, future):
+        error = future.exception()
+        if isinstance(error, BrokenProcessPool):
+            self._discard_executor(executor)
+        self._finish(upload_id, digest, profile, manifest=None if error else future.result(), error=error)
+
+    def _discard_executor(self, executor):
+        """Forget a broken pool so the next job starts a new one"""
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _finish(self, upload_id, digest, profile, manifest=None, error=None):
+        from ..database import get_db_connection
+        with self._lock:
+            self.pending -= 1
+            if error is None:
+                self.completed += 1
+            else:
+                self.failed += 1
+        if error is not None:
+            logger.warning('Image processing failed for upload %s: %s', upload_id, error)
+
+        try:
+            with get_db_connection() as conn:
+                conn.execute(
+                    'UPDATE uploads SET processing_status = ?, variants = ? WHERE id = ?',
+                    ('failed' if error else 'ready', json.dumps(manifest) if manifest else None, upload_id)
+                )
+                if profile == 'avatar' and manifest and manifest['src']:
+                    # Publish the cropped avatar, unless the user has uploaded a newer one since
+                    conn.execute('''
+                        UPDATE users SET avatar_url = ?
+                        WHERE id = (SELECT uploaded_by FROM uploads WHERE id = ?)
+                          AND NOT EXISTS (
+                              SELECT 1 FROM uploads
+                              WHERE uploaded_by = users.id AND upload_type = 'avatar' AND id > ?
+                          )
+                    ''', (f"{variants_url(digest)}/{manifest['src']}", upload_id, upload_id))
+                conn.commit()
+        except Exception as e:
+            logger.error('Could not record image variants for upload %s: %s', upload_id, e)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'formats': list(self.formats),
+                'profiles': {name: {key: list(value) for key, value in profile.items()}
+                             for name, profile in self.profiles.items()},
+                'pending': self.pending,
+                'completed': self.completed,
+                'failed': self.failed
+            }
+
+_processor = ImageProcessor(workers=0)
+
+def configure_image_processor(**options):
+    """Replace the process-wide image processor; the old pool is shut down"""
+    global _processor
+    previous = _processor
+    _processor = ImageProcessor(**options)
+    previous.shutdown()
+    return _processor
+
+def get_image_processor():
+    return _processor
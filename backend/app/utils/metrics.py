@@ -0,0 +1,208 @@
+import bisect
+import itertools
+import math
+import threading
+import time
+
+# Latency buckets in seconds (upper bounds, Prometheus style)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    """Thread-safe cumulative histogram of observations in fixed buckets"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    def quantile(self, q):
+        """Estimate a quantile as the upper bound of the bucket holding it"""
+        with self._lock:
+            counts, total = list(self._counts), self._count
+        if not total:
+            return 0.0
+        rank = q * total
+        seen = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            seen += count
+            if seen >= rank:
+                return bound if bound != float('inf') else self.buckets[-1]
+        return self.buckets[-1]
+
+    def snapshot(self):
+        """Return cumulative bucket counts plus sum and count"""
+        with self._lock:
+            counts, total, value_sum = list(self._counts), self._count, self._sum
+        cumulative = []
+        running = 0
+        for bound, count in zip(self.buckets, counts):
+            running += count
+            cumulative.append((bound, running))
+        cumulative.append(('+Inf', total))
+        return {'buckets': cumulative, 'sum': value_sum, 'count': total}
+
+    def summary(self):
+        snapshot = self.snapshot()
+        return {
+            'count': snapshot['count'],
+            'avg_ms': round(snapshot['sum'] / snapshot['count'] * 1000, 3) if snapshot['count'] else 0.0,
+            'p50_ms': self.quantile(0.5) * 1000,
+            'p95_ms': self.quantile(0.95) * 1000,
+            'p99_ms': self.quantile(0.99) * 1000,
+            'buckets': {str(bound): count for bound, count in snapshot['buckets']}
+        }
+
+def _count_value(counter):
+    """Current value of an ``itertools.count`` without advancing it"""
+    return int(repr(counter)[len('count('):-1])
+
+class RequestMetrics:
+    """Per-route request counts and latency histograms with no lock on the request path.
+
+    Each thread records into its own shard, a dict no other thread writes,
+    and the in-flight gauge is a pair of ``itertools.count`` counters whose
+    ``next()`` is atomic under the GIL. Scrapes merge the shards; shards of
+    threads that have exited are folded into a retired total, so servers
+    that start a thread per request do not accumulate them.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._started = itertools.count()
+        self._finished = itertools.count()
+        self._local = threading.local()
+        self._shards = []
+        self._retired = {}
+        self._lock = threading.Lock()  # taken once per thread and per scrape, never per request
+
+    def _new_shard(self):
+        shard = self._local.shard = {}
+        with self._lock:
+            self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def start(self):
+        """Count a request as in flight; returns its start time"""
+        next(self._started)
+        return time.perf_counter()
+
+    def observe(self, key, started):
+        """Record a finished request under ``key`` (a tuple of label values)"""
+        seconds = time.perf_counter() - started
+        next(self._finished)
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._new_shard()
+        try:
+            series = shard[key]
+        except KeyError:
+            series = shard[key] = [0.0, [0] * (len(self.buckets) + 1)]
+        series[0] += seconds
+        series[1][bisect.bisect_left(self.buckets, seconds)] += 1
+
+    @staticmethod
+    def _merge(target, key, series):
+        merged = target.get(key)
+        if merged is None:
+            merged = target[key] = [0.0, [0] * len(series[1])]
+        merged[0] += series[0]
+        for i, count in enumerate(series[1]):
+            merged[1][i] += count
+
+    def in_flight(self):
+        return _count_value(self._started) - _count_value(self._finished)
+
+    def snapshot(self):
+        """Merged series: ``{key: {'buckets': [(bound, cumulative)], 'sum', 'count'}}``"""
+        with self._lock:
+            live = []
+            for thread, shard in self._shards:
+                if thread.is_alive():
+                    live.append((thread, shard))
+                else:
+                    for key, series in shard.copy().items():
+                        self._merge(self._retired, key, series)
+            self._shards = live
+            merged = {}
+            for key, series in self._retired.items():
+                self._merge(merged, key, series)
+            for _, shard in live:
+                for key, series in shard.copy().items():
+                    self._merge(merged, key, [series[0], list(series[1])])
+
+        snapshot = {}
+        for key, (value_sum, counts) in merged.items():
+            cumulative = list(itertools.accumulate(counts))
+            snapshot[key] = {
+                'buckets': list(zip(self.buckets, cumulative)) + [('+Inf', cumulative[-1])],
+                'sum': value_sum,
+                'count': cumulative[-1]
+            }
+        return snapshot
+
+def _format_value(value):
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, float):
+        if math.isinf(value):
+            return '+Inf' if value > 0 else '-Inf'
+        return repr(value)
+    return str(value)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+class PrometheusText:
+    """Builds a Prometheus text exposition (format 0.0.4), one HELP/TYPE block per family"""
+
+    CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self, namespace=''):
+        self.namespace = namespace
+        self._lines = []
+
+    def _name(self, name):
+        return f'{self.namespace}_{name}' if self.namespace else name
+
+    def metric(self, name, kind, help_text, samples):
+        """Add a gauge or counter family; ``samples`` is a list of (labels, value)"""
+        name = self._name(name)
+        self._lines.append(f'# HELP {name} {help_text}')
+        self._lines.append(f'# TYPE {name} {kind}')
+        for labels, value in samples:
+            if value is not None:
+                self._lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+
+    def histogram(self, name, help_text, series):
+        """Add a histogram family; ``series`` is a list of (labels, snapshot) as from ``snapshot()``"""
+        name = self._name(name)
+        self._lines.append(f'# HELP {name} {help_text}')
+        self._lines.append(f'# TYPE {name} histogram')
+        for labels, snapshot in series:
+            for bound, count in snapshot['buckets']:
+                bucket_labels = dict(labels, le=bound if bound == '+Inf' else _format_value(float(bound)))
+                self._lines.append(f'{name}_bucket{_format_labels(bucket_labels)} {count}')
+            self._lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(float(snapshot['sum']))}")
+            self._lines.append(f"{name}_count{_format_labels(labels)} {snapshot['count']}")
+
+    def render(self):
+        return '\n'.join(self._lines) + '\n'
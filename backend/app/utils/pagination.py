@@ -0,0 +1,142 @@
+import base64
+import json
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, request
+
+TOTAL_MODES = ('exact', 'cached', 'estimate', 'none')
+
+class InvalidCursorError(ValueError):
+    pass
+
+def encode_cursor(created_at, row_id):
+    """Opaque ``after`` token for the row at (created_at, id)"""
+    raw = json.dumps([created_at, row_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(token):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        created_at, row_id = json.loads(raw)
+    except (ValueError, TypeError):
+        raise InvalidCursorError('Invalid pagination cursor')
+    if not isinstance(row_id, int) or not isinstance(created_at, (str, type(None))):
+        raise InvalidCursorError('Invalid pagination cursor')
+    return created_at, row_id
+
+def get_page_args(default_per_page=10, max_per_page=50):
+    """Parse page/per_page/after/total query arguments.
+
+    Passing ``after`` (empty for the first page) switches to cursor mode.
+    ``total`` picks how the total is computed: exact COUNT(*), a short-lived
+    cached count, a count bounded at PAGINATION_ESTIMATE_LIMIT rows, or none.
+    Cursor mode defaults to an estimate so deep pages stay as cheap as the first.
+    """
+    cursor_mode = 'after' in request.args
+    after = request.args.get('after', '')
+    total = request.args.get('total', 'estimate' if cursor_mode else 'exact')
+    if total not in TOTAL_MODES:
+        total = 'exact'
+    return {
+        'page': max(request.args.get('page', 1, type=int), 1),
+        'per_page': max(min(request.args.get('per_page', default_per_page, type=int), max_per_page), 1),
+        'cursor_mode': cursor_mode,
+        'after': decode_cursor(after) if after else None,
+        'total': total
+    }
+
+class CountCache:
+    """Small TTL cache of COUNT(*) results keyed on the count query and its params"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+count_cache = CountCache()
+
+def count_rows(conn, count_query, params, mode):
+    """Return (total, is_estimate) for a ``SELECT COUNT(*) ...`` query"""
+    if mode == 'none':
+        return None, False
+
+    if mode == 'estimate':
+        limit = current_app.config.get('PAGINATION_ESTIMATE_LIMIT', 10000)
+        bounded = count_query.replace('SELECT COUNT(*)', 'SELECT 1', 1)
+        total = conn.execute(f'SELECT COUNT(*) FROM ({bounded} LIMIT ?)', list(params) + [limit + 1]).fetchone()[0]
+        return min(total, limit), total > limit
+
+    if mode == 'cached':
+        key = (count_query, tuple(params))
+        total = count_cache.get(key)
+        if total is None:
+            total = conn.execute(count_query, params).fetchone()[0]
+            count_cache.set(key, total, current_app.config.get('PAGINATION_COUNT_CACHE_TTL', 30))
+        return total, False
+
+    return conn.execute(count_query, params).fetchone()[0], False
+
+def paginate(conn, query, count_query, params, args, prefix='', order=None):
+    """Run a list query in offset or keyset mode and build the pagination fields.
+
+    ``query`` and ``count_query`` must end in their WHERE clause and share
+    ``params``. Rows are ordered by ``(created_at, id)`` descending; in cursor
+    mode the next page starts strictly after the ``after`` row, which the
+    composite (created_at, id) indexes serve without skipping rows. ``order``
+    adds leading sort terms in offset mode only (e.g. search rank).
+    """
+    created_at, row_id = f'{prefix}created_at', f'{prefix}id'
+    per_page = args['per_page']
+    page_params = list(params)
+
+    if args['after']:
+        query += f' AND ({created_at}, {row_id}) < (?, ?)'
+        page_params.extend(args['after'])
+
+    sort = f'{created_at} DESC, {row_id} DESC'
+    if order and not args['cursor_mode']:
+        sort = f'{order}, {sort}'
+    query += f' ORDER BY {sort} LIMIT ?'
+    page_params.append(per_page + 1)
+    if not args['cursor_mode']:
+        query += ' OFFSET ?'
+        page_params.append((args['page'] - 1) * per_page)
+
+    rows = conn.execute(query, page_params).fetchall()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    total, is_estimate = count_rows(conn, count_query, params, args['total'])
+    meta = {
+        'total': total,
+        'per_page': per_page,
+        'has_more': has_more,
+        'next_cursor': encode_cursor(rows[-1]['created_at'], rows[-1]['id']) if has_more else None
+    }
+    if is_estimate:
+        meta['total_is_estimate'] = True
+    if not args['cursor_mode']:
+        meta['page'] = args['page']
+        if total is not None:
+            meta['pages'] = (total + per_page - 1) // per_page
+    return rows, meta
@@ -0,0 +1,180 @@
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+import bcrypt
+from werkzeug.security import check_password_hash
+from .metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ROUNDS = 12
+
+class PasswordHasherBusy(Exception):
+    """Raised when the hashing pool is saturated and the request should be shed"""
+
+def _hashpw(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+def _checkpw(password, hashed):
+    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+def is_bcrypt_hash(hashed):
+    return hashed.startswith(('$2a$', '$2b$', '$2y$'))
+
+def hash_rounds(hashed):
+    """Cost factor of a bcrypt hash, or None for other formats"""
+    try:
+        return int(hashed.split('$')[2]) if is_bcrypt_hash(hashed) else None
+    except (IndexError, ValueError):
+        return None
+
+class PasswordHasher:
+    """Runs bcrypt in a bounded pool of worker processes.
+
+    bcrypt is deliberately slow, so it is kept off request threads. At most
+    ``max_pending`` hashes may be queued or running; beyond that calls raise
+    ``PasswordHasherBusy`` straight away so the route can answer 503 rather
+    than pile up requests. ``workers=0`` hashes inline on the calling thread.
+    """
+
+    def __init__(self, workers=2, max_pending=32, rounds=DEFAULT_ROUNDS, timeout=10.0):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.rounds = rounds
+        self.timeout = timeout
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0
+
+        self.shed = 0
+        self.rehashed = 0
+        self.logins = {'success': 0, 'failure': 0}
+        self.latency = {'hash': Histogram(), 'verify': Histogram()}
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._executor
+
+    def _release(self, future=None):
+        with self._lock:
+            self._pending -= 1
+
+    def _run(self, kind, func, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.shed += 1
+                raise PasswordHasherBusy('Password hashing queue is full')
+            self._pending += 1
+
+        started = time.perf_counter()
+        try:
+            if self.workers <= 0:
+                try:
+                    return func(*args)
+                finally:
+                    self._release()
+            try:
+                future = self._get_executor().submit(func, *args)
+            except BaseException:
+                self._release()
+                raise
+            # The slot is freed when the job ends, not when its caller stops waiting,
+            # so jobs abandoned on timeout still count against max_pending
+            future.add_done_callback(self._release)
+            try:
+                return future.result(self.timeout)
+            except FutureTimeoutError:
+                future.cancel()  # Drops it if still queued; a running hash has to finish
+                with self._lock:
+                    self.shed += 1
+                raise PasswordHasherBusy('Password hashing timed out')
+        except BrokenProcessPool:
+            logger.warning('Password hashing pool broke; restarting it')
+            self.shutdown()
+            return func(*args)
+        finally:
+            self.latency[kind].observe(time.perf_counter() - started)
+
+    def hash(self, password):
+        return self._run('hash', _hashpw, password, self.rounds)
+
+    def verify(self, password, hashed):
+        if not hashed:
+            return False
+        if not is_bcrypt_hash(hashed):
+            # Legacy werkzeug hashes (older admin-created users); cheap enough to check inline
+            return check_password_hash(hashed, password)
+        return self._run('verify', _checkpw, password, hashed)
+
+    def needs_rehash(self, hashed):
+        return hash_rounds(hashed) != self.rounds
+
+    def verify_and_update(self, password, hashed):
+        """Verify a password and return (valid, new_hash).
+
+        ``new_hash`` is set when the stored hash uses another cost factor or
+        format, so the caller can store an upgraded hash on successful login.
+        """
+        if not self.verify(password, hashed):
+            return False, None
+        if not self.needs_rehash(hashed):
+            return True, None
+        try:
+            new_hash = self.hash(password)
+        except PasswordHasherBusy:
+            return True, None  # Upgrade on a later login
+        with self._lock:
+            self.rehashed += 1
+        return True, new_hash
+
+    def record_login(self, success):
+        with self._lock:
+            self.logins['success' if success else 'failure'] += 1
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                'workers': self.workers,
+                'rounds': self.rounds,
+                'pending': self._pending,
+                'max_pending': self.max_pending,
+                'shed': self.shed,
+                'rehashed': self.rehashed,
+                'logins': dict(self.logins)
+            }
+        stats['latency'] = {kind: histogram.summary() for kind, histogram in self.latency.items()}
+        return stats
+
+_hasher = PasswordHasher(workers=0)
+
+def configure_password_hasher(workers=2, max_pending=32, rounds=DEFAULT_ROUNDS, timeout=10.0):
+    """Replace the process-wide hasher; the old pool is shut down"""
+    global _hasher
+    previous = _hasher
+    _hasher = PasswordHasher(workers=workers, max_pending=max_pending, rounds=rounds, timeout=timeout)
+    previous.shutdown()
+    return _hasher
+
+def get_password_hasher():
+    return _hasher
+
+def hash_password(password):
+    """Hash password using bcrypt"""
+    return _hasher.hash(password)
+
+def verify_password(password, hashed):
+    """Verify password against hash"""
+    return _hasher.verify(password, hashed)
@@ -1,7 +1,10 @@
+import threading
+import time
 from functools import wraps
-from flask import jsonify
+from flask import g, has_app_context, jsonify
 from flask_jwt_extended import get_jwt_identity, get_jwt
 from ..database import get_db_connection
+from .hierarchy import get_hierarchy
 
 def admin_required(f):
     """Decorator to require admin privileges"""
@@ -39,39 +42,173 @@ def check_permission(required_permission, resource_type=None, resource_id=None):
         return decorated_function
     return decorator
 
-def has_permission(user_id, permission, resource_type=None, resource_id=None):
-    """Check if user has specific permission"""
+class Principal:
+    """Everything permission checks need to know about one user.
+
+    Built from a single users row, the user's explicit grants and the
+    college/faculty ancestry of their faculty or department, so a check
+    never has to go back to the database for the user.
+
+    ``college_id``, ``faculty_id`` and ``department_id`` are the user row's
+    own scope columns and are the only ones authorization checks use. The
+    ancestry derived from the hierarchy is kept apart in
+    ``ancestor_college_id`` and ``ancestor_faculty_id`` and grants nothing.
+    """
+    __slots__ = ('id', 'role', 'is_active', 'college_id', 'faculty_id',
+                 'department_id', 'ancestor_college_id', 'ancestor_faculty_id',
+                 'permissions', 'grants')
+
+    def __init__(self, user, grants=(), college_id=None, faculty_id=None):
+        self.id = user['id']
+        self.role = user['role']
+        self.is_active = bool(user['is_active'])
+        self.department_id = user['department_id']
+        self.faculty_id = user['faculty_id']
+        self.college_id = user['college_id']
+        self.ancestor_faculty_id = user['faculty_id'] or faculty_id
+        self.ancestor_college_id = user['college_id'] or college_id
+        self.permissions = frozenset(get_role_permissions(self.role))
+        self.grants = frozenset(grants)
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def has_role_permission(self, permission):
+        return 'all' in self.permissions or permission in self.permissions
+
+    def has_grant(self, resource_type, resource_id, permission):
+        return (resource_type, resource_id, permission) in self.grants
+
+class PrincipalCache:
+    """Process-wide TTL cache of principals, shared across requests"""
+
+    def __init__(self, ttl=30):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] < time.monotonic():
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1]
+
+    def set(self, user_id, principal):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, principal)
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(_principal_key(user_id), None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+principal_cache = PrincipalCache()
+
+def _principal_key(user_id):
+    try:
+        return int(user_id)
+    except (TypeError, ValueError):
+        return user_id
+
+def load_principal(user_id):
+    """Build a principal from the database, or None if the user does not exist"""
     with get_db_connection() as conn:
-        # Get user info
         user = conn.execute('SELECT * FROM users WHERE id = ?', (user_id,)).fetchone()
-        if not user or not user['is_active']:
-            return False
-        
-        # Super admin has all permissions
-        if user['role'] == 'super_admin':
-            return True
+        if not user:
+            return None
         
-        # Check role-based permissions
-        role_permissions = get_role_permissions(user['role'])
-        if permission in role_permissions or 'all' in role_permissions:
-            return True
+        grants = [
+            (row['resource_type'], row['resource_id'], row['permission'])
+            for row in conn.execute(
+                'SELECT resource_type, resource_id, permission FROM user_permissions WHERE user_id = ?',
+                (user_id,)
+            )
+        ]
         
-        # Check specific user permissions
-        if resource_type and resource_id:
-            user_permission = conn.execute('''
-                SELECT * FROM user_permissions 
-                WHERE user_id = ? AND resource_type = ? AND resource_id = ? AND permission = ?
-            ''', (user_id, resource_type, resource_id, permission)).fetchone()
-            
-            if user_permission:
-                return True
-        
-        # Check college/faculty level permissions
-        if user['college_id'] and resource_type in ['college', 'faculty', 'department']:
-            if check_hierarchical_permission(user, permission, resource_type, resource_id):
-                return True
+        # Fill in the ancestry of the user's department or faculty
+        hierarchy = get_hierarchy()
+        ancestry = (hierarchy.ancestry('department', user['department_id'])
+                    or hierarchy.ancestry('faculty', user['faculty_id']) or {})
+        faculty_id = ancestry.get('faculty')
+        college_id = ancestry.get('college')
         
+        return Principal(user, grants, college_id=college_id, faculty_id=faculty_id)
+
+def get_principal(user_id):
+    """Resolve a user's principal once per request.
+
+    Lookups go to ``flask.g`` first, then the process-wide TTL cache, and
+    only then to the database. Call ``invalidate_principal()`` after
+    changing a user's role, scope or grants.
+    """
+    key = _principal_key(user_id)
+    request_cache = g.setdefault('principals', {}) if has_app_context() else {}
+    if key in request_cache:
+        return request_cache[key]
+    
+    principal = principal_cache.get(key)
+    if principal is None:
+        principal = load_principal(key)
+        if principal is not None:
+            principal_cache.set(key, principal)
+    request_cache[key] = principal
+    return principal
+
+def invalidate_principal(user_id=None):
+    """Drop cached principals for one user, or for everyone when user_id is None"""
+    principal_cache.invalidate(user_id)
+    if has_app_context() and 'principals' in g:
+        if user_id is None:
+            g.principals.clear()
+        else:
+            g.principals.pop(_principal_key(user_id), None)
+
+def configure_principal_cache(ttl=30):
+    principal_cache.ttl = ttl
+    principal_cache.invalidate()
+
+def has_permission(user_id, permission, resource_type=None, resource_id=None):
+    """Check if user has specific permission"""
+    user = get_principal(user_id)
+    if not user or not user.is_active:
         return False
+    
+    # Super admin has all permissions
+    if user.role == 'super_admin':
+        return True
+    
+    # Check role-based permissions
+    if user.has_role_permission(permission):
+        return True
+    
+    # Check specific user permissions
+    if resource_type and resource_id and user.has_grant(resource_type, resource_id, permission):
+        return True
+    
+    # Check college/faculty level permissions
+    if user.college_id and resource_type in ['college', 'faculty', 'department']:
+        if check_hierarchical_permission(user, permission, resource_type, resource_id):
+            return True
+    
+    return False
 
 def get_role_permissions(role):
     """Get permissions for a specific role"""
@@ -103,75 +240,64 @@ def get_role_permissions(role):
 
 def check_hierarchical_permission(user, permission, resource_type, resource_id):
     """Check permissions based on organizational hierarchy"""
-    with get_db_connection() as conn:
-        if resource_type == 'college':
-            # User can manage their own college
-            return user['college_id'] == resource_id and user['role'] in ['college_admin', 'faculty_admin']
-        
-        elif resource_type == 'faculty':
-            # Get faculty's college
-            faculty = conn.execute('SELECT college_id FROM faculties WHERE id = ?', (resource_id,)).fetchone()
-            if faculty:
-                # User can manage faculty in their college
-                if user['college_id'] == faculty['college_id'] and user['role'] == 'college_admin':
-                    return True
-                # User can manage their own faculty
-                if user['faculty_id'] == resource_id and user['role'] == 'faculty_admin':
-                    return True
-        
-        elif resource_type == 'department':
-            # Get department's faculty and college
-            department = conn.execute('''
-                SELECT d.faculty_id, f.college_id 
-                FROM departments d 
-                JOIN faculties f ON d.faculty_id = f.id 
-                WHERE d.id = ?
-            ''', (resource_id,)).fetchone()
-            
-            if department:
-                # User can manage department in their college
-                if user['college_id'] == department['college_id'] and user['role'] == 'college_admin':
-                    return True
-                # User can manage department in their faculty
-                if user['faculty_id'] == department['faculty_id'] and user['role'] == 'faculty_admin':
-                    return True
-                # User can manage their own department
-                if user['department_id'] == resource_id and user['role'] == 'department_admin':
-                    return True
+    if resource_type == 'college':
+        # User can manage their own college
+        return user['college_id'] == resource_id and user['role'] in ['college_admin', 'faculty_admin']
+    
+    elif resource_type == 'faculty':
+        faculty = get_hierarchy().ancestry('faculty', resource_id)
+        if faculty:
+            # User can manage faculty in their college
+            if user['college_id'] == faculty['college'] and user['role'] == 'college_admin':
+                return True
+            # User can manage their own faculty
+            if user['faculty_id'] == resource_id and user['role'] == 'faculty_admin':
+                return True
+    
+    elif resource_type == 'department':
+        department = get_hierarchy().ancestry('department', resource_id)
+        if department:
+            # User can manage department in their college
+            if user['college_id'] == department.get('college') and user['role'] == 'college_admin':
+                return True
+            # User can manage department in their faculty
+            if user['faculty_id'] == department['faculty'] and user['role'] == 'faculty_admin':
+                return True
+            # User can manage their own department
+            if user['department_id'] == resource_id and user['role'] == 'department_admin':
+                return True
     
     return False
 
 def can_manage_user(manager_id, target_user_id):
     """Check if manager can manage target user"""
-    with get_db_connection() as conn:
-        manager = conn.execute('SELECT * FROM users WHERE id = ?', (manager_id,)).fetchone()
-        target = conn.execute('SELECT * FROM users WHERE id = ?', (target_user_id,)).fetchone()
-        
-        if not manager or not target:
-            return False
-        
-        # Super admin can manage anyone
-        if manager['role'] == 'super_admin':
-            return True
-        
-        # College admin can manage users in their college
-        if manager['role'] == 'college_admin' and manager['college_id'] == target['college_id']:
-            return True
-        
-        # Faculty admin can manage users in their faculty
-        if manager['role'] == 'faculty_admin' and manager['faculty_id'] == target['faculty_id']:
-            return True
-        
+    manager = get_principal(manager_id)
+    target = get_principal(target_user_id)
+    
+    if not manager or not target:
         return False
+    
+    # Super admin can manage anyone
+    if manager.role == 'super_admin':
+        return True
+    
+    # College admin can manage users in their college
+    if manager.role == 'college_admin' and manager.college_id == target.college_id:
+        return True
+    
+    # Faculty admin can manage users in their faculty
+    if manager.role == 'faculty_admin' and manager.faculty_id == target.faculty_id:
+        return True
+    
+    return False
 
 def get_accessible_resources(user_id, resource_type):
     """Get list of resources user can access"""
+    user = get_principal(user_id)
+    if not user:
+        return []
+    
     with get_db_connection() as conn:
-        user = conn.execute('SELECT * FROM users WHERE id = ?', (user_id,)).fetchone()
-        
-        if not user:
-            return []
-        
         # Super admin can access everything
         if user['role'] == 'super_admin':
             if resource_type == 'colleges':
@@ -186,20 +312,16 @@ def get_accessible_resources(user_id, resource_type):
             if resource_type == 'colleges':
                 return [user['college_id']]
             elif resource_type == 'faculties':
-                return [row['id'] for row in conn.execute('SELECT id FROM faculties WHERE college_id = ?', (user['college_id'],)).fetchall()]
+                return sorted(get_hierarchy().descendant_ids('college', user['college_id'], 'faculty'))
             elif resource_type == 'departments':
-                return [row['id'] for row in conn.execute('''
-                    SELECT d.id FROM departments d 
-                    JOIN faculties f ON d.faculty_id = f.id 
-                    WHERE f.college_id = ?
-                ''', (user['college_id'],)).fetchall()]
+                return sorted(get_hierarchy().descendant_ids('college', user['college_id'], 'department'))
         
         # Faculty admin can access their faculty and its departments
         elif user['role'] == 'faculty_admin' and user['faculty_id']:
             if resource_type == 'faculties':
                 return [user['faculty_id']]
             elif resource_type == 'departments':
-                return [row['id'] for row in conn.execute('SELECT id FROM departments WHERE faculty_id = ?', (user['faculty_id'],)).fetchall()]
+                return sorted(get_hierarchy().descendant_ids('faculty', user['faculty_id'], 'department'))
         
         # Department admin can access their department
         elif user['role'] == 'department_admin' and user['department_id']:
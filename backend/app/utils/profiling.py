@@ -0,0 +1,324 @@
+import logging
+import random
+import re
+import threading
+import time
+from functools import lru_cache
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+from .metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+_COMMENT = re.compile(r'--[^\n]*')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?\b')
+_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+@lru_cache(maxsize=4096)
+def fingerprint(sql):
+    """Normalise a statement so runs with different literals or IN-list lengths group together"""
+    if sql.startswith('-- TRIGGER'):
+        return 'TRIGGER ' + sql[len('-- TRIGGER'):].strip()
+    sql = _COMMENT.sub(' ', sql)
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _LIST.sub('(...)', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+_local = threading.local()
+
+def current_profile():
+    """The profile of the request running on this thread, or None when it is not sampled"""
+    return getattr(_local, 'profile', None)
+
+class ProfiledCursor:
+    """Cursor proxy that adds fetch time to the statement that produced it"""
+
+    __slots__ = ('_cursor', '_entry')
+
+    def __init__(self, cursor, entry):
+        self._cursor = cursor
+        self._entry = entry
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def _timed(self, method, *args):
+        started = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self._entry[1] += time.perf_counter() - started
+
+    def fetchone(self):
+        return self._timed(self._cursor.fetchone)
+
+    def fetchmany(self, *args):
+        return self._timed(self._cursor.fetchmany, *args)
+
+    def fetchall(self):
+        return self._timed(self._cursor.fetchall)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self._timed(self._cursor.__next__)
+
+class RequestProfile:
+    """Timings collected while one sampled request runs.
+
+    ``queries`` maps a fingerprint to [calls, seconds, errors] for statements
+    issued through pooled connections (executemany counts as one call);
+    ``statements`` counts everything SQLite actually ran, as seen by the
+    trace callback, including each executemany row and trigger bodies.
+    """
+
+    __slots__ = ('started', 'connect', 'serialize', 'queries', 'statements', 'triggers', 'error')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.connect = 0.0
+        self.serialize = 0.0
+        self.queries = {}
+        self.statements = 0
+        self.triggers = {}
+        self.error = None
+
+    def trace(self, statement):
+        self.statements += 1
+        if statement.startswith('-- TRIGGER'):
+            name = fingerprint(statement)
+            self.triggers[name] = self.triggers.get(name, 0) + 1
+
+    def execute(self, conn, method, sql, parameters):
+        """Run ``conn.<method>`` and time it under the statement's fingerprint"""
+        key = fingerprint(sql)
+        entry = self.queries.get(key)
+        if entry is None:
+            entry = self.queries[key] = [0, 0.0, 0]
+        entry[0] += 1
+        started = time.perf_counter()
+        try:
+            cursor = getattr(conn, method)(sql, parameters)
+        except Exception as e:
+            entry[2] += 1
+            self.error = f'{type(e).__name__}: {e}'
+            raise
+        finally:
+            entry[1] += time.perf_counter() - started
+        return ProfiledCursor(cursor, entry)
+
+    @property
+    def query_time(self):
+        return sum(entry[1] for entry in self.queries.values())
+
+    @property
+    def query_count(self):
+        return sum(entry[0] for entry in self.queries.values())
+
+class ProfilingJSONProvider(DefaultJSONProvider):
+    """JSON provider that charges serialization time to the current profile"""
+
+    def dumps(self, obj, **kwargs):
+        profile = current_profile()
+        if profile is None:
+            return super().dumps(obj, **kwargs)
+        started = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            profile.serialize += time.perf_counter() - started
+
+class Profiler:
+    """Aggregates request profiles per endpoint and per query fingerprint.
+
+    A request is sampled with probability ``sample_rate``. A fingerprint
+    issued ``n_plus_one_threshold`` or more times by one request is flagged
+    as a likely N+1 query. Fingerprints past ``max_fingerprints`` are
+    counted as dropped rather than tracked, so odd ad-hoc SQL cannot grow
+    the tables without bound.
+    """
+
+    def __init__(self, enabled=False, sample_rate=1.0, n_plus_one_threshold=10,
+                 server_timing=True, max_fingerprints=500):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.server_timing = server_timing
+        self.max_fingerprints = max_fingerprints
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._endpoints = {}
+            self._queries = {}
+            self._n_plus_one = {}
+            self._dropped = 0
+            self._sampled = 0
+
+    def start(self):
+        """Begin profiling the current request if it is sampled"""
+        if not self.enabled or random.random() >= self.sample_rate:
+            return None
+        profile = _local.profile = RequestProfile()
+        return profile
+
+    def finish(self, endpoint, status):
+        """Close the current request's profile and fold it into the aggregates"""
+        profile = current_profile()
+        if profile is None:
+            return None
+        _local.profile = None
+        total = time.perf_counter() - profile.started
+        query_time = profile.query_time
+        suspects = [(key, entry[0]) for key, entry in profile.queries.items()
+                    if entry[0] >= self.n_plus_one_threshold]
+
+        with self._lock:
+            self._sampled += 1
+            stats = self._endpoints.get(endpoint)
+            if stats is None:
+                stats = self._endpoints[endpoint] = {
+                    'requests': 0, 'errors': 0, 'latency': Histogram(), 'connect': 0.0, 'query': 0.0,
+                    'serialize': 0.0, 'queries': 0, 'statements': 0, 'max_queries': 0, 'last_error': None
+                }
+            stats['requests'] += 1
+            stats['errors'] += status >= 500
+            stats['latency'].observe(total)
+            stats['connect'] += profile.connect
+            stats['query'] += query_time
+            stats['serialize'] += profile.serialize
+            stats['queries'] += profile.query_count
+            stats['statements'] += profile.statements
+            stats['max_queries'] = max(stats['max_queries'], profile.query_count)
+            if profile.error:
+                stats['last_error'] = profile.error
+
+            for key, (calls, seconds, errors) in profile.queries.items():
+                query = self._queries.get(key)
+                if query is None:
+                    if len(self._queries) >= self.max_fingerprints:
+                        self._dropped += 1
+                        continue
+                    query = self._queries[key] = {'calls': 0, 'seconds': 0.0, 'max_seconds': 0.0,
+                                                  'errors': 0, 'endpoints': set()}
+                query['calls'] += calls
+                query['seconds'] += seconds
+                query['max_seconds'] = max(query['max_seconds'], seconds / calls)
+                query['errors'] += errors
+                if len(query['endpoints']) < 20:
+                    query['endpoints'].add(endpoint)
+
+            for key, repeats in suspects:
+                flagged = self._n_plus_one.get((endpoint, key))
+                if flagged is None:
+                    logger.warning('Possible N+1 query in %s: %d x %s', endpoint, repeats, key)
+                    flagged = self._n_plus_one[(endpoint, key)] = {'requests': 0, 'max_repeats': 0}
+                flagged['requests'] += 1
+                flagged['max_repeats'] = max(flagged['max_repeats'], repeats)
+                flagged['last_seen'] = time.time()
+
+        return {
+            'total': total,
+            'connect': profile.connect,
+            'db': query_time,
+            'serialize': profile.serialize,
+            'app': max(0.0, total - profile.connect - query_time - profile.serialize),
+            'queries': profile.query_count,
+            'statements': profile.statements
+        }
+
+    def discard(self):
+        _local.profile = None
+
+    def stats(self, limit=20):
+        with self._lock:
+            endpoints = {}
+            for name, stats in self._endpoints.items():
+                requests = stats['requests']
+                endpoints[name] = {
+                    'requests': requests,
+                    'errors': stats['errors'],
+                    'latency': stats['latency'].summary(),
+                    'avg_connect_ms': round(stats['connect'] / requests * 1000, 3),
+                    'avg_query_ms': round(stats['query'] / requests * 1000, 3),
+                    'avg_serialize_ms': round(stats['serialize'] / requests * 1000, 3),
+                    'avg_queries': round(stats['queries'] / requests, 2),
+                    'avg_statements': round(stats['statements'] / requests, 2),
+                    'max_queries': stats['max_queries'],
+                    'last_error': stats['last_error']
+                }
+            queries = [
+                {'fingerprint': key, 'calls': query['calls'], 'total_ms': round(query['seconds'] * 1000, 3),
+                 'avg_ms': round(query['seconds'] / query['calls'] * 1000, 3),
+                 'max_ms': round(query['max_seconds'] * 1000, 3), 'errors': query['errors'],
+                 'endpoints': sorted(query['endpoints'])}
+                for key, query in self._queries.items()
+            ]
+            n_plus_one = [
+                {'endpoint': endpoint, 'fingerprint': key, **flagged}
+                for (endpoint, key), flagged in self._n_plus_one.items()
+            ]
+            return {
+                'enabled': self.enabled,
+                'sample_rate': self.sample_rate,
+                'n_plus_one_threshold': self.n_plus_one_threshold,
+                'sampled_requests': self._sampled,
+                'dropped_fingerprints': self._dropped,
+                'endpoints': endpoints,
+                'slowest_queries': sorted(queries, key=lambda q: q['total_ms'], reverse=True)[:limit],
+                'n_plus_one': sorted(n_plus_one, key=lambda f: f['requests'], reverse=True)[:limit]
+            }
+
+def server_timing(timings):
+    """Format a finished profile as a ``Server-Timing`` header value"""
+    return ', '.join([
+        f"db;dur={timings['db'] * 1000:.2f};desc=\"{timings['queries']} queries\"",
+        f"connect;dur={timings['connect'] * 1000:.2f}",
+        f"serialize;dur={timings['serialize'] * 1000:.2f}",
+        f"app;dur={timings['app'] * 1000:.2f}",
+        f"total;dur={timings['total'] * 1000:.2f}"
+    ])
+
+profiler = Profiler()
+
+def configure_profiler(**options):
+    global profiler
+    profiler = Profiler(**options)
+    return profiler
+
+def get_profiler():
+    return profiler
+
+def init_app(app):
+    """Configure the profiler and, when enabled, install its request hooks"""
+    configure_profiler(
+        enabled=app.config.get('PROFILING_ENABLED', False),
+        sample_rate=app.config.get('PROFILING_SAMPLE_RATE', 1.0),
+        n_plus_one_threshold=app.config.get('PROFILING_N_PLUS_ONE_THRESHOLD', 10),
+        server_timing=app.config.get('PROFILING_SERVER_TIMING', True)
+    )
+    if not profiler.enabled:
+        return
+
+    app.json = ProfilingJSONProvider(app)
+
+    @app.before_request
+    def start_profile():
+        profiler.start()
+
+    @app.after_request
+    def finish_profile(response):
+        endpoint = f'{request.method} {request.url_rule.rule}' if request.url_rule else 'unmatched'
+        timings = profiler.finish(endpoint, response.status_code)
+        if timings is not None and profiler.server_timing:
+            response.headers['Server-Timing'] = server_timing(timings)
+        return response
+
+    @app.teardown_request
+    def discard_profile(exception=None):
+        profiler.discard()
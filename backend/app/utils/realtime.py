@@ -0,0 +1,131 @@
+import logging
+import threading
+import time
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+    redis = None
+
+WINDOW_MINUTES = 60
+
+class SlidingWindowCounter:
+    """In-process per-minute ring buffer of active visitors and page views.
+
+    Each slot holds one minute: the set of visitor keys seen, a page counter
+    and a view total. Slots are reused as the clock moves on, so memory is
+    bounded by the window and a query only walks the requested minutes.
+    """
+
+    def __init__(self, window_minutes=WINDOW_MINUTES):
+        self.window = window_minutes
+        self._minutes = [-1] * window_minutes
+        self._visitors = [set() for _ in range(window_minutes)]
+        self._pages = [Counter() for _ in range(window_minutes)]
+        self._views = [0] * window_minutes
+        self._lock = threading.Lock()
+
+    def record(self, visitor, page, now=None):
+        minute = int((now or time.time()) // 60)
+        slot = minute % self.window
+        with self._lock:
+            if self._minutes[slot] != minute:
+                self._minutes[slot] = minute
+                self._visitors[slot] = set()
+                self._pages[slot] = Counter()
+                self._views[slot] = 0
+            if visitor:
+                self._visitors[slot].add(visitor)
+            self._pages[slot][page] += 1
+            self._views[slot] += 1
+
+    def snapshot(self, minutes, now=None):
+        """Return active visitors, views and page counts over the last ``minutes``"""
+        current = int((now or time.time()) // 60)
+        visitors = set()
+        pages = Counter()
+        views = 0
+        with self._lock:
+            for minute in range(current - min(minutes, self.window) + 1, current + 1):
+                slot = minute % self.window
+                if self._minutes[slot] != minute:
+                    continue
+                visitors |= self._visitors[slot]
+                pages.update(self._pages[slot])
+                views += self._views[slot]
+        return {'active_visitors': len(visitors), 'views': views, 'pages': pages}
+
+class RedisWindowCounter:
+    """Per-minute counters kept in Redis so every worker shares one view.
+
+    Visitors go into a HyperLogLog per minute (PFCOUNT over several keys gives
+    the union), pages into a sorted set and views into a plain counter. Keys
+    expire once they fall out of the window.
+    """
+
+    def __init__(self, client, window_minutes=WINDOW_MINUTES, prefix='realtime'):
+        self.client = client
+        self.window = window_minutes
+        self.prefix = prefix
+
+    def _key(self, minute, kind):
+        return f'{self.prefix}:{minute}:{kind}'
+
+    def record(self, visitor, page, now=None):
+        minute = int((now or time.time()) // 60)
+        ttl = (self.window + 1) * 60
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            if visitor:
+                pipe.pfadd(self._key(minute, 'visitors'), visitor)
+                pipe.expire(self._key(minute, 'visitors'), ttl)
+            pipe.zincrby(self._key(minute, 'pages'), 1, page)
+            pipe.expire(self._key(minute, 'pages'), ttl)
+            pipe.incr(self._key(minute, 'views'))
+            pipe.expire(self._key(minute, 'views'), ttl)
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.warning('Realtime counter update failed: %s', e)
+
+    def snapshot(self, minutes, now=None):
+        current = int((now or time.time()) // 60)
+        window = range(current - min(minutes, self.window) + 1, current + 1)
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            pipe.pfcount(*[self._key(minute, 'visitors') for minute in window])
+            pipe.mget([self._key(minute, 'views') for minute in window])
+            for minute in window:
+                pipe.zrange(self._key(minute, 'pages'), 0, -1, withscores=True)
+            results = pipe.execute()
+        except redis.RedisError as e:
+            logger.warning('Realtime counter read failed: %s', e)
+            return {'active_visitors': 0, 'views': 0, 'pages': Counter()}
+
+        pages = Counter()
+        for members in results[2:]:
+            for page, score in members:
+                pages[page.decode('utf-8') if isinstance(page, bytes) else page] += int(score)
+        return {
+            'active_visitors': results[0],
+            'views': sum(int(views) for views in results[1] if views),
+            'pages': pages
+        }
+
+_counter = SlidingWindowCounter()
+
+def configure_realtime(redis_url=None):
+    """Use a shared Redis-backed counter when a URL is given and redis is installed"""
+    global _counter
+    if redis_url and REDIS_AVAILABLE:
+        _counter = RedisWindowCounter(redis.Redis.from_url(redis_url))
+    elif not isinstance(_counter, SlidingWindowCounter):
+        _counter = SlidingWindowCounter()
+    return _counter
+
+def get_realtime_counter():
+    return _counter
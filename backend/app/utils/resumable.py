@@ -0,0 +1,209 @@
+import hashlib
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+    fcntl = None
+
+READ_SIZE = 64 * 1024
+
+# Leading bytes each document type must start with; txt only has to be free of NUL bytes
+SIGNATURES = {
+    'pdf': (b'%PDF-',),
+    'doc': (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1',),
+    'docx': (b'PK\x03\x04',),
+    'odt': (b'PK\x03\x04',),
+    'rtf': (b'{\\rtf',)
+}
+
+class UploadSessionError(Exception):
+    """A request that does not fit the session's state; carries the HTTP status and current offset"""
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+def create_session_table(conn):
+    """Create the table of in-progress chunked uploads"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS upload_sessions (
+            id TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            filename TEXT NOT NULL,
+            extension TEXT NOT NULL,
+            total_size INTEGER NOT NULL,
+            received INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            expires_at TIMESTAMP NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+
+def signature_matches(extension, head):
+    if extension == 'txt':
+        return b'\x00' not in head
+    signatures = SIGNATURES.get(extension)
+    return signatures is None or head.startswith(signatures)
+
+class ResumableUploads:
+    """tus-style chunked uploads written straight into the upload temp folder.
+
+    A session is created with the file's name and total size, chunks are
+    appended at the offset the server reports, and completing it hands the
+    finished file (and its SHA-256) to the blob store, which moves it into
+    place without a copy. The hash is updated as chunks arrive while this
+    process has seen every byte in order; otherwise it is computed once on
+    completion.
+    """
+
+    def __init__(self, chunk_size=8 * 1024 * 1024, max_size=1024 * 1024 * 1024, ttl=86400):
+        self.chunk_size = chunk_size
+        self.max_size = max_size
+        self.ttl = ttl
+        self._hashers = {}
+        self._lock = threading.Lock()
+
+    def configure(self, chunk_size=None, max_size=None, ttl=None):
+        if chunk_size is not None:
+            self.chunk_size = int(chunk_size)
+        if max_size is not None:
+            self.max_size = int(max_size)
+        if ttl is not None:
+            self.ttl = int(ttl)
+
+    def part_path(self, root, session_id):
+        return os.path.join(root, 'temp', f'upload-{session_id}.part')
+
+    def create(self, conn, root, user_id, filename, extension, total_size):
+        if total_size <= 0:
+            raise UploadSessionError('File size must be positive')
+        if total_size > self.max_size:
+            raise UploadSessionError(f'File too large (max {self.max_size} bytes)', 413)
+
+        self.purge_expired(conn, root)
+        session_id = uuid.uuid4().hex
+        os.makedirs(os.path.join(root, 'temp'), exist_ok=True)
+        open(self.part_path(root, session_id), 'wb').close()
+        expires_at = (datetime.utcnow() + timedelta(seconds=self.ttl)).strftime('%Y-%m-%d %H:%M:%S')
+        conn.execute('''
+            INSERT INTO upload_sessions (id, user_id, filename, extension, total_size, expires_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (session_id, user_id, filename, extension, total_size, expires_at))
+        conn.commit()
+        with self._lock:
+            self._hashers[session_id] = (0, hashlib.sha256())
+        return {'id': session_id, 'offset': 0, 'size': total_size,
+                'chunk_size': self.chunk_size, 'expires_at': expires_at}
+
+    def get(self, conn, session_id, user_id):
+        session = conn.execute('''
+            SELECT * FROM upload_sessions WHERE id = ? AND user_id = ? AND expires_at > CURRENT_TIMESTAMP
+        ''', (session_id, user_id)).fetchone()
+        if not session:
+            raise UploadSessionError('Upload session not found', 404)
+        return session
+
+    def append(self, conn, root, session, offset, stream, length):
+        """Write one chunk at ``offset``; returns the new offset.
+
+        A chunk cut short by a dropped connection still advances the offset
+        by what was written, so the client resumes from there.
+        """
+        received = session['received']
+        if offset != received:
+            raise UploadSessionError('Offset does not match the upload', 409, received)
+        if length is None or length <= 0:
+            raise UploadSessionError('Chunk has no Content-Length')
+        if length > self.chunk_size:
+            raise UploadSessionError(f'Chunk too large (max {self.chunk_size} bytes)', 413, received)
+        if offset + length > session['total_size']:
+            raise UploadSessionError('Chunk runs past the declared file size', 400, received)
+
+        with open(self.part_path(root, session['id']), 'r+b') as f:
+            if FCNTL_AVAILABLE:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    raise UploadSessionError('Another chunk is being written', 409, received)
+            with self._lock:
+                hashed_offset, hasher = self._hashers.get(session['id'], (None, None))
+            # Work on a copy so a failed chunk leaves the stored state untouched
+            hasher = hasher.copy() if hashed_offset == offset else None
+
+            f.seek(offset)
+            written = 0
+            while written < length:
+                data = stream.read(min(READ_SIZE, length - written))
+                if not data:
+                    break
+                if offset == 0 and written == 0 and not signature_matches(session['extension'], data):
+                    raise UploadSessionError('File content does not match its type', 415, received)
+                f.write(data)
+                if hasher is not None:
+                    hasher.update(data)
+                written += len(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+            new_offset = offset + written
+            expires_at = (datetime.utcnow() + timedelta(seconds=self.ttl)).strftime('%Y-%m-%d %H:%M:%S')
+            updated = conn.execute('''
+                UPDATE upload_sessions SET received = ?, expires_at = ? WHERE id = ? AND received = ?
+            ''', (new_offset, expires_at, session['id'], offset)).rowcount
+            conn.commit()
+        if not updated:
+            raise UploadSessionError('Upload was modified concurrently', 409)
+
+        with self._lock:
+            if hasher is not None:
+                self._hashers[session['id']] = (new_offset, hasher)
+            else:
+                self._hashers.pop(session['id'], None)
+        return new_offset
+
+    def complete(self, conn, root, session):
+        """Close a fully received session; returns (part_path, digest, size) for the blob store"""
+        if session['received'] != session['total_size']:
+            raise UploadSessionError('Upload is incomplete', 409, session['received'])
+
+        path = self.part_path(root, session['id'])
+        with self._lock:
+            hashed_offset, hasher = self._hashers.pop(session['id'], (None, None))
+        if hashed_offset == session['total_size']:
+            digest = hasher.hexdigest()
+        else:
+            digest = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(chunk)
+            digest = digest.hexdigest()
+
+        conn.execute('DELETE FROM upload_sessions WHERE id = ?', (session['id'],))
+        return path, digest, session['total_size']
+
+    def abort(self, conn, root, session_id):
+        conn.execute('DELETE FROM upload_sessions WHERE id = ?', (session_id,))
+        conn.commit()
+        with self._lock:
+            self._hashers.pop(session_id, None)
+        path = self.part_path(root, session_id)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def purge_expired(self, conn, root):
+        """Drop sessions past their expiry and their partial files"""
+        expired = conn.execute(
+            'SELECT id FROM upload_sessions WHERE expires_at <= CURRENT_TIMESTAMP'
+        ).fetchall()
+        for row in expired:
+            self.abort(conn, root, row[0])
+        return len(expired)
+
+resumable_uploads = ResumableUploads()
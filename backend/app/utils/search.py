@@ -0,0 +1,95 @@
+import re
+import sqlite3
+
+# Indexed news columns with their BM25 weights (titles rank above excerpts,
+# tags and bodies)
+NEWS_SEARCH_COLUMNS = {
+    'title': 10.0,
+    'title_ar': 10.0,
+    'title_fr': 10.0,
+    'excerpt': 4.0,
+    'excerpt_ar': 4.0,
+    'excerpt_fr': 4.0,
+    'tags': 6.0,
+    'content': 1.0,
+    'content_ar': 1.0,
+    'content_fr': 1.0
+}
+
+NEWS_SEARCH_RANK = 'bm25(news_fts, {})'.format(', '.join(str(w) for w in NEWS_SEARCH_COLUMNS.values()))
+NEWS_SEARCH_SNIPPET = "snippet(news_fts, -1, '<mark>', '</mark>', '…', 16)"
+
+_TERM_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+_search_enabled = None
+
+def create_news_search_index(conn):
+    """Create the news FTS5 index and its sync triggers.
+
+    The index is an external-content table over ``news``, so it stores only
+    the inverted index; triggers keep it in step with inserts, deletes and
+    edits to the indexed columns. Returns False when SQLite lacks FTS5.
+    """
+    global _search_enabled
+    columns = ', '.join(NEWS_SEARCH_COLUMNS)
+    new_values = ', '.join(f'new.{column}' for column in NEWS_SEARCH_COLUMNS)
+    old_values = ', '.join(f'old.{column}' for column in NEWS_SEARCH_COLUMNS)
+
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'news_fts'"
+    ).fetchone()
+    try:
+        conn.execute(f'''
+            CREATE VIRTUAL TABLE IF NOT EXISTS news_fts USING fts5(
+                {columns},
+                content='news', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2',
+                prefix='2 3'
+            )
+        ''')
+    except sqlite3.OperationalError:
+        _search_enabled = False
+        return False
+
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS news_fts_insert AFTER INSERT ON news BEGIN
+            INSERT INTO news_fts (rowid, {columns}) VALUES (new.id, {new_values});
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS news_fts_delete AFTER DELETE ON news BEGIN
+            INSERT INTO news_fts (news_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+        END
+    ''')
+    # Only edits to indexed columns touch the index, not view/like counters
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS news_fts_update AFTER UPDATE OF {columns} ON news BEGIN
+            INSERT INTO news_fts (news_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+            INSERT INTO news_fts (rowid, {columns}) VALUES (new.id, {new_values});
+        END
+    ''')
+
+    if not exists:
+        conn.execute("INSERT INTO news_fts (news_fts) VALUES ('rebuild')")
+
+    _search_enabled = True
+    return True
+
+def news_search_enabled(conn):
+    """Whether the news FTS index exists in this database"""
+    global _search_enabled
+    if _search_enabled is None:
+        _search_enabled = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'news_fts'"
+        ).fetchone() is not None
+    return _search_enabled
+
+def build_match_query(text):
+    """Turn free text into an FTS5 MATCH expression.
+
+    Every word must match, and each word is also a prefix so partial input
+    ("unive") finds "university". Words are quoted, so FTS5 operators and
+    punctuation in the input are treated as plain text.
+    """
+    terms = _TERM_PATTERN.findall(text or '')
+    return ' '.join(f'"{term}"*' for term in terms)
@@ -0,0 +1,231 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from .images import FORMATS, save_image, supported_formats
+
+DEFAULT_SIZES = (64, 150, 320, 480, 640, 960, 1280)
+# Output formats tried, in order, when the source format cannot be written (e.g. GIF)
+FALLBACK_FORMATS = ('webp', 'png', 'jpeg')
+
+class InvalidTransformError(ValueError):
+    """Raised for transform parameters outside the whitelist"""
+
+class SingleFlight:
+    """Runs one call per key at a time; concurrent callers wait for and share its result"""
+
+    class _Call:
+        __slots__ = ('event', 'result', 'error')
+
+        def __init__(self):
+            self.event = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.shared = 0
+
+    def do(self, key, func):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result
+
+def render_transform(source_path, dest_path, width=None, height=None, fmt='webp', quality=82):
+    """Resize an image to a width, a height, or a cropped width x height box, never upscaling"""
+    from PIL import Image, ImageOps
+    with Image.open(source_path) as img:
+        if img.format == 'JPEG':
+            # Decode at the smallest DCT scale that still covers the target box
+            if width and height:
+                box = (width, height)
+            elif width:
+                box = (width, round(img.height * width / img.width))
+            else:
+                box = (round(img.width * height / img.height), height)
+            img.draft('RGB', box)
+        img = ImageOps.exif_transpose(img)
+        img.load()
+        if width and height:
+            scale = min(1.0, img.width / width, img.height / height)
+            box = (max(1, round(width * scale)), max(1, round(height * scale)))
+            img = ImageOps.fit(img, box, Image.Resampling.LANCZOS)
+        elif width or height:
+            scale = min(1.0, width / img.width) if width else min(1.0, height / img.height)
+            size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+            if size != img.size:
+                img = img.resize(size, Image.Resampling.LANCZOS)
+
+        directory = os.path.dirname(dest_path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        os.close(fd)
+        try:
+            save_image(img, temp_path, fmt, quality)
+            os.replace(temp_path, dest_path)
+        except Exception:
+            os.remove(temp_path)
+            raise
+
+class TransformCache:
+    """On-disk cache of resized images, evicted least recently used past a byte cap.
+
+    The index lives in memory and is rebuilt from file access times at
+    startup; hits touch the file so the order survives restarts. Renders of
+    the same variant are single-flighted within the process, and files are
+    written with an atomic rename so concurrent workers never see half an
+    image.
+    """
+
+    def __init__(self, root=None, max_bytes=512 * 1024 * 1024, sizes=DEFAULT_SIZES,
+                 formats=('webp', 'jpeg', 'png'), quality=82):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.sizes = frozenset(sizes)
+        self._requested_formats = tuple(formats)
+        self._formats = None
+        self.quality = quality
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._flights = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def formats(self):
+        if self._formats is None:
+            self._formats = tuple(supported_formats(self._requested_formats))
+        return self._formats
+
+    def parse(self, args, source_format=None):
+        """Validate ``w``, ``h`` and ``fmt`` query args; returns None when none are given"""
+        if not any(name in args for name in ('w', 'h', 'fmt')):
+            return None
+        try:
+            width = int(args['w']) if args.get('w') else None
+            height = int(args['h']) if args.get('h') else None
+        except ValueError:
+            raise InvalidTransformError('w and h must be integers')
+        for value in (width, height):
+            if value is not None and value not in self.sizes:
+                raise InvalidTransformError(f'Size must be one of {sorted(self.sizes)}')
+        fmt = (args.get('fmt') or source_format or 'jpeg').lower()
+        fmt = 'jpeg' if fmt == 'jpg' else fmt
+        if fmt not in self.formats and not args.get('fmt'):
+            # Keep alpha where the fallback can: webp and png both carry it
+            fmt = next((name for name in FALLBACK_FORMATS if name in self.formats), fmt)
+        if fmt not in self.formats:
+            raise InvalidTransformError(f'Format must be one of {list(self.formats)}')
+        return width, height, fmt
+
+    def relative_path(self, source_key, width, height, fmt):
+        key = hashlib.sha1(f'{source_key}:{width}:{height}:{fmt}:{self.quality}'.encode('utf-8')).hexdigest()
+        return f'{key[:2]}/{key}.{FORMATS[fmt][1]}'
+
+    def _load(self):
+        entries = []
+        if self.root and os.path.isdir(self.root):
+            for directory, _, files in os.walk(self.root):
+                for name in files:
+                    if name.endswith('.tmp'):
+                        continue
+                    path = os.path.join(directory, name)
+                    stat = os.stat(path)
+                    entries.append((stat.st_atime, os.path.relpath(path, self.root).replace(os.sep, '/'), stat.st_size))
+        for _, relative, size in sorted(entries):
+            self._entries[relative] = size
+            self._bytes += size
+        self._loaded = True
+
+    def get(self, source_path, source_key, width, height, fmt):
+        """Path (relative to the cache root) of the variant, rendering it on a miss"""
+        relative = self.relative_path(source_key, width, height, fmt)
+        path = os.path.join(self.root, *relative.split('/'))
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            if relative in self._entries and os.path.exists(path):
+                self._entries.move_to_end(relative)
+                self.hits += 1
+                try:
+                    os.utime(path)
+                except OSError:
+                    pass
+                return relative
+            self.misses += 1
+
+        def render():
+            if not os.path.exists(path):
+                render_transform(source_path, path, width, height, fmt, self.quality)
+            self._add(relative, os.path.getsize(path))
+            return relative
+
+        return self._flights.do(relative, render)
+
+    def _add(self, relative, size):
+        with self._lock:
+            if relative in self._entries:
+                self._bytes -= self._entries.pop(relative)
+            self._entries[relative] = size
+            self._bytes += size
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                evicted, evicted_size = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+                try:
+                    os.remove(os.path.join(self.root, *evicted.split('/')))
+                except OSError:
+                    pass
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'shared_renders': self._flights.shared,
+                'sizes': sorted(self.sizes),
+                'formats': list(self.formats)
+            }
+
+transform_cache = TransformCache()
+
+def configure_transform_cache(root, max_bytes=512 * 1024 * 1024, sizes=DEFAULT_SIZES, quality=82):
+    """Rebuild the transform cache; its index is reloaded from disk on first use"""
+    global transform_cache
+    transform_cache = TransformCache(root, max_bytes, sizes, quality=quality)
+    return transform_cache
+
+def get_transform_cache():
+    return transform_cache
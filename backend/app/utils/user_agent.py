@@ -0,0 +1,83 @@
+import importlib.util
+import re
+from functools import lru_cache
+
+# user_agents compiles its regex tables on import (~0.25s), so it is only
+# imported when the first user agent is parsed rather than at app startup
+USER_AGENTS_AVAILABLE = importlib.util.find_spec('user_agents') is not None
+user_agents = None
+
+DEFAULT_CACHE_SIZE = 4096
+
+# Longer strings are parsed but not cached, so junk user agents can't flood the cache
+MAX_CACHED_LENGTH = 1024
+
+# One lookahead alternation finds every token (including overlapping ones) in
+# a single scan of the lowercased string
+_TOKEN_PATTERN = re.compile(
+    r'(?=(mobile|android|iphone|tablet|ipad|chrome|firefox|safari|edge|windows|mac|linux|ios))'
+)
+
+# Checked in priority order, mirroring the original substring rules
+_DEVICE_RULES = (
+    (('mobile', 'android', 'iphone'), 'mobile'),
+    (('tablet', 'ipad'), 'tablet'),
+)
+_BROWSER_RULES = (('chrome', 'Chrome'), ('firefox', 'Firefox'), ('safari', 'Safari'), ('edge', 'Edge'))
+_OS_RULES = (('windows', 'Windows'), ('mac', 'macOS'), ('linux', 'Linux'), ('android', 'Android'), ('ios', 'iOS'))
+
+def classify_user_agent(user_agent_string):
+    """Fallback (device_type, browser, os) classifier used without user_agents"""
+    tokens = set(_TOKEN_PATTERN.findall(user_agent_string.lower()))
+
+    device_type = 'desktop'
+    for candidates, device in _DEVICE_RULES:
+        if not tokens.isdisjoint(candidates):
+            device_type = device
+            break
+
+    browser = next((name for token, name in _BROWSER_RULES if token in tokens), 'Unknown')
+    os = next((name for token, name in _OS_RULES if token in tokens), 'Unknown')
+    return device_type, browser, os
+
+def _user_agents():
+    global user_agents
+    if user_agents is None:
+        import user_agents as module
+        user_agents = module
+    return user_agents
+
+def _parse(user_agent_string):
+    if not user_agent_string:
+        return 'desktop', 'Unknown', 'Unknown'
+    if USER_AGENTS_AVAILABLE:
+        user_agent = _user_agents().parse(user_agent_string)
+        device_type = 'mobile' if user_agent.is_mobile else 'tablet' if user_agent.is_tablet else 'desktop'
+        return device_type, user_agent.browser.family, user_agent.os.family
+    return classify_user_agent(user_agent_string)
+
+_cached_parse = lru_cache(maxsize=DEFAULT_CACHE_SIZE)(_parse)
+
+def configure_user_agent_cache(maxsize=DEFAULT_CACHE_SIZE):
+    """Resize (and clear) the parsed user agent cache"""
+    global _cached_parse
+    _cached_parse = lru_cache(maxsize=maxsize)(_parse)
+
+def parse_user_agent(user_agent_string):
+    """Return (device_type, browser, os), memoized per distinct user agent"""
+    if len(user_agent_string) > MAX_CACHED_LENGTH:
+        return _parse(user_agent_string)
+    return _cached_parse(user_agent_string)
+
+def user_agent_cache_stats():
+    """Hit-rate metrics for the parsed user agent cache"""
+    info = _cached_parse.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        'hits': info.hits,
+        'misses': info.misses,
+        'size': info.currsize,
+        'maxsize': info.maxsize,
+        'hit_rate': round(info.hits / lookups, 4) if lookups else 0.0,
+        'parser': 'user_agents' if USER_AGENTS_AVAILABLE else 'fallback'
+    }
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark for University Portal
+Times `import app` and create_app() in fresh interpreters and reports the
+median of each startup phase.
+Usage: python benchmark_startup.py [--runs 10] [--migrate] [--json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Run in a child process so every measurement starts from a cold interpreter
+CHILD = '''
+import json, time
+start = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app('testing')
+created = time.perf_counter()
+print(json.dumps({
+    'import': (imported - start) * 1000,
+    'create_app': (created - imported) * 1000,
+    'phases': app.extensions['startup_timings']
+}))
+'''
+
+def run_once(workdir, migrate):
+    """Start one interpreter and return its timings (ms)"""
+    env = dict(os.environ, AUTO_MIGRATE='true' if migrate else 'false',
+               PYTHONPATH=BACKEND_DIR)
+    result = subprocess.run([sys.executable, '-c', CHILD], cwd=workdir, env=env,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure application startup time')
+    parser.add_argument('--runs', type=int, default=10, help='Number of cold starts to measure')
+    parser.add_argument('--migrate', action='store_true', help='Run migrations in create_app (AUTO_MIGRATE)')
+    parser.add_argument('--json', action='store_true', help='Print a machine-readable report')
+    args = parser.parse_args()
+
+    samples = []
+    with tempfile.TemporaryDirectory() as workdir:
+        # The first start creates the database; it is reported separately
+        first = run_once(workdir, migrate=True)
+        for _ in range(args.runs):
+            samples.append(run_once(workdir, args.migrate))
+
+    def median(values):
+        return round(statistics.median(values), 2)
+
+    report = {
+        'runs': args.runs,
+        'migrate': args.migrate,
+        'first_start_ms': round(first['import'] + first['create_app'], 2),
+        'import_ms': median([s['import'] for s in samples]),
+        'create_app_ms': median([s['create_app'] for s in samples]),
+        'total_ms': median([s['import'] + s['create_app'] for s in samples]),
+        'phases_ms': {phase: median([s['phases'][phase] for s in samples]) for phase in samples[0]['phases']}
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"Startup over {args.runs} runs (median, AUTO_MIGRATE={'on' if args.migrate else 'off'})")
+    print(f"  first start (new database): {report['first_start_ms']:8.1f} ms")
+    print(f"  import app:                 {report['import_ms']:8.1f} ms")
+    print(f"  create_app:                 {report['create_app_ms']:8.1f} ms")
+    for phase, value in report['phases_ms'].items():
+        print(f"    {phase:<24}{value:8.1f} ms")
+    print(f"  total:                      {report['total_ms']:8.1f} ms")
+
+if __name__ == '__main__':
+    main()
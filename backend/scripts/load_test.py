@@ -0,0 +1,520 @@
+#!/usr/bin/env python3
+"""
+Load test for University Portal
+Seeds a synthetic dataset through the app factory, drives each endpoint with
+concurrent clients (in-process and over a local HTTP server) and writes a JSON
+report that can be compared between commits.
+Usage:
+    python load_test.py run --scale small --output report.json
+    python load_test.py compare baseline.json report.json
+"""
+
+import argparse
+import hashlib
+import http.client
+import io
+import json
+import logging
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Rows seeded per table at each scale
+SCALES = {
+    'tiny': {'page_views': 2000, 'news': 200, 'files': 200},
+    'small': {'page_views': 10000, 'news': 1000, 'files': 1000},
+    'medium': {'page_views': 1000000, 'news': 100000, 'files': 100000},
+    'large': {'page_views': 10000000, 'news': 100000, 'files': 1000000}
+}
+SEED_BATCH = 50000
+SEED_MANIFEST = 'load_test_seed.json'
+DISTINCT_BLOBS = 32  # seeded files share this many blobs on disk, as deduplicated uploads do
+
+PAGES = ['/', '/about', '/faculties', '/news', '/contact', '/downloads', '/ai-house', '/incubator'] + \
+        [f'/news/{i}' for i in range(200)] + [f'/faculties/{i}' for i in range(20)]
+USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36',
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Mobile/15E148',
+    'Mozilla/5.0 (X11; Linux x86_64; rv:121.0) Gecko/20100101 Firefox/121.0',
+    'Mozilla/5.0 (Linux; Android 14; Pixel 8) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Mobile Safari/537.36'
+]
+DEVICES = [('desktop', 'Chrome', 'Windows'), ('mobile', 'Mobile Safari', 'iOS'),
+           ('desktop', 'Firefox', 'Linux'), ('mobile', 'Chrome Mobile', 'Android')]
+REFERRERS = ['', 'https://www.google.com/', 'https://www.facebook.com/', 'https://univ-khenchela.dz/']
+CATEGORIES = ['general', 'academic', 'research', 'events', 'announcements']
+WORDS = ['university', 'research', 'student', 'library', 'faculty', 'robotics', 'hackathon', 'exam',
+         'scholarship', 'conference', 'laboratory', 'incubator', 'startup', 'science', 'medicine']
+FILE_TYPES = [('pdf', 'application/pdf'), ('docx', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'),
+              ('txt', 'text/plain')]
+
+def timestamp(rng, days=90):
+    return (datetime.utcnow() - timedelta(seconds=rng.randrange(days * 86400))).strftime('%Y-%m-%d %H:%M:%S')
+
+def sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+# ---------------------------------------------------------------------------
+# Dataset
+# ---------------------------------------------------------------------------
+
+def seed_page_views(conn, count, rng):
+    from app.utils.rollups import refresh_page_view_rollups
+    for start in range(0, count, SEED_BATCH):
+        rows = []
+        for _ in range(min(SEED_BATCH, count - start)):
+            device = rng.randrange(len(DEVICES))
+            referrer = rng.choice(REFERRERS)
+            rows.append((
+                rng.choice(PAGES), None, referrer, referrer.split('/')[2] if referrer else '',
+                f'10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(256)}',
+                USER_AGENTS[device], *DEVICES[device], '1920x1080', rng.choice(['en', 'ar', 'fr']),
+                f'session-{rng.randrange(count // 4 + 1)}', timestamp(rng)
+            ))
+        conn.executemany('''
+            INSERT INTO page_views (
+                page, title, referrer, referrer_domain, ip_address,
+                user_agent, device_type, browser, os, screen_resolution,
+                language, session_id, created_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        # Fold each batch into the rollups the way the ingest writer does
+        refresh_page_view_rollups(conn)
+        conn.commit()
+
+def seed_news(conn, count, rng, author_id):
+    for start in range(0, count, SEED_BATCH):
+        rows = []
+        for _ in range(min(SEED_BATCH, count - start)):
+            title = sentence(rng, 6)
+            content = '. '.join(sentence(rng, 20) for _ in range(5))
+            rows.append((title, content, content[:150], rng.choice(CATEGORIES),
+                         json.dumps(rng.sample(WORDS, 3)), author_id, 'System Administrator',
+                         int(rng.random() < 0.95), int(rng.random() < 0.05), timestamp(rng, 365)))
+        conn.executemany('''
+            INSERT INTO news (title, content, excerpt, category, tags, author_id, author_name,
+                              is_published, is_featured, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        conn.commit()
+
+def seed_blobs(upload_folder, rng):
+    """Write a few blobs of different sizes; returns [(relative_path, digest, size)]"""
+    from app.utils.blobstore import blob_path
+    blobs = []
+    for i in range(DISTINCT_BLOBS):
+        data = rng.randbytes(4096 << (i % 8))  # 4 KiB .. 512 KiB
+        digest = hashlib.sha256(data).hexdigest()
+        path = os.path.join(upload_folder, *blob_path(digest).split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        blobs.append((blob_path(digest), digest, len(data)))
+    return blobs
+
+def seed_files(conn, count, rng, author_id, blobs):
+    faculties = [row[0] for row in conn.execute('SELECT id FROM faculties')] or [None]
+    college = conn.execute('SELECT id FROM colleges ORDER BY id LIMIT 1').fetchone()
+    for start in range(0, count, SEED_BATCH):
+        rows = []
+        for i in range(start, min(start + SEED_BATCH, count)):
+            path, digest, size = rng.choice(blobs)
+            extension, mime_type = rng.choice(FILE_TYPES)
+            name = f"{rng.choice(WORDS)}-{i}.{extension}"
+            rows.append((f'{digest}.{extension}', name, path, extension, size, mime_type, digest,
+                         author_id, rng.choice(CATEGORIES), college[0] if college else None,
+                         rng.choice(faculties), int(rng.random() < 0.9), timestamp(rng, 365)))
+        conn.executemany('''
+            INSERT INTO files (filename, original_filename, file_path, file_type, file_size, mime_type,
+                               file_hash, uploaded_by, category, college_id, faculty_id, is_public, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        conn.commit()
+
+def seed(app, scale, seed_value=1):
+    """Fill the app's database to ``scale`` unless it already holds that dataset"""
+    from app.database import get_db_connection
+    counts = SCALES[scale]
+    manifest_path = os.path.join(os.getcwd(), SEED_MANIFEST)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest['counts'] == counts and manifest['seed'] == seed_value:
+            return dict(manifest, reused=True)
+
+    rng = random.Random(seed_value)
+    started = time.perf_counter()
+    timings = {}
+    with get_db_connection() as conn:
+        author_id = conn.execute("SELECT id FROM users WHERE role = 'super_admin' ORDER BY id LIMIT 1").fetchone()[0]
+        for table in ('page_views', 'news', 'files'):
+            table_started = time.perf_counter()
+            if table == 'page_views':
+                seed_page_views(conn, counts[table], rng)
+            elif table == 'news':
+                seed_news(conn, counts[table], rng, author_id)
+            else:
+                seed_files(conn, counts[table], rng, author_id, seed_blobs(app.config['UPLOAD_FOLDER'], rng))
+            timings[table] = round(time.perf_counter() - table_started, 2)
+        conn.execute('ANALYZE')
+        conn.commit()
+
+    manifest = {'scale': scale, 'seed': seed_value, 'counts': counts,
+                'seconds': round(time.perf_counter() - started, 2), 'table_seconds': timings}
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return dict(manifest, reused=False)
+
+# ---------------------------------------------------------------------------
+# Scenarios
+# ---------------------------------------------------------------------------
+
+def multipart(field, filename, data, content_type):
+    boundary = f'----loadtest{random.getrandbits(64):016x}'
+    body = (
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+        f'Content-Type: {content_type}\r\n\r\n'
+    ).encode('utf-8') + data + f'\r\n--{boundary}--\r\n'.encode('utf-8')
+    return body, f'multipart/form-data; boundary={boundary}'
+
+def sample_png():
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new('RGB', (800, 600), (40, 90, 160)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+def build_scenarios(context):
+    """Each scenario maps a random generator to (method, path, body, headers)"""
+    counts = context['counts']
+    token = {'Authorization': f"Bearer {context['token']}"}
+    json_headers = {'Content-Type': 'application/json'}
+    png = sample_png()
+    pdf = b'%PDF-1.4\n' + b'0' * 16 * 1024 + b'\n%%EOF\n'
+
+    def track(rng):
+        body = json.dumps({'page': rng.choice(PAGES), 'referrer': rng.choice(REFERRERS),
+                           'userAgent': rng.choice(USER_AGENTS), 'screenResolution': '1920x1080',
+                           'language': 'en', 'sessionId': f'load-{rng.randrange(10000)}'})
+        return 'POST', '/api/analytics/track', body.encode('utf-8'), json_headers
+
+    def upload(kind, data, filename, content_type):
+        def request(rng):
+            body, multipart_type = multipart('file', filename, data, content_type)
+            return 'POST', f'/api/uploads/{kind}', body, dict(token, **{'Content-Type': multipart_type})
+        return request
+
+    return {
+        'news_list': lambda rng: ('GET', f'/api/news/?page={rng.randint(1, 50)}', None, {}),
+        'news_search': lambda rng: ('GET', f'/api/news/?search={rng.choice(WORDS)}', None, {}),
+        'news_article': lambda rng: ('GET', f"/api/news/{rng.randint(1, counts['news'])}", None, {}),
+        'analytics_track': track,
+        'analytics_dashboard': lambda rng: (
+            'GET', f"/api/analytics/dashboard?timeRange={rng.choice(['1d', '7d', '30d', '90d'])}", None, token
+        ),
+        'downloads_files': lambda rng: ('GET', f'/api/downloads/files?page={rng.randint(1, 50)}', None, {}),
+        'downloads_file': lambda rng: ('GET', f"/api/downloads/file/{rng.randint(1, counts['files'])}", None, {}),
+        'downloads_stats': lambda rng: ('GET', '/api/downloads/stats', None, {}),
+        'uploads_image': upload('image', png, 'photo.png', 'image/png'),
+        'uploads_document': upload('document', pdf, 'report.pdf', 'application/pdf'),
+        'uploads_mine': lambda rng: ('GET', '/api/uploads/my-uploads', None, token),
+        'faculties_list': lambda rng: ('GET', '/api/faculties/', None, {}),
+        'ai_house_projects': lambda rng: ('GET', '/api/ai-house/projects', None, {}),
+        'incubator_startups': lambda rng: ('GET', '/api/incubator/startups', None, {}),
+        'auth_verify': lambda rng: ('GET', '/api/auth/verify', None, token),
+        'admin_dashboard': lambda rng: ('GET', '/api/admin/dashboard', None, token)
+    }
+
+# ---------------------------------------------------------------------------
+# Clients and load driver
+# ---------------------------------------------------------------------------
+
+class InProcessClient:
+    """Calls the WSGI app directly, measuring the application without a network stack"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body, headers):
+        response = self.client.open(path, method=method, data=body, headers=headers)
+        response.get_data()
+        response.close()
+        return response.status_code
+
+    def close(self):
+        pass
+
+class HTTPClient:
+    """Keep-alive HTTP/1.1 connection to the local server"""
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.conn = http.client.HTTPConnection(host, port, timeout=60)
+
+    def request(self, method, path, body, headers):
+        try:
+            self.conn.request(method, path, body=body, headers=headers)
+            response = self.conn.getresponse()
+            response.read()
+        except (http.client.HTTPException, ConnectionError):
+            self.conn.close()
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            raise
+        return response.status
+
+    def close(self):
+        self.conn.close()
+
+def percentile(ordered, q):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def run_scenario(make_client, build_request, concurrency, duration, warmup, seed_value):
+    """Drive one scenario from ``concurrency`` threads; returns its latency summary"""
+    latencies = [[] for _ in range(concurrency)]
+    statuses = [{} for _ in range(concurrency)]
+    errors = [0] * concurrency
+    barrier = threading.Barrier(concurrency + 1)
+    deadline = {}
+
+    def worker(index):
+        rng = random.Random(seed_value * 1000 + index)
+        client = make_client()
+        try:
+            barrier.wait()
+            while time.perf_counter() < deadline['warmup']:
+                try:
+                    client.request(*build_request(rng))
+                except Exception:
+                    pass
+            while True:
+                method, path, body, headers = build_request(rng)
+                started = time.perf_counter()
+                if started >= deadline['end']:
+                    break
+                try:
+                    status = client.request(method, path, body, headers)
+                except Exception:
+                    errors[index] += 1
+                    continue
+                latencies[index].append(time.perf_counter() - started)
+                statuses[index][status] = statuses[index].get(status, 0) + 1
+        finally:
+            client.close()
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    now = time.perf_counter()
+    deadline['warmup'] = now + warmup
+    deadline['end'] = now + warmup + duration
+    barrier.wait()
+    for thread in threads:
+        thread.join()
+
+    samples = sorted(value for worker_latencies in latencies for value in worker_latencies)
+    status_counts = {}
+    for worker_statuses in statuses:
+        for status, count in worker_statuses.items():
+            status_counts[str(status)] = status_counts.get(str(status), 0) + count
+    failed = errors_total = sum(errors)
+    failed += sum(count for status, count in status_counts.items() if int(status) >= 500)
+    total = len(samples) + errors_total
+    return {
+        'requests': total,
+        'throughput_rps': round(len(samples) / duration, 2),
+        'error_rate': round(failed / total, 4) if total else 0.0,
+        'status': dict(sorted(status_counts.items())),
+        'connection_errors': errors_total,
+        'mean_ms': round(statistics.fmean(samples) * 1000, 3) if samples else 0.0,
+        'p50_ms': round(percentile(samples, 0.50) * 1000, 3),
+        'p90_ms': round(percentile(samples, 0.90) * 1000, 3),
+        'p99_ms': round(percentile(samples, 0.99) * 1000, 3),
+        'max_ms': round(samples[-1] * 1000, 3) if samples else 0.0
+    }
+
+class LocalServer:
+    """Threaded werkzeug server on an ephemeral port, stopped with the context"""
+
+    def __init__(self, app):
+        from werkzeug.serving import make_server
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)  # no access log line per request
+        self.server = make_server('127.0.0.1', 0, app, threaded=True)
+        self.server.daemon_threads = True
+        self.port = self.server.server_port
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.thread.join()
+
+# ---------------------------------------------------------------------------
+# Commands
+# ---------------------------------------------------------------------------
+
+def environment_info():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=BACKEND_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'started_at': datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
+    }
+
+def create_benchmark_app(workdir):
+    """Build the app against a database and upload folder inside ``workdir``"""
+    os.environ.setdefault('UPLOAD_FOLDER', os.path.join(workdir, 'uploads'))
+    os.environ.setdefault('AUTO_MIGRATE', 'true')
+    os.environ.setdefault('IMAGE_WORKERS', '0')
+    os.chdir(workdir)  # DATABASE_PATH is relative to the working directory
+    from app import create_app, limiter
+    app = create_app('testing')
+    limiter.enabled = False  # the default 100/hour limit would turn the run into 429s
+    return app
+
+def access_token(app):
+    from flask_jwt_extended import create_access_token
+    from app.database import get_db_connection
+    with app.app_context(), get_db_connection() as conn:
+        user = conn.execute("SELECT * FROM users WHERE role = 'super_admin' ORDER BY id LIMIT 1").fetchone()
+        return create_access_token(identity=user['id'], expires_delta=timedelta(hours=12), additional_claims={
+            'role': user['role'], 'college_id': user['college_id'], 'faculty_id': user['faculty_id']
+        })
+
+def run(args, workdir):
+    app = create_benchmark_app(workdir)
+    dataset = seed(app, args.scale, args.seed)
+    context = {'counts': dataset['counts'], 'token': access_token(app)}
+    scenarios = build_scenarios(context)
+    selected = args.scenarios or list(scenarios)
+    unknown = set(selected) - set(scenarios)
+    if unknown:
+        raise SystemExit(f"Unknown scenario(s): {', '.join(sorted(unknown))}")
+
+    report = {
+        'meta': dict(environment_info(), scale=args.scale, concurrency=args.concurrency,
+                     duration=args.duration, warmup=args.warmup, seed=args.seed),
+        'dataset': dataset,
+        'results': {}
+    }
+    modes = ['inprocess', 'server'] if args.mode == 'both' else [args.mode]
+    for mode in modes:
+        results = report['results'][mode] = {}
+        server = LocalServer(app) if mode == 'server' else None
+        if server:
+            server.__enter__()
+        try:
+            for name in selected:
+                if mode == 'server':
+                    make_client = lambda: HTTPClient('127.0.0.1', server.port)
+                else:
+                    make_client = lambda: InProcessClient(app)
+                results[name] = run_scenario(make_client, scenarios[name], args.concurrency,
+                                             args.duration, args.warmup, args.seed)
+                if not args.json:
+                    print_result(mode, name, results[name])
+        finally:
+            if server:
+                server.__exit__(None, None, None)
+    return report
+
+def print_result(mode, name, result):
+    print(f"{mode:<10}{name:<22}{result['throughput_rps']:>10.1f} rps  p50 {result['p50_ms']:>8.2f}  "
+          f"p90 {result['p90_ms']:>8.2f}  p99 {result['p99_ms']:>8.2f} ms  errors {result['error_rate']:.1%}")
+
+def compare(baseline, current, threshold):
+    """Per-scenario changes between two reports; regressions exceed ``threshold`` (a fraction)"""
+    rows = []
+    for mode, results in current['results'].items():
+        for name, result in results.items():
+            base = baseline.get('results', {}).get(mode, {}).get(name)
+            if base is None:
+                continue
+            row = {'mode': mode, 'scenario': name, 'regressions': []}
+            for metric, worse_when_higher in (('p50_ms', True), ('p99_ms', True),
+                                              ('throughput_rps', False), ('error_rate', True)):
+                before, after = base[metric], result[metric]
+                change = (after - before) / before if before else (1.0 if after else 0.0)
+                row[metric] = {'before': before, 'after': after, 'change': round(change, 4)}
+                if metric == 'error_rate':
+                    regressed = after - before > 0.01
+                else:
+                    regressed = change > threshold if worse_when_higher else change < -threshold
+                if regressed:
+                    row['regressions'].append(metric)
+            rows.append(row)
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the University Portal API')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='Seed a dataset and measure every scenario')
+    run_parser.add_argument('--scale', choices=SCALES, default='small')
+    run_parser.add_argument('--mode', choices=['inprocess', 'server', 'both'], default='both')
+    run_parser.add_argument('--scenarios', nargs='*', help='Scenario names (default: all)')
+    run_parser.add_argument('--concurrency', type=int, default=8)
+    run_parser.add_argument('--duration', type=float, default=10.0, help='Measured seconds per scenario')
+    run_parser.add_argument('--warmup', type=float, default=1.0, help='Unmeasured seconds before each scenario')
+    run_parser.add_argument('--seed', type=int, default=1)
+    run_parser.add_argument('--workdir', help='Keep the database here and reuse it across runs')
+    run_parser.add_argument('--output', help='Write the JSON report to this file')
+    run_parser.add_argument('--json', action='store_true', help='Print the JSON report instead of a table')
+
+    compare_parser = commands.add_parser('compare', help='Diff two reports; exits 1 on regressions')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.2,
+                                help='Allowed relative slowdown before a metric counts as a regression')
+    args = parser.parse_args()
+
+    if args.command == 'compare':
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        with open(args.current, encoding='utf-8') as f:
+            current = json.load(f)
+        rows = compare(baseline, current, args.threshold)
+        for row in rows:
+            flag = 'REGRESSION ' + ','.join(row['regressions']) if row['regressions'] else 'ok'
+            print(f"{row['mode']:<10}{row['scenario']:<22}p99 {row['p99_ms']['change']:+8.1%}  "
+                  f"rps {row['throughput_rps']['change']:+8.1%}  {flag}")
+        sys.exit(1 if any(row['regressions'] for row in rows) else 0)
+
+    output = os.path.abspath(args.output) if args.output else None
+    if args.workdir:
+        workdir = os.path.abspath(args.workdir)
+        os.makedirs(workdir, exist_ok=True)
+        report = run(args, workdir)
+    else:
+        with tempfile.TemporaryDirectory() as workdir:
+            report = run(args, workdir)
+            os.chdir(BACKEND_DIR)
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,10 @@
+import pytest
+from app.utils.audit import audit_log
+
+@pytest.fixture(autouse=True)
+def isolated(tmp_path, monkeypatch):
+    """Keep each test's database, log files and audit spill file out of the source tree"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('AUDIT_SPILL_PATH', str(tmp_path / 'audit_spill.jsonl'))
+    yield
+    audit_log.reset()
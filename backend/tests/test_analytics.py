@@ -0,0 +1,212 @@
+import pytest
+from datetime import datetime, timedelta
+from app.database import configure_pool, get_db_connection, init_db
+from app.routes.analytics import beacon_field, write_page_views
+from app.utils.batching import BatchWriter
+from app.utils.hll import HyperLogLog
+from app.utils.realtime import SlidingWindowCounter
+from app.utils.rollups import (
+    get_rollup_watermark, new_visitors, refresh_page_view_rollups, rollup_counts, rollup_daily_series,
+    rollup_total, unique_visitors
+)
+from app.utils.user_agent import (
+    classify_user_agent, configure_user_agent_cache, parse_user_agent, user_agent_cache_stats
+)
+
+@pytest.fixture
+def db(tmp_path):
+    """Point the connection pool at a fresh, fully initialised database."""
+    configure_pool(str(tmp_path / 'analytics.db'))
+    init_db()
+    yield
+    configure_pool()
+
+def page_view(page, created_at, device='desktop', ip='10.0.0.1'):
+    return (page, '', '', '', ip, '', device, 'Chrome', 'Linux', '', 'en', 's1',
+            created_at.strftime('%Y-%m-%d %H:%M:%S'))
+
+class TestRollups:
+    def test_ingest_batch_updates_rollups(self, db):
+        """Each ingest batch is folded into the rollups in the same transaction"""
+        now = datetime.utcnow()
+        write_page_views([
+            page_view('/', now),
+            page_view('/', now, device='mobile'),
+            page_view('/news', now - timedelta(days=3)),
+        ])
+
+        with get_db_connection() as conn:
+            assert get_rollup_watermark(conn) == 3
+            assert rollup_total(conn, now - timedelta(days=7)) == 3
+            assert rollup_total(conn, now - timedelta(days=1)) == 2
+            assert rollup_counts(conn, 'page', now - timedelta(days=7)) == {'/': 2, '/news': 1}
+            assert rollup_counts(conn, 'device_type', now - timedelta(days=1)) == {'desktop': 1, 'mobile': 1}
+
+    def test_unbindable_page_view_does_not_block_ingest(self, db):
+        """A row SQLite cannot bind is dropped and the rows around it are still written"""
+        now = datetime.utcnow()
+        bad = list(page_view('/', now))
+        bad[1] = {'x': 1}
+        writer = BatchWriter('page-views-test', write_page_views, flush_interval=60)
+        for row in (page_view('/', now), tuple(bad), page_view('/news', now)):
+            writer.submit(row)
+        writer.stop()
+
+        with get_db_connection() as conn:
+            assert conn.execute('SELECT COUNT(*) FROM page_views').fetchone()[0] == 2
+        assert writer.stats()['rejected'] == 1
+
+    def test_beacon_fields_are_text(self):
+        """Scalar beacon fields are read as text and objects are refused"""
+        assert beacon_field({'title': 'Home'}, 'title') == 'Home'
+        assert beacon_field({'sessionId': 42}, 'sessionId') == '42'
+        assert beacon_field({}, 'language', 'en') == 'en'
+        with pytest.raises(ValueError):
+            beacon_field({'title': {'x': 1}}, 'title')
+
+    def test_previous_period_does_not_overlap(self, db):
+        """Adjacent windows split at the same instant never double count"""
+        now = datetime.utcnow()
+        start = now - timedelta(days=7)
+        write_page_views([page_view('/', now - timedelta(days=d)) for d in range(14)])
+
+        with get_db_connection() as conn:
+            current = rollup_total(conn, start)
+            previous = rollup_total(conn, start - timedelta(days=7), start)
+        assert current + previous == 14
+
+    def test_raw_tail_is_counted(self, db):
+        """Rows written outside the ingest path are read from the raw tail"""
+        now = datetime.utcnow()
+        write_page_views([page_view('/', now)])
+
+        with get_db_connection() as conn:
+            conn.execute('''
+                INSERT INTO page_views (page, device_type, created_at) VALUES ('/about', 'desktop', ?)
+            ''', (now.strftime('%Y-%m-%d %H:%M:%S'),))
+            conn.commit()
+
+            assert get_rollup_watermark(conn) == 1
+            assert rollup_counts(conn, 'page', now - timedelta(days=1)) == {'/': 1, '/about': 1}
+            assert rollup_daily_series(conn, now - timedelta(days=1), 'page', '/about') == [
+                {'date': now.strftime('%Y-%m-%d'), 'views': 1}
+            ]
+
+class TestUniqueVisitors:
+    def test_sketch_error_bound(self):
+        """Estimates stay within a few standard errors of the true cardinality"""
+        sketch = HyperLogLog()
+        for i in range(50000):
+            sketch.add(f'192.168.{i // 256}.{i % 256}')
+        assert abs(sketch.count() - 50000) / 50000 < 3 * sketch.error_rate
+
+    def test_small_cardinalities_are_exact(self):
+        """Linear counting keeps small counts exact"""
+        sketch = HyperLogLog()
+        for ip in ['10.0.0.1', '10.0.0.2', '10.0.0.1', '10.0.0.3']:
+            sketch.add(ip)
+        assert sketch.count() == 3
+
+    def test_sketches_merge_and_roundtrip(self):
+        """Serialized sketches merge into the union of their inputs"""
+        first, second = HyperLogLog(), HyperLogLog()
+        for i in range(300):
+            first.add(str(i))
+            second.add(str(i + 150))
+        merged = HyperLogLog.from_bytes(first.to_bytes()).merge(second)
+        assert abs(merged.count() - 450) <= 450 * 3 * merged.error_rate
+
+    def test_unique_visitors_from_sketches(self, db):
+        """Window unique counts merge per-bucket sketches and match exact mode"""
+        now = datetime.utcnow()
+        write_page_views([
+            page_view('/', now, ip='10.0.0.1'),
+            page_view('/', now - timedelta(days=2), ip='10.0.0.1'),
+            page_view('/news', now - timedelta(days=2), ip='10.0.0.2'),
+            page_view('/news', now - timedelta(days=9), ip='10.0.0.3'),
+        ])
+
+        with get_db_connection() as conn:
+            week_ago = now - timedelta(days=7)
+            assert unique_visitors(conn, week_ago) == 2
+            assert unique_visitors(conn, week_ago, exact=True) == 2
+            assert unique_visitors(conn, week_ago - timedelta(days=7), week_ago) == 1
+            assert unique_visitors(conn, week_ago, page='/news') == 1
+
+    def test_new_visitors_from_first_seen(self, db):
+        """Visitors count as new on the day of their first view, folded or still in the raw tail"""
+        now = datetime.utcnow()
+        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        write_page_views([
+            page_view('/', now, ip='10.0.0.1'),
+            page_view('/', now - timedelta(days=3), ip='10.0.0.1'),
+            page_view('/', now, ip='10.0.0.2'),
+        ])
+
+        with get_db_connection() as conn:
+            assert new_visitors(conn, today) == 1
+            for ip, created_at in (('10.0.0.3', now), ('10.0.0.4', now), ('10.0.0.4', now - timedelta(days=2)),
+                                   ('10.0.0.2', now)):
+                conn.execute('INSERT INTO page_views (page, ip_address, created_at) VALUES (?, ?, ?)',
+                             ('/', ip, created_at.strftime('%Y-%m-%d %H:%M:%S')))
+            conn.commit()
+            assert new_visitors(conn, today) == 2
+
+            refresh_page_view_rollups(conn)
+            conn.commit()
+            assert new_visitors(conn, today) == 2
+
+class TestRealtimeCounter:
+    def test_window_counts(self):
+        """Snapshots only include the requested trailing minutes"""
+        counter = SlidingWindowCounter()
+        now = 1_700_000_000
+        counter.record('s1', '/', now - 20 * 60)
+        counter.record('s2', '/news', now - 2 * 60)
+        counter.record('s2', '/news', now)
+        counter.record('s3', '/', now)
+
+        recent = counter.snapshot(5, now)
+        assert recent['active_visitors'] == 2
+        assert recent['views'] == 3
+        assert recent['pages'].most_common(1) == [('/news', 2)]
+        assert counter.snapshot(30, now)['active_visitors'] == 3
+
+    def test_slots_are_recycled(self):
+        """A slot from a previous lap of the ring is reset before reuse"""
+        counter = SlidingWindowCounter(window_minutes=10)
+        now = 1_700_000_000
+        counter.record('old', '/', now - 10 * 60)
+        counter.record('new', '/', now)
+
+        snapshot = counter.snapshot(10, now)
+        assert snapshot['active_visitors'] == 1
+        assert snapshot['views'] == 1
+
+class TestUserAgentCache:
+    def test_fallback_classifier_precedence(self):
+        """The single-pass classifier keeps the original substring priorities"""
+        assert classify_user_agent(
+            'Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) Safari/604.1'
+        ) == ('mobile', 'Safari', 'macOS')
+        assert classify_user_agent(
+            'Mozilla/5.0 (Windows NT 10.0) Chrome/120.0 Safari/537.36 Edg/120.0'
+        ) == ('desktop', 'Chrome', 'Windows')
+        assert classify_user_agent('Mozilla/5.0 (iPad; Tablet)') == ('tablet', 'Unknown', 'Unknown')
+        assert classify_user_agent('curl/8.0') == ('desktop', 'Unknown', 'Unknown')
+
+    def test_repeated_user_agents_hit_cache(self):
+        """Only the first sighting of a user agent string is parsed"""
+        configure_user_agent_cache(maxsize=2)
+        ua = 'Mozilla/5.0 (X11; Linux x86_64) Firefox/121.0'
+        first = parse_user_agent(ua)
+        assert parse_user_agent(ua) == first
+        parse_user_agent('a')
+        parse_user_agent('b')
+
+        stats = user_agent_cache_stats()
+        assert stats['hits'] == 1
+        assert stats['misses'] == 3
+        assert stats['size'] == 2
+        assert stats['hit_rate'] == 0.25
+        configure_user_agent_cache()
@@ -0,0 +1,103 @@
+import sqlite3
+import pytest
+from app.database import configure_pool, get_db_connection, init_db
+from app.utils.audit import AuditLog
+
+@pytest.fixture
+def audit(tmp_path):
+    configure_pool(str(tmp_path / 'audit.db'))
+    init_db()
+    log = AuditLog(spill_path=str(tmp_path / 'spill.jsonl'), batch_size=50, flush_interval=60)
+    yield log
+    log.stop()
+    configure_pool()
+
+def logged_actions():
+    with get_db_connection() as conn:
+        return [row[0] for row in conn.execute('SELECT action FROM activity_logs ORDER BY id')]
+
+class TestAuditLog:
+    def test_events_written_in_order(self, audit):
+        """Recorded events reach activity_logs in batches, in recording order"""
+        for i in range(120):
+            audit.record(1, f'action_{i}', 'user', 1)
+        audit.flush()
+
+        assert logged_actions() == [f'action_{i}' for i in range(120)]
+        assert audit.stats()['flushed'] == 120
+
+    def test_locked_database_spills_and_replays(self, audit, monkeypatch):
+        """A batch that cannot be written is spilled to disk and replayed before newer events"""
+        insert = audit._insert
+
+        def locked(rows):
+            raise sqlite3.OperationalError('database is locked')
+
+        monkeypatch.setattr(audit, '_insert', locked)
+        audit.record(1, 'first')
+        audit.record(1, 'second')
+        audit.flush()
+        assert logged_actions() == []
+        assert audit.stats()['spill_pending']
+
+        monkeypatch.setattr(audit, '_insert', insert)
+        audit.record(1, 'third')
+        audit.flush()
+
+        assert logged_actions() == ['first', 'second', 'third']
+        stats = audit.stats()
+        assert stats['spilled'] == 2
+        assert stats['replayed'] == 2
+        assert not stats['spill_pending']
+
+    def test_permanent_errors_are_not_spilled(self, audit):
+        """Errors other than busy/locked are logged and dropped instead of retried forever"""
+        with get_db_connection() as conn:
+            conn.execute('DROP TABLE activity_logs')
+            conn.commit()
+        audit.record(1, 'login')
+        audit.flush()
+
+        stats = audit.stats()
+        assert stats['failed'] == 1
+        assert stats['spilled'] == 0
+        assert not stats['spill_pending']
+
+    def test_torn_spill_line_is_quarantined(self, audit, tmp_path):
+        """A half-written spill line is moved aside and the rest of the spill is still replayed"""
+        spill = tmp_path / 'spill.jsonl'
+        spill.write_text('[1, "spilled", null, null, null, null, null, "2024-01-01 00:00:00"]\n'
+                         '[1, "torn", null, nu', encoding='utf-8')
+        audit.record(1, 'after_crash')
+        audit.flush()
+
+        assert logged_actions() == ['spilled', 'after_crash']
+        assert (tmp_path / 'spill.jsonl.corrupt').read_text(encoding='utf-8') == '[1, "torn", null, nu\n'
+        stats = audit.stats()
+        assert stats['corrupt'] == 1
+        assert stats['replayed'] == 1
+        assert not stats['spill_pending']
+
+    def test_unexpected_errors_drop_the_batch(self, audit, monkeypatch):
+        """Errors other than a busy database are counted as failed and never handed back for retry"""
+        def broken(rows):
+            raise sqlite3.InterfaceError('Error binding parameter 4: type dict is not supported')
+
+        monkeypatch.setattr(audit, '_insert', broken)
+        audit.record(1, 'login')
+        assert audit.flush() == 1
+
+        stats = audit.stats()
+        assert stats['failed'] == 1
+        assert stats['queue_depth'] == 0
+        assert not stats['spill_pending']
+
+    def test_invalid_event_does_not_sink_batch(self, audit):
+        """An event violating a constraint is skipped and the rest of the batch is kept"""
+        audit.record(1, 'login')
+        audit.record(None, 'failed_login')
+        audit.record(1, 'logout')
+        audit.flush()
+
+        assert logged_actions() == ['login', 'logout']
+        assert audit.stats()['invalid'] == 1
@@ -0,0 +1,124 @@
+import sqlite3
+import pytest
+from app.utils.batching import BatchWriter, CounterAggregator
+
+class TestBatchWriter:
+    def test_flush_writes_in_batches(self):
+        """Buffered items are handed to the flush function in batch_size chunks"""
+        batches = []
+        writer = BatchWriter('test', batches.append, batch_size=3, flush_interval=60)
+        writer.start()
+        try:
+            for i in range(7):
+                assert writer.submit(i)
+            writer.flush()
+        finally:
+            writer.stop()
+
+        assert [item for batch in batches for item in batch] == list(range(7))
+        assert all(len(batch) <= 3 for batch in batches)
+        assert writer.stats()['flushed'] == 7
+
+    def test_reject_policy_applies_backpressure(self):
+        """A full buffer refuses new items under the reject policy"""
+        writer = BatchWriter('test', lambda batch: None, capacity=2, batch_size=10,
+                             flush_interval=60, overflow='reject')
+
+        assert writer.submit(1)
+        assert writer.submit(2)
+        assert not writer.submit(3)
+        assert writer.stats()['dropped'] == 1
+        assert list(writer._buffer) == [1, 2]
+        writer.stop()
+
+    def test_drop_oldest_policy_keeps_newest(self):
+        """A full buffer evicts the oldest item under the drop_oldest policy"""
+        writer = BatchWriter('test', lambda batch: None, capacity=2, batch_size=10,
+                             flush_interval=60, overflow='drop_oldest')
+
+        for i in range(4):
+            assert writer.submit(i)
+        assert list(writer._buffer) == [2, 3]
+        assert writer.stats()['dropped'] == 2
+        writer.stop()
+
+    def test_failed_flush_requeues_batch(self):
+        """A batch that cannot be written because the database is locked is put back for the next flush"""
+        attempts = []
+
+        def failing(batch):
+            attempts.append(batch)
+            raise sqlite3.OperationalError('database is locked')
+
+        writer = BatchWriter('test', failing, batch_size=10, flush_interval=60, max_retries=1)
+        writer.submit('a')
+        writer.submit('b')
+
+        assert writer.flush() == 0
+        assert len(attempts) == 2
+        assert list(writer._buffer) == ['a', 'b']
+        assert writer.stats()['failed_flushes'] == 2
+        writer.flush_func = lambda batch: None
+        writer.stop()
+
+    def test_bad_items_are_dropped_not_requeued(self):
+        """An item that can never be written is rejected on its own and the rest of its batch is kept"""
+        written = []
+
+        def write(batch):
+            if any(isinstance(item, dict) for item in batch):
+                raise sqlite3.InterfaceError("Error binding parameter 0: type 'dict' is not supported")
+            written.extend(batch)
+
+        writer = BatchWriter('test', write, batch_size=10, flush_interval=60)
+        for item in ('a', {'x': 1}, 'b'):
+            writer.submit(item)
+        writer.flush()
+        writer.submit('c')
+        writer.flush()
+
+        assert written == ['a', 'b', 'c']
+        stats = writer.stats()
+        assert stats['rejected'] == 1
+        assert stats['flushed'] == 3
+        assert stats['queue_depth'] == 0
+        writer.stop()
+
+    def test_unknown_overflow_policy(self):
+        """Only the documented overflow policies are accepted"""
+        with pytest.raises(ValueError):
+            BatchWriter('test', lambda batch: None, overflow='block')
+
+class TestCounterAggregator:
+    def test_increments_are_aggregated_per_key(self):
+        """Repeated increments reach the flush function as one delta per key"""
+        batches = []
+        counter = CounterAggregator('test', batches.append, flush_interval=60)
+        for news_id in [1, 2, 1, 1]:
+            counter.increment(news_id)
+        assert counter.pending(1) == 3
+
+        counter.stop()
+        assert batches == [{1: 3, 2: 1}]
+        assert counter.stats()['flushed'] == 4
+        assert counter.pending(1) == 0
+
+    def test_failed_flush_keeps_counts(self):
+        """Deltas from a failed flush are merged back and written next time"""
+        batches = []
+        fail = [True]
+
+        def flush(batch):
+            if fail.pop():
+                raise RuntimeError('database is locked')
+            batches.append(batch)
+
+        counter = CounterAggregator('test', flush, flush_interval=60)
+        counter.increment(7, 2)
+        assert counter.flush() == 0
+        counter.increment(7)
+        fail.append(False)
+        counter.stop()
+
+        assert batches == [{7: 3}]
+        assert counter.stats()['failed_flushes'] == 1
@@ -0,0 +1,69 @@
+import io
+import os
+import pytest
+from app.database import configure_pool, get_db_connection, init_db
+from app.utils.blobstore import BlobStore, blob_path, digest_from_name
+
+@pytest.fixture
+def store(tmp_path):
+    configure_pool(str(tmp_path / 'blobs.db'))
+    init_db()
+    yield BlobStore(str(tmp_path / 'uploads'), chunk_size=4)
+    configure_pool()
+
+def upload(store, content):
+    temp_path, digest, size = store.write(io.BytesIO(content), suffix='.pdf')
+    with get_db_connection() as conn:
+        result = store.add(conn, temp_path, digest, size)
+        conn.commit()
+    return result
+
+def ref_count(digest):
+    with get_db_connection() as conn:
+        row = conn.execute('SELECT ref_count FROM blobs WHERE hash = ?', (digest,)).fetchone()
+    return row[0] if row else 0
+
+class TestBlobStore:
+    def test_identical_uploads_share_one_blob(self, store):
+        """The same content is stored once, named by its SHA-256, and referenced twice"""
+        path, digest, size, deduplicated = upload(store, b'syllabus')
+        assert not deduplicated
+        assert path == blob_path(digest)
+        assert size == 8
+        assert digest_from_name(f'{digest}.pdf') == digest
+
+        _, again, _, deduplicated = upload(store, b'syllabus')
+        assert again == digest
+        assert deduplicated
+        assert ref_count(digest) == 2
+        assert os.listdir(os.path.join(store.root, 'temp')) == []
+
+    def test_blob_deleted_with_last_reference(self, store):
+        """Deleting one of two uploads keeps the file; deleting the last removes it"""
+        path, digest, _, _ = upload(store, b'logo')
+        upload(store, b'logo')
+        full_path = os.path.join(store.root, path)
+
+        with get_db_connection() as conn:
+            assert not store.release(conn, digest)
+            conn.commit()
+        assert os.path.exists(full_path)
+
+        with get_db_connection() as conn:
+            assert store.release(conn, digest)
+            conn.commit()
+        assert store.collect(digest)
+        assert not os.path.exists(full_path)
+        assert ref_count(digest) == 0
+
+    def test_collect_keeps_reuploaded_blob(self, store):
+        """A blob uploaded again before collection is not deleted"""
+        path, digest, _, _ = upload(store, b'form')
+        with get_db_connection() as conn:
+            assert store.release(conn, digest)
+            conn.commit()
+        upload(store, b'form')
+
+        assert not store.collect(digest)
+        assert os.path.exists(os.path.join(store.root, path))
+        assert ref_count(digest) == 1
@@ -0,0 +1,104 @@
+import pytest
+from flask import Flask, jsonify
+from app import create_app
+from app.database import configure_pool, get_db_connection, init_db
+from app.routes.downloads import write_download_counts
+from app.utils.cache import (
+    MemoryCacheBackend, SqliteTagVersions, cached_response, configure_response_cache, get_response_cache,
+    invalidate_tags
+)
+
+@pytest.fixture
+def client():
+    """A bare app with one cached view whose payload can be changed."""
+    configure_response_cache()
+    app = Flask(__name__)
+    state = {'title': 'first', 'calls': 0}
+
+    @app.route('/items')
+    @cached_response('items')
+    def items():
+        state['calls'] += 1
+        return jsonify({'title': state['title']})
+
+    client = app.test_client()
+    client.state = state
+    return client
+
+@pytest.fixture
+def portal(tmp_path, monkeypatch):
+    """The full app on a throwaway database."""
+    monkeypatch.setenv('UPLOAD_FOLDER', str(tmp_path / 'uploads'))
+    monkeypatch.setenv('IMAGE_WORKERS', '0')
+    app = create_app('testing')
+    yield app.test_client()
+    configure_pool()
+
+class TestResponseCache:
+    def test_repeat_requests_hit_cache(self, client):
+        """Identical requests with reordered query args share one entry"""
+        first = client.get('/items?b=2&a=1')
+        second = client.get('/items?a=1&b=2')
+        assert first.headers['X-Cache'] == 'MISS'
+        assert second.headers['X-Cache'] == 'HIT'
+        assert second.get_json() == {'title': 'first'}
+        assert client.state['calls'] == 1
+
+    def test_conditional_requests(self, client):
+        """Matching ETag or Last-Modified validators get a 304 with no body"""
+        first = client.get('/items')
+        assert first.headers['Cache-Control'] == 'public, no-cache'
+
+        by_etag = client.get('/items', headers={'If-None-Match': first.headers['ETag']})
+        assert by_etag.status_code == 304
+        assert by_etag.data == b''
+        by_date = client.get('/items', headers={'If-Modified-Since': first.headers['Last-Modified']})
+        assert by_date.status_code == 304
+
+    def test_invalidation_by_tag(self, client):
+        """Invalidating a tag serves fresh content with a new ETag"""
+        first = client.get('/items')
+        client.state['title'] = 'second'
+        invalidate_tags('other')
+        assert client.get('/items').get_json() == {'title': 'first'}
+
+        invalidate_tags('items')
+        fresh = client.get('/items', headers={'If-None-Match': first.headers['ETag']})
+        assert fresh.status_code == 200
+        assert fresh.get_json() == {'title': 'second'}
+        assert get_response_cache().stats()['invalidations'] == 2
+
+    def test_download_counts_invalidate_file_listings(self, portal):
+        """Flushing buffered download counts drops cached responses tagged 'files'"""
+        with get_db_connection() as conn:
+            file_id = conn.execute('''
+                INSERT INTO files (filename, original_filename, file_path, file_type, file_size,
+                                   mime_type, file_hash, uploaded_by, is_public)
+                VALUES ('guide.pdf', 'guide.pdf', 'documents/guide.pdf', 'pdf', 10,
+                        'application/pdf', 'abc123', 1, 1)
+            ''').lastrowid
+            conn.commit()
+
+        assert portal.get('/api/downloads/stats').get_json()['data']['total_downloads'] == 0
+        assert portal.get('/api/downloads/stats').headers['X-Cache'] == 'HIT'
+
+        write_download_counts({file_id: 3})
+        response = portal.get('/api/downloads/stats')
+        assert response.headers['X-Cache'] == 'MISS'
+        assert response.get_json()['data']['total_downloads'] == 3
+
+    def test_shared_tag_versions_reach_every_worker(self, tmp_path):
+        """With tag versions in cache_tags, a bump in one process changes the keys of all of them"""
+        configure_pool(str(tmp_path / 'tags.db'))
+        try:
+            init_db()
+            worker_a = MemoryCacheBackend(tag_versions=SqliteTagVersions())
+            worker_b = MemoryCacheBackend(tag_versions=SqliteTagVersions())
+            assert worker_a.tag_versions(['files', 'faculties']) == [0, 0]
+
+            worker_b.bump_tags(['files'])
+            assert worker_a.tag_versions(['files', 'faculties']) == [1, 0]
+            worker_b.bump_tags(['files', 'faculties'])
+            assert worker_a.tag_versions(['faculties', 'files']) == [1, 2]
+        finally:
+            configure_pool()
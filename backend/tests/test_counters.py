@@ -0,0 +1,62 @@
+import pytest
+from app.database import configure_pool, get_db_connection, init_db
+from app.migrations import migrate
+from app.utils.counters import install_counters, verify_counters
+
+@pytest.fixture
+def conn(tmp_path):
+    configure_pool(str(tmp_path / 'counters.db'))
+    init_db()
+    with get_db_connection() as conn:
+        conn.execute('CREATE TABLE departments (id INTEGER PRIMARY KEY, faculty_id INTEGER, name TEXT)')
+        conn.execute('CREATE TABLE ai_events (id INTEGER PRIMARY KEY, max_participants INTEGER)')
+        conn.execute('CREATE TABLE ai_event_registrations (id INTEGER PRIMARY KEY, event_id INTEGER, user_id INTEGER)')
+        conn.execute('INSERT INTO departments (faculty_id, name) VALUES (1, ?)', ('Physics',))
+        conn.commit()
+        yield conn
+    configure_pool()
+
+class TestCounters:
+    def test_missing_tables_are_skipped(self, tmp_path):
+        """The migration installs nothing for tables this schema does not have"""
+        configure_pool(str(tmp_path / 'bare.db'))
+        try:
+            migrate()
+            with get_db_connection() as conn:
+                assert install_counters(conn) == []
+                assert verify_counters(conn) == []
+        finally:
+            configure_pool()
+
+    def test_triggers_follow_inserts_moves_and_deletes(self, conn):
+        """Installing recounts existing rows and triggers keep the count in step afterwards"""
+        installed = install_counters(conn)
+        assert installed == ['faculties.departments_count', 'ai_events.registration_count']
+        assert install_counters(conn) == []
+
+        counts = lambda: [row[0] for row in conn.execute('SELECT departments_count FROM faculties ORDER BY id')]
+        assert counts() == [1, 0, 0]  # sample data claimed 5 each
+
+        conn.executemany('INSERT INTO departments (faculty_id, name) VALUES (?, ?)', [(1, 'Maths'), (2, 'Law')])
+        assert counts() == [2, 1, 0]
+        conn.execute("UPDATE departments SET faculty_id = 3 WHERE name = 'Maths'")
+        assert counts() == [1, 1, 1]
+        conn.execute("DELETE FROM departments WHERE name = 'Law'")
+        assert counts() == [1, 0, 1]
+        conn.execute("UPDATE departments SET name = 'Applied Physics' WHERE name = 'Physics'")
+        assert counts() == [1, 0, 1]
+        assert all(result['drifted'] == 0 for result in verify_counters(conn))
+
+    def test_verify_and_repair(self, conn):
+        """Drift from writes that bypassed the triggers is reported, then repaired"""
+        install_counters(conn)
+        conn.execute('UPDATE faculties SET departments_count = 7 WHERE id = 1')
+
+        results = {result['counter']: result for result in verify_counters(conn)}
+        assert results['faculties.departments_count']['drifted'] == 1
+        assert results['faculties.departments_count']['examples'] == [(1, 7, 1)]
+        assert results['ai_events.registration_count']['drifted'] == 0
+
+        verify_counters(conn, repair=True)
+        assert conn.execute('SELECT departments_count FROM faculties WHERE id = 1').fetchone()[0] == 1
+        assert all(result['drifted'] == 0 for result in verify_counters(conn))
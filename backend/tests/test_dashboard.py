@@ -0,0 +1,51 @@
+import pytest
+from app.database import configure_pool, get_db_connection, init_db
+from app.utils.dashboard import get_dashboard_snapshot, read_dashboard_snapshot
+
+@pytest.fixture
+def database(tmp_path):
+    configure_pool(str(tmp_path / 'dashboard.db'))
+    init_db()
+    yield
+    configure_pool()
+
+def add_user(conn, username, active=1):
+    conn.execute('''
+        INSERT INTO users (username, email, password_hash, name, is_active)
+        VALUES (?, ?, 'x', ?, ?)
+    ''', (username, f'{username}@example.com', username, active))
+
+class TestDashboardSnapshot:
+    def test_counts_from_one_compound_query(self, database):
+        """Counters come from the schema's flag columns and tables that do not exist count as 0"""
+        with get_db_connection() as conn:
+            add_user(conn, 'ada')
+            add_user(conn, 'bob', active=0)
+            conn.execute("INSERT INTO uploads (filename, original_filename, file_path, file_size, file_type, "
+                         "uploaded_by, upload_type) VALUES ('a', 'a', 'a', 1500, 'image', 1, 'image')")
+            conn.commit()
+
+            stats = get_dashboard_snapshot(conn, max_age=60)
+
+        assert stats['users'] == {'total': 3, 'active': 2, 'new_today': 3}
+        assert stats['content']['faculties'] == 3
+        assert stats['content']['departments'] == 0
+        assert stats['uploads'] == {'total_files': 1, 'total_size': 1500}
+        assert 'startups' in stats['missing_tables']
+        assert {user['username'] for user in stats['recent_activity']['users']} == {'admin', 'ada', 'bob'}
+        assert stats['snapshot']['age_seconds'] < 5
+
+    def test_snapshot_is_reused_until_stale(self, database):
+        """Reads inside max_age serve the stored row; a stale or forced read recomputes it"""
+        with get_db_connection() as conn:
+            first = get_dashboard_snapshot(conn, max_age=60)
+            add_user(conn, 'carol')
+            conn.commit()
+
+            assert get_dashboard_snapshot(conn, max_age=60)['users']['total'] == first['users']['total']
+            assert get_dashboard_snapshot(conn, max_age=60, force=True)['users']['total'] == first['users']['total'] + 1
+
+            add_user(conn, 'dave')
+            conn.commit()
+            assert get_dashboard_snapshot(conn, max_age=0)['users']['total'] == first['users']['total'] + 2
+            assert read_dashboard_snapshot(conn)[0]['users']['total'] == first['users']['total'] + 2
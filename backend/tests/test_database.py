@@ -0,0 +1,116 @@
+import pytest
+import threading
+from app.database import ConnectionPool, PoolTimeoutError
+
+@pytest.fixture
+def pool(tmp_path):
+    """A small connection pool on a throwaway database."""
+    pool = ConnectionPool(str(tmp_path / 'pool.db'), size=2, timeout=0.2)
+    yield pool
+    pool.close()
+
+def committed_rows(pool):
+    """Count rows in t as another thread sees them"""
+    counts = []
+
+    def count():
+        with pool.acquire() as conn:
+            counts.append(conn.execute('SELECT COUNT(*) FROM t').fetchone()[0])
+
+    thread = threading.Thread(target=count)
+    thread.start()
+    thread.join()
+    return counts[0]
+
+class TestConnectionPool:
+    def test_wal_and_pragmas(self, pool):
+        """Connections are opened in WAL mode with the configured pragmas"""
+        with pool.acquire() as conn:
+            assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+            assert conn.execute('PRAGMA synchronous').fetchone()[0] == 1  # NORMAL
+            assert conn.execute('PRAGMA busy_timeout').fetchone()[0] == 5000
+
+    def test_connections_are_reused(self, pool):
+        """Released connections go back to the pool instead of being closed"""
+        conn = pool.acquire()
+        raw = conn._conn
+        conn.close()
+
+        with pool.acquire() as again:
+            assert again._conn is raw
+
+        stats = pool.stats()
+        assert stats['checkouts'] == 2
+        assert stats['connections_created'] == 1
+        assert stats['in_use'] == 0
+
+    def test_nested_checkout_shares_connection(self, pool):
+        """A nested checkout on the same thread joins the outer transaction; only the outer scope commits"""
+        with pool.acquire() as conn:
+            conn.execute('CREATE TABLE t (x INTEGER)')
+            conn.commit()
+
+        with pool.acquire() as outer:
+            outer.execute('INSERT INTO t VALUES (1)')
+            with pool.acquire() as inner:
+                assert inner is outer
+                inner.execute('INSERT INTO t VALUES (2)')
+                inner.commit()
+            assert pool.stats()['in_use'] == 1
+            assert committed_rows(pool) == 0
+            outer.commit()
+
+        assert committed_rows(pool) == 2
+
+    def test_failed_nested_block_keeps_outer_writes(self, pool):
+        """An exception in a nested block undoes only that block's writes"""
+        with pool.acquire() as conn:
+            conn.execute('CREATE TABLE t (x INTEGER)')
+            conn.commit()
+
+        with pool.acquire() as outer:
+            outer.execute('INSERT INTO t VALUES (1)')
+            with pytest.raises(ValueError):
+                with pool.acquire() as inner:
+                    inner.execute('INSERT INTO t VALUES (2)')
+                    raise ValueError('inner failure')
+            assert outer.in_transaction
+            outer.execute('INSERT INTO t VALUES (3)')
+            outer.commit()
+
+        with pool.acquire() as conn:
+            assert [row[0] for row in conn.execute('SELECT x FROM t ORDER BY x')] == [1, 3]
+
+    def test_uncommitted_work_is_rolled_back_on_release(self, pool):
+        """Returning a connection discards its open transaction"""
+        with pool.acquire() as conn:
+            conn.execute('CREATE TABLE t (x INTEGER)')
+            conn.commit()
+            conn.execute('INSERT INTO t VALUES (1)')
+
+        with pool.acquire() as conn:
+            assert conn.execute('SELECT COUNT(*) FROM t').fetchone()[0] == 0
+
+    def test_timeout_when_exhausted(self, pool):
+        """Checkouts beyond the pool size wait and then time out"""
+        held = []
+
+        def hold():
+            held.append(pool.acquire())
+
+        for _ in range(2):
+            thread = threading.Thread(target=hold)
+            thread.start()
+            thread.join()
+
+        with pytest.raises(PoolTimeoutError):
+            pool.acquire()
+
+        stats = pool.stats()
+        assert stats['waits'] == 1
+        assert stats['timeouts'] == 1
+
+    def test_invalid_synchronous_mode(self, tmp_path):
+        """Unknown synchronous modes are rejected before reaching a PRAGMA"""
+        with pytest.raises(ValueError):
+            ConnectionPool(str(tmp_path / 'x.db'), synchronous='NORMAL; DROP TABLE users')
@@ -0,0 +1,75 @@
+import pytest
+from flask import Flask
+from app.utils.file_serving import is_continuation, serve_file
+
+@pytest.fixture
+def client(tmp_path):
+    """A bare app serving one document and one immutable image from a temp upload folder."""
+    (tmp_path / 'documents').mkdir()
+    (tmp_path / 'documents' / 'guide.pdf').write_bytes(bytes(range(256)) * 4)
+    (tmp_path / 'images').mkdir()
+    (tmp_path / 'images' / 'a1b2.png').write_bytes(b'png-bytes')
+    app = Flask(__name__)
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    served = []
+
+    @app.route('/files/<path:name>')
+    def files(name):
+        response = serve_file(str(tmp_path), name, etag='abc123', download_name='دليل.pdf',
+                              as_attachment=True)
+        served.append(not is_continuation(response))
+        return response
+
+    @app.route('/images/<name>')
+    def images(name):
+        return serve_file(str(tmp_path), f'images/{name}', immutable=True)
+
+    client = app.test_client()
+    client.app = app
+    client.served = served
+    return client
+
+class TestServeFile:
+    def test_strong_etag_and_conditional_get(self, client):
+        """The stored hash is the ETag and matching validators get a 304"""
+        first = client.get('/files/documents/guide.pdf')
+        assert first.status_code == 200
+        assert first.headers['ETag'] == '"abc123"'
+        assert first.headers['Cache-Control'] == 'public, no-cache'
+        assert "filename*=UTF-8''" in first.headers['Content-Disposition']
+
+        again = client.get('/files/documents/guide.pdf', headers={'If-None-Match': '"abc123"'})
+        assert again.status_code == 304
+        assert client.served == [True, False]
+
+    def test_range_requests(self, client):
+        """Byte ranges get 206 partial content; only the first range counts as a download"""
+        head = client.get('/files/documents/guide.pdf', headers={'Range': 'bytes=0-99'})
+        assert head.status_code == 206
+        assert head.headers['Content-Range'] == 'bytes 0-99/1024'
+        assert len(head.data) == 100
+
+        tail = client.get('/files/documents/guide.pdf', headers={'Range': 'bytes=1000-'})
+        assert tail.status_code == 206
+        assert tail.data == (bytes(range(256)) * 4)[1000:]
+        assert client.served == [True, False]
+
+    def test_immutable_names_and_traversal(self, client):
+        """Unique upload names are cached for a year and paths cannot escape the root"""
+        response = client.get('/images/a1b2.png')
+        assert response.headers['Cache-Control'] == 'public, max-age=31536000, immutable'
+        assert 'Expires' not in response.headers
+        assert client.get('/files/../secret').status_code == 404
+        assert client.get('/images/missing.png').status_code == 404
+
+    def test_x_accel_offload(self, client):
+        """With offload enabled the app sends headers only and the proxy sends the bytes"""
+        client.app.config['FILE_SERVE_OFFLOAD'] = 'x-accel'
+        response = client.get('/files/documents/guide.pdf')
+        assert response.headers['X-Accel-Redirect'] == '/protected-uploads/documents/guide.pdf'
+        assert response.data == b''
+        assert response.mimetype == 'application/pdf'
+
+        cached = client.get('/files/documents/guide.pdf', headers={'If-None-Match': '"abc123"'})
+        assert cached.status_code == 304
+        assert 'X-Accel-Redirect' not in cached.headers
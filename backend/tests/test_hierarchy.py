@@ -0,0 +1,86 @@
+import pytest
+from app import create_app
+from app.database import configure_pool, get_db_connection, init_db
+from app.utils.hierarchy import HierarchyIndex, closure_join, get_hierarchy, refresh_hierarchy
+
+@pytest.fixture
+def tree():
+    """Two colleges; departments 10 and 11 under faculty 1, department 12 under faculty 2."""
+    return HierarchyIndex(
+        colleges=[1, 2],
+        faculties={1: 1, 2: 1, 3: 2},
+        departments={10: 1, 11: 1, 12: 2}
+    )
+
+class TestHierarchyIndex:
+    def test_ancestry_and_scope_checks(self, tree):
+        """Nodes know every ancestor, so scope checks are single lookups"""
+        assert tree.ancestry('department', 12) == {'department': 12, 'faculty': 2, 'college': 1}
+        assert tree.is_under('department', 10, 'college', 1)
+        assert tree.is_under('faculty', 3, 'faculty', 3)
+        assert not tree.is_under('department', 12, 'faculty', 1)
+        assert tree.ancestry('department', 99) is None
+
+    def test_descendants_by_level(self, tree):
+        """Descendant sets are grouped by level"""
+        assert tree.descendant_ids('college', 1, 'faculty') == {1, 2}
+        assert tree.descendant_ids('college', 1, 'department') == {10, 11, 12}
+        assert tree.descendant_ids('faculty', 3, 'department') == set()
+
+    def test_closure_table_matches_index(self, tmp_path):
+        """The SQLite closure table supports scoped filtering with one join"""
+        configure_pool(str(tmp_path / 'hierarchy.db'))
+        try:
+            init_db()
+            with get_db_connection() as conn:
+                college_id = conn.execute('INSERT INTO colleges (name) VALUES (?)', ('Second',)).lastrowid
+                faculty_id = conn.execute(
+                    'INSERT INTO faculties (college_id, name) VALUES (?, ?)', (college_id, 'Medicine')
+                ).lastrowid
+                refresh_hierarchy(conn)
+                conn.commit()
+
+                assert get_hierarchy().is_under('faculty', faculty_id, 'college', college_id)
+                scoped = conn.execute(
+                    'SELECT f.id FROM faculties f ' + closure_join('f.id', 'faculty'),
+                    ('college', college_id)
+                ).fetchall()
+                assert [row[0] for row in scoped] == [faculty_id]
+                depth = conn.execute('''
+                    SELECT depth FROM org_closure
+                    WHERE ancestor_type = 'college' AND descendant_type = 'faculty' AND descendant_id = ?
+                ''', (faculty_id,)).fetchone()[0]
+                assert depth == 1
+        finally:
+            configure_pool()
+
+    def test_file_listing_is_scoped_through_closure(self, tmp_path, monkeypatch):
+        """The public file list scopes by faculty or college with one join on org_closure"""
+        monkeypatch.setenv('UPLOAD_FOLDER', str(tmp_path / 'uploads'))
+        monkeypatch.setenv('IMAGE_WORKERS', '0')
+        client = create_app('testing').test_client()
+        try:
+            with get_db_connection() as conn:
+                college_id = conn.execute('INSERT INTO colleges (name) VALUES (?)', ('Second',)).lastrowid
+                medicine = conn.execute(
+                    'INSERT INTO faculties (college_id, name) VALUES (?, ?)', (college_id, 'Medicine')
+                ).lastrowid
+                for name, faculty_id in (('a.pdf', 1), ('b.pdf', 2), ('c.pdf', medicine)):
+                    conn.execute('''
+                        INSERT INTO files (filename, original_filename, file_path, file_type, file_size,
+                                           mime_type, file_hash, uploaded_by, faculty_id, is_public)
+                        VALUES (?, ?, ?, 'pdf', 1, 'application/pdf', 'x', 1, ?, 1)
+                    ''', (name, name, name, faculty_id))
+                refresh_hierarchy(conn)
+                conn.commit()
+
+            def listed(query):
+                data = client.get(f'/api/downloads/files?{query}').get_json()['data']
+                return sorted(file['filename'] for file in data)
+
+            assert listed('faculty_id=2') == ['b.pdf']
+            assert listed('college_id=1') == ['a.pdf', 'b.pdf']
+            assert listed(f'college_id={college_id}') == ['c.pdf']
+            assert listed('') == ['a.pdf', 'b.pdf', 'c.pdf']
+        finally:
+            configure_pool()
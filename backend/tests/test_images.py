@@ -0,0 +1,119 @@
+import json
+import os
+import pytest
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from PIL import Image
+from app.database import configure_pool, get_db_connection, init_db
+from app.utils.images import ImageProcessor, build_srcset, render_variants
+
+@pytest.fixture
+def photo(tmp_path):
+    path = tmp_path / 'photo.jpg'
+    Image.new('RGB', (2400, 1600), (200, 30, 30)).save(path, 'JPEG')
+    return str(path)
+
+class TestRenderVariants:
+    def test_widths_formats_and_srcset(self, photo, tmp_path):
+        """Each width is written in every format and listed in a srcset, never upscaled"""
+        out_dir = str(tmp_path / 'out')
+        manifest = render_variants(photo, out_dir, widths=(320, 640, 4000), square_sizes=(150,),
+                                   formats=('webp', 'jpeg'))
+
+        widths = sorted({v['width'] for v in manifest['variants'] if v['crop'] == 'width'})
+        assert widths == [320, 640, 2400]
+        assert manifest['src'] == 'w2400.jpg'
+        thumb = [v for v in manifest['variants'] if v['crop'] == 'square']
+        assert {(v['width'], v['height']) for v in thumb} == {(150, 150)}
+        with Image.open(os.path.join(out_dir, 'w320.webp')) as img:
+            assert img.size == (320, 213)
+
+        srcset = build_srcset(manifest, '/v')
+        assert srcset['webp'] == '/v/w320.webp 320w, /v/w640.webp 640w, /v/w2400.webp 2400w'
+        assert set(srcset) == {'webp', 'jpeg'}
+
+    def test_manifest_reused_for_same_spec(self, photo, tmp_path):
+        """A second render of the same content and spec reuses the manifest"""
+        out_dir = str(tmp_path / 'out')
+        first = render_variants(photo, out_dir, widths=(320,), formats=('jpeg',))
+        os.remove(photo)
+        assert render_variants(photo, out_dir, widths=(320,), formats=('jpeg',)) == first
+
+def add_upload(digest, upload_type='image'):
+    with get_db_connection() as conn:
+        upload_id = conn.execute('''
+            INSERT INTO uploads (filename, original_filename, file_path, file_size, file_type,
+                                 uploaded_by, upload_type, file_hash, processing_status)
+            VALUES (?, 'me.jpg', 'blobs/x', 1, 'image', 1, ?, ?, 'pending')
+        ''', (f'{digest}.jpg', upload_type, digest)).lastrowid
+        conn.commit()
+    return upload_id
+
+def processing_status(upload_id):
+    with get_db_connection() as conn:
+        return conn.execute('SELECT processing_status FROM uploads WHERE id = ?', (upload_id,)).fetchone()[0]
+
+class TestImageProcessor:
+    def test_broken_pool_is_replaced(self, photo, tmp_path):
+        """A pool whose worker died is replaced, and a job that cannot be queued is marked failed"""
+        class BrokenPool:
+            def submit(self, func, *args, **kwargs):
+                raise BrokenProcessPool('A child process terminated abruptly')
+
+        class WorkingPool:
+            def submit(self, func, *args, **kwargs):
+                self.future = Future()
+                return self.future
+
+        configure_pool(str(tmp_path / 'images.db'))
+        try:
+            init_db()
+            processor = ImageProcessor(workers=1, formats=('jpeg',))
+            working = WorkingPool()
+            pools = [BrokenPool(), working]
+            processor._get_executor = lambda: pools.pop(0)
+
+            first = add_upload('ab' * 32)
+            assert processor.submit(first, str(tmp_path), 'ab' * 32, photo) == 'pending'
+            assert processor.stats()['pending'] == 1
+            working.future.set_exception(BrokenProcessPool('A child process terminated abruptly'))
+            assert processing_status(first) == 'failed'
+
+            pools = [BrokenPool(), BrokenPool()]
+            second = add_upload('cd' * 32)
+            assert processor.submit(second, str(tmp_path), 'cd' * 32, photo) == 'failed'
+            assert processing_status(second) == 'failed'
+            stats = processor.stats()
+            assert stats['pending'] == 0
+            assert stats['failed'] == 2
+        finally:
+            configure_pool()
+
+    def test_inline_processing_records_manifest(self, photo, tmp_path):
+        """Finished jobs mark the upload ready and point avatars at the cropped variant"""
+        configure_pool(str(tmp_path / 'images.db'))
+        try:
+            init_db()
+            digest = 'ab' * 32
+            with get_db_connection() as conn:
+                upload_id = conn.execute('''
+                    INSERT INTO uploads (filename, original_filename, file_path, file_size, file_type,
+                                         uploaded_by, upload_type, file_hash, processing_status)
+                    VALUES (?, 'me.jpg', 'blobs/x', 1, 'image', 1, 'avatar', ?, 'pending')
+                ''', (f'{digest}.jpg', digest)).lastrowid
+                conn.execute('UPDATE users SET avatar_url = ? WHERE id = 1', (f'/api/uploads/avatars/{digest}.jpg',))
+                conn.commit()
+
+            processor = ImageProcessor(workers=0, avatar_sizes=(150, 300), formats=('webp', 'jpeg'))
+            assert processor.submit(upload_id, str(tmp_path), digest, photo, 'avatar') == 'ready'
+
+            with get_db_connection() as conn:
+                upload = conn.execute('SELECT processing_status, variants FROM uploads WHERE id = ?',
+                                      (upload_id,)).fetchone()
+                avatar_url = conn.execute('SELECT avatar_url FROM users WHERE id = 1').fetchone()[0]
+            assert upload['processing_status'] == 'ready'
+            assert json.loads(upload['variants'])['src'] == 'sq300.jpg'
+            assert avatar_url == f'/api/uploads/variants/{digest}/sq300.jpg'
+            assert processor.stats()['completed'] == 1
+        finally:
+            configure_pool()
@@ -0,0 +1,49 @@
+import importlib.util
+import os
+import time
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts', 'load_test.py')
+spec = importlib.util.spec_from_file_location('load_test', SCRIPT)
+load_test = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(load_test)
+
+class FakeClient:
+    def request(self, method, path, body, headers):
+        time.sleep(0.001)
+        return 500 if path == '/broken' else 200
+
+    def close(self):
+        pass
+
+def report(**results):
+    return {'results': {'inprocess': results}}
+
+class TestLoadTest:
+    def test_scenario_summary(self):
+        """Latencies, throughput and server errors are summarised per scenario"""
+        paths = iter(['/ok', '/broken'] * 10000)
+        result = load_test.run_scenario(
+            FakeClient, lambda rng: ('GET', next(paths), None, {}), concurrency=2, duration=0.2, warmup=0, seed_value=1
+        )
+
+        assert result['requests'] > 0
+        assert result['throughput_rps'] > 0
+        assert set(result['status']) == {'200', '500'}
+        assert 0.3 < result['error_rate'] < 0.7
+        assert 1.0 <= result['p50_ms'] <= result['p99_ms'] <= result['max_ms']
+
+    def test_compare_flags_regressions(self):
+        """Slower p99 or lower throughput beyond the threshold is a regression; noise is not"""
+        base = {'p50_ms': 10.0, 'p99_ms': 20.0, 'throughput_rps': 100.0, 'error_rate': 0.0}
+        rows = load_test.compare(
+            report(steady=base, slower=base, unknown=base),
+            report(steady=dict(base, p99_ms=22.0), slower=dict(base, p99_ms=40.0, throughput_rps=50.0),
+                   new=base),
+            threshold=0.2
+        )
+
+        by_name = {row['scenario']: row for row in rows}
+        assert set(by_name) == {'steady', 'slower'}
+        assert by_name['steady']['regressions'] == []
+        assert by_name['slower']['regressions'] == ['p99_ms', 'throughput_rps']
+        assert by_name['slower']['p99_ms']['change'] == 1.0
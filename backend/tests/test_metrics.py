@@ -0,0 +1,76 @@
+import threading
+import pytest
+from app import create_app
+from app.utils.metrics import PrometheusText, RequestMetrics
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('UPLOAD_FOLDER', str(tmp_path / 'uploads'))
+    monkeypatch.setenv('IMAGE_WORKERS', '0')
+    monkeypatch.setenv('METRICS_TOKEN', 'scrape-secret')
+    app = create_app('testing')
+    yield app.test_client()
+
+class TestRequestMetrics:
+    def test_buckets_and_retired_threads(self):
+        """Observations land in the right bucket and survive the thread that recorded them"""
+        metrics = RequestMetrics(buckets=(0.1, 1.0))
+        metrics.observe(('GET', 200), metrics.start())
+
+        worker = threading.Thread(target=lambda: metrics.observe(('GET', 200), metrics.start() - 0.5))
+        worker.start()
+        worker.join()
+        metrics.observe(('GET', 500), metrics.start() - 2.0)
+
+        snapshot = metrics.snapshot()
+        assert snapshot[('GET', 200)]['buckets'] == [(0.1, 1), (1.0, 2), ('+Inf', 2)]
+        assert snapshot[('GET', 200)]['count'] == 2
+        assert snapshot[('GET', 500)]['buckets'] == [(0.1, 0), (1.0, 0), ('+Inf', 1)]
+        assert metrics.snapshot() == snapshot
+        assert metrics.in_flight() == 0
+
+    def test_in_flight(self):
+        """Started but unfinished requests are reported as in flight"""
+        metrics = RequestMetrics()
+        started = metrics.start()
+        metrics.start()
+        metrics.observe(('GET',), started)
+        assert metrics.in_flight() == 1
+
+class TestPrometheusText:
+    def test_exposition_format(self):
+        """Families get HELP and TYPE lines and label values are escaped"""
+        metrics = RequestMetrics(buckets=(0.5,))
+        metrics.observe('x', metrics.start())
+        exposition = PrometheusText('portal')
+        exposition.metric('cache_entries', 'gauge', 'Entries held',
+                          [({'cache': 'a"b\\c'}, 3), ({'cache': 'skipped'}, None)])
+        exposition.histogram('latency_seconds', 'Latency', [({'route': '/x'}, metrics.snapshot()['x'])])
+
+        lines = exposition.render().splitlines()
+        assert lines[:3] == [
+            '# HELP portal_cache_entries Entries held',
+            '# TYPE portal_cache_entries gauge',
+            'portal_cache_entries{cache="a\\"b\\\\c"} 3'
+        ]
+        assert '# TYPE portal_latency_seconds histogram' in lines
+        assert 'portal_latency_seconds_bucket{route="/x",le="0.5"} 1' in lines
+        assert 'portal_latency_seconds_bucket{route="/x",le="+Inf"} 1' in lines
+        assert 'portal_latency_seconds_count{route="/x"} 1' in lines
+
+class TestMetricsEndpoint:
+    def test_scrape(self, client):
+        """Requests are counted per route and status, and scraping needs the token when one is set"""
+        client.get('/api/downloads/files')
+        assert client.get('/metrics').status_code == 401
+
+        response = client.get('/metrics', headers={'Authorization': 'Bearer scrape-secret'})
+        assert response.status_code == 200
+        assert response.content_type == PrometheusText.CONTENT_TYPE
+        body = response.get_data(as_text=True)
+        assert ('portal_http_requests_total{blueprint="downloads",route="/api/downloads/files",'
+                'method="GET",status="200"}') in body
+        assert '# TYPE portal_http_request_duration_seconds histogram' in body
+        assert 'portal_db_pool_checkouts_total' in body
+        assert 'portal_write_behind_queue_depth{queue="audit-log"}' in body
@@ -0,0 +1,74 @@
+import pytest
+from app.database import configure_pool, get_db_connection
+from app.migrations import MIGRATIONS, check_schema, latest_version, migrate
+
+@pytest.fixture
+def database(tmp_path):
+    configure_pool(str(tmp_path / 'migrations.db'))
+    yield
+    configure_pool()
+
+class TestMigrations:
+    def test_fresh_database_is_migrated_once(self, database):
+        """A new database gets every step applied, and a second run is a no-op"""
+        assert check_schema() == [(number, name) for number, name, _ in MIGRATIONS]
+
+        assert migrate() == [(number, name) for number, name, _ in MIGRATIONS]
+        assert migrate() == []
+        assert check_schema() == []
+
+        with get_db_connection() as conn:
+            assert conn.execute('SELECT MAX(version) FROM schema_version').fetchone()[0] == latest_version()
+            assert conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'users'").fetchone()
+
+    def test_target_stops_early(self, database, monkeypatch):
+        """Steps past the target version are left pending"""
+        applied = []
+        latest = latest_version()
+        steps = MIGRATIONS + [(latest + 1, 'extra', lambda conn: applied.append(True))]
+        monkeypatch.setattr('app.migrations.MIGRATIONS', steps)
+
+        migrate(target=latest)
+        assert check_schema() == [(latest + 1, 'extra')]
+
+        migrate()
+        assert applied == [True]
+        assert check_schema() == []
+
+    def test_failed_step_is_rolled_back(self, database, monkeypatch):
+        """A step that raises leaves no partial changes and stays pending"""
+        def broken(conn):
+            conn.execute('CREATE TABLE half_done (id INTEGER)')
+            raise RuntimeError('boom')
+
+        latest = latest_version()
+        monkeypatch.setattr('app.migrations.MIGRATIONS', MIGRATIONS + [(latest + 1, 'broken', broken)])
+        with pytest.raises(RuntimeError):
+            migrate()
+
+        assert check_schema() == [(latest + 1, 'broken')]
+        with get_db_connection() as conn:
+            assert conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'half_done'").fetchone() is None
+
+class TestCommands:
+    def test_status_and_migrate(self, tmp_path, monkeypatch):
+        """`flask db status` lists pending steps and `flask db migrate` applies them"""
+        from app import create_app
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setenv('AUTO_MIGRATE', 'false')
+        app = create_app('testing')
+        runner = app.test_cli_runner()
+
+        try:
+            result = runner.invoke(args=['db', 'status'])
+            assert 'Schema version 0' in result.output
+            assert 'Pending 0001 baseline' in result.output
+
+            result = runner.invoke(args=['db', 'migrate'])
+            assert 'Applied 0001 baseline' in result.output
+
+            result = runner.invoke(args=['db', 'status'])
+            assert f'Schema version {latest_version()}' in result.output
+            assert 'Pending' not in result.output
+        finally:
+            configure_pool()
@@ -0,0 +1,76 @@
+import pytest
+from flask import Flask
+from app.database import configure_pool, get_db_connection, init_db
+from app.utils.pagination import (
+    InvalidCursorError, count_cache, decode_cursor, encode_cursor, get_page_args, paginate
+)
+
+@pytest.fixture
+def conn(tmp_path):
+    """A fresh database with 25 users sharing a handful of timestamps."""
+    configure_pool(str(tmp_path / 'pagination.db'))
+    init_db()
+    with get_db_connection() as conn:
+        conn.execute('DELETE FROM users')
+        for i in range(25):
+            conn.execute(
+                'INSERT INTO users (username, email, password_hash, name, created_at) VALUES (?, ?, ?, ?, ?)',
+                (f'user{i}', f'user{i}@example.com', 'x', f'User {i}', f'2024-01-0{i % 5 + 1} 00:00:00')
+            )
+        conn.commit()
+        yield conn
+    configure_pool()
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['PAGINATION_ESTIMATE_LIMIT'] = 10
+    return app
+
+def list_users(app, conn, query_string):
+    with app.test_request_context('/', query_string=query_string):
+        return paginate(
+            conn, 'SELECT * FROM users WHERE 1=1', 'SELECT COUNT(*) FROM users WHERE 1=1',
+            [], get_page_args()
+        )
+
+class TestPagination:
+    def test_cursor_roundtrip(self):
+        """Cursors are opaque and reject tampered input"""
+        assert decode_cursor(encode_cursor('2024-01-01 00:00:00', 7)) == ('2024-01-01 00:00:00', 7)
+        with pytest.raises(InvalidCursorError):
+            decode_cursor('not-a-cursor')
+
+    def test_cursor_pages_cover_every_row_once(self, app, conn):
+        """Walking next_cursor visits each row exactly once despite tied timestamps"""
+        seen = []
+        after = ''
+        while True:
+            rows, meta = list_users(app, conn, {'after': after, 'per_page': 10, 'total': 'none'})
+            seen.extend(row['id'] for row in rows)
+            if not meta['has_more']:
+                break
+            after = meta['next_cursor']
+        assert len(seen) == len(set(seen)) == 25
+
+    def test_offset_mode_matches_cursor_order(self, app, conn):
+        """Page mode keeps its old response fields and the same ordering"""
+        rows, meta = list_users(app, conn, {'page': 2, 'per_page': 10})
+        assert (meta['total'], meta['page'], meta['pages']) == (25, 2, 3)
+
+        _, first = list_users(app, conn, {'after': '', 'per_page': 10})
+        cursor_rows, _ = list_users(app, conn, {'after': first['next_cursor'], 'per_page': 10})
+        assert [row['id'] for row in rows] == [row['id'] for row in cursor_rows]
+
+    def test_estimated_and_cached_totals(self, app, conn):
+        """Estimates stop counting at the configured limit; cached counts are reused"""
+        _, meta = list_users(app, conn, {'after': ''})
+        assert meta['total'] == 10
+        assert meta['total_is_estimate'] is True
+
+        count_cache.clear()
+        _, meta = list_users(app, conn, {'total': 'cached'})
+        assert meta['total'] == 25
+        conn.execute('DELETE FROM users WHERE id = (SELECT MIN(id) FROM users)')
+        _, meta = list_users(app, conn, {'total': 'cached'})
+        assert meta['total'] == 25
@@ -0,0 +1,86 @@
+from concurrent.futures import Future
+import pytest
+from werkzeug.security import generate_password_hash
+from app.utils.metrics import Histogram
+from app.utils.passwords import PasswordHasher, PasswordHasherBusy, hash_rounds
+
+class TestPasswordHasher:
+    def test_hash_and_verify_in_pool(self):
+        """Hashes are computed in worker processes and timed"""
+        hasher = PasswordHasher(workers=1, rounds=4)
+        try:
+            hashed = hasher.hash('Secret123!')
+            assert hash_rounds(hashed) == 4
+            assert hasher.verify('Secret123!', hashed)
+            assert not hasher.verify('wrong', hashed)
+        finally:
+            hasher.shutdown()
+        assert hasher.stats()['latency']['verify']['count'] == 2
+
+    def test_rehash_when_cost_changes(self):
+        """A valid login with an outdated cost factor yields an upgraded hash"""
+        old = PasswordHasher(workers=0, rounds=4).hash('Secret123!')
+        hasher = PasswordHasher(workers=0, rounds=5)
+
+        valid, new_hash = hasher.verify_and_update('Secret123!', old)
+        assert valid and hash_rounds(new_hash) == 5
+        assert hasher.verify_and_update('Secret123!', new_hash) == (True, None)
+        assert hasher.verify_and_update('wrong', old) == (False, None)
+
+    def test_legacy_hashes_are_upgraded(self):
+        """Werkzeug hashes from older admin-created users still log in and move to bcrypt"""
+        hasher = PasswordHasher(workers=0, rounds=4)
+        valid, new_hash = hasher.verify_and_update('Secret123!', generate_password_hash('Secret123!'))
+        assert valid and hash_rounds(new_hash) == 4
+
+    def test_saturated_pool_sheds_load(self):
+        """Calls beyond the pending limit fail fast instead of queueing"""
+        hasher = PasswordHasher(workers=0, max_pending=0, rounds=4)
+        with pytest.raises(PasswordHasherBusy):
+            hasher.hash('Secret123!')
+        assert hasher.stats()['shed'] == 1
+
+    def test_timed_out_jobs_keep_their_slot(self):
+        """A job the caller gave up on still counts as pending until it finishes or is dropped from the queue"""
+        class StubPool:
+            started = False
+
+            def submit(self, func, *args):
+                self.future = Future()
+                if self.started:
+                    self.future.set_running_or_notify_cancel()
+                return self.future
+
+        pool = StubPool()
+        hasher = PasswordHasher(workers=1, max_pending=1, rounds=4, timeout=0.01)
+        hasher._get_executor = lambda: pool
+
+        # Still queued: cancelled on timeout, which frees the slot
+        with pytest.raises(PasswordHasherBusy, match='timed out'):
+            hasher.hash('Secret123!')
+        assert pool.future.cancelled()
+        assert hasher.stats()['pending'] == 0
+
+        # Already running: holds the slot until it finishes
+        pool.started = True
+        with pytest.raises(PasswordHasherBusy, match='timed out'):
+            hasher.hash('Secret123!')
+        assert hasher.stats()['pending'] == 1
+        with pytest.raises(PasswordHasherBusy, match='queue is full'):
+            hasher.hash('Secret123!')
+
+        pool.future.set_result('done')
+        assert hasher.stats()['pending'] == 0
+        assert hasher.stats()['shed'] == 3
+
+class TestHistogram:
+    def test_buckets_and_quantiles(self):
+        """Observations land in cumulative buckets; quantiles use bucket bounds"""
+        histogram = Histogram(buckets=(0.1, 0.5, 1.0))
+        for value in [0.05, 0.2, 0.3, 0.7, 3.0]:
+            histogram.observe(value)
+
+        snapshot = histogram.snapshot()
+        assert snapshot['buckets'] == [(0.1, 1), (0.5, 3), (1.0, 4), ('+Inf', 5)]
+        assert snapshot['count'] == 5
+        assert histogram.quantile(0.5) == 0.5
@@ -0,0 +1,86 @@
+import pytest
+from flask import Flask
+from app.database import configure_pool, get_db_connection, init_db
+from app.utils.permissions import (
+    can_manage_user, get_principal, has_permission, invalidate_principal, principal_cache
+)
+
+@pytest.fixture
+def users(tmp_path):
+    """A faculty admin and a lecturer in the same faculty, on a fresh database."""
+    configure_pool(str(tmp_path / 'permissions.db'))
+    init_db()
+    principal_cache.invalidate()
+    with get_db_connection() as conn:
+        faculty_id = conn.execute('SELECT id, college_id FROM faculties LIMIT 1').fetchone()
+        ids = []
+        for username, role in [('dean', 'faculty_admin'), ('lecturer', 'viewer')]:
+            cursor = conn.execute('''
+                INSERT INTO users (username, email, password_hash, name, role, faculty_id)
+                VALUES (?, ?, 'x', ?, ?, ?)
+            ''', (username, f'{username}@example.com', username, role, faculty_id['id']))
+            ids.append(cursor.lastrowid)
+        conn.execute('''
+            INSERT INTO user_permissions (user_id, resource_type, resource_id, permission)
+            VALUES (?, 'news', 5, 'news_edit')
+        ''', (ids[1],))
+        conn.commit()
+    yield {'dean': ids[0], 'lecturer': ids[1], 'college_id': faculty_id['college_id']}
+    configure_pool()
+
+class TestPrincipalCache:
+    def test_principal_includes_grants_and_ancestry(self, users):
+        """The principal carries role permissions, explicit grants and the user's college"""
+        with Flask(__name__).app_context():
+            dean = get_principal(users['dean'])
+            assert dean.ancestor_college_id == users['college_id']
+            assert dean.has_role_permission('department_manage')
+            assert has_permission(users['lecturer'], 'news_edit', 'news', 5)
+            assert not has_permission(users['lecturer'], 'news_edit', 'news', 6)
+
+    def test_principal_resolved_once_per_request(self, users):
+        """Repeated checks in one request reuse the principal stored on g"""
+        before = principal_cache.stats()
+        with Flask(__name__).app_context():
+            assert can_manage_user(users['dean'], users['lecturer'])
+            has_permission(users['dean'], 'news_manage')
+            has_permission(str(users['dean']), 'files_manage')
+            assert principal_cache.stats()['misses'] - before['misses'] == 2
+
+        with Flask(__name__).app_context():
+            get_principal(users['dean'])
+            assert principal_cache.stats()['hits'] - before['hits'] == 1
+
+    def test_invalidation_after_role_change(self, users):
+        """A role update is visible as soon as the principal is invalidated"""
+        with Flask(__name__).app_context():
+            assert has_permission(users['lecturer'], 'read_only')
+
+        with get_db_connection() as conn:
+            conn.execute("UPDATE users SET role = 'editor' WHERE id = ?", (users['lecturer'],))
+            conn.commit()
+
+        with Flask(__name__).app_context():
+            assert has_permission(users['lecturer'], 'read_only')
+            invalidate_principal(users['lecturer'])
+            assert not has_permission(users['lecturer'], 'read_only')
+            assert has_permission(users['lecturer'], 'news_create')
+
+    def test_ancestry_does_not_widen_scope(self, users):
+        """A faculty-only user is not treated as a member of the faculty's college"""
+        with get_db_connection() as conn:
+            cursor = conn.execute('''
+                INSERT INTO users (username, email, password_hash, name, role, college_id)
+                VALUES ('provost', 'provost@example.com', 'x', 'provost', 'college_admin', ?)
+            ''', (users['college_id'],))
+            provost = cursor.lastrowid
+            conn.execute("UPDATE users SET role = 'college_admin' WHERE id = ?", (users['dean'],))
+            conn.commit()
+
+        with Flask(__name__).app_context():
+            dean = get_principal(users['dean'])
+            assert dean.college_id is None
+            assert dean.ancestor_college_id == users['college_id']
+            assert not has_permission(users['dean'], 'edit', 'college', users['college_id'])
+            assert not can_manage_user(users['dean'], provost)
+            assert not can_manage_user(provost, users['lecturer'])
@@ -0,0 +1,99 @@
+import pytest
+from flask import Flask, jsonify
+from app.database import configure_pool, get_db_connection
+from app.utils.profiling import fingerprint, get_profiler, init_app
+
+@pytest.fixture
+def client(tmp_path):
+    configure_pool(str(tmp_path / 'profiling.db'))
+    with get_db_connection() as conn:
+        conn.execute('CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)')
+        conn.execute('CREATE TABLE item_log (item_id INTEGER)')
+        conn.execute('CREATE TRIGGER items_log AFTER INSERT ON items BEGIN INSERT INTO item_log VALUES (new.id); END')
+        conn.executemany('INSERT INTO items (name) VALUES (?)', [(f'item {i}',) for i in range(12)])
+        conn.commit()
+
+    app = Flask(__name__)
+    app.config.update(PROFILING_ENABLED=True, PROFILING_N_PLUS_ONE_THRESHOLD=10)
+    init_app(app)
+
+    @app.route('/items')
+    def items():
+        with get_db_connection() as conn:
+            ids = [row['id'] for row in conn.execute('SELECT id FROM items ORDER BY id')]
+            names = [conn.execute('SELECT name FROM items WHERE id = ?', (item_id,)).fetchone()['name']
+                     for item_id in ids]
+        return jsonify(names)
+
+    @app.route('/broken')
+    def broken():
+        try:
+            with get_db_connection() as conn:
+                conn.execute('SELECT * FROM missing_table').fetchall()
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+    yield app.test_client()
+    configure_pool()
+
+class TestFingerprint:
+    def test_literals_are_normalised(self):
+        """Statements differing only in literals, spacing or IN-list length share a fingerprint"""
+        assert fingerprint("SELECT * FROM news  WHERE id = 42 AND title = 'it''s'") == \
+            fingerprint('SELECT * FROM news WHERE id = ? AND title = ?')
+        assert fingerprint('SELECT 1 FROM t WHERE id IN (?, ?, ?)') == 'SELECT ? FROM t WHERE id IN (...)'
+        assert fingerprint('SELECT * FROM page_view_rollups_daily') == 'SELECT * FROM page_view_rollups_daily'
+
+class TestProfiler:
+    def test_server_timing_and_n_plus_one(self, client):
+        """A loop of per-row lookups is flagged and the timing breakdown is sent as Server-Timing"""
+        response = client.get('/items')
+        assert response.status_code == 200
+        header = response.headers['Server-Timing']
+        for metric in ('db;dur=', 'desc="13 queries"', 'connect;dur=', 'serialize;dur=', 'app;dur=', 'total;dur='):
+            assert metric in header
+
+        stats = get_profiler().stats()
+        endpoint = stats['endpoints']['GET /items']
+        assert endpoint['requests'] == 1
+        assert endpoint['avg_queries'] == 13
+        assert stats['n_plus_one'] == [{
+            'endpoint': 'GET /items', 'fingerprint': 'SELECT name FROM items WHERE id = ?',
+            'requests': 1, 'max_repeats': 12, 'last_seen': stats['n_plus_one'][0]['last_seen']
+        }]
+        lookup = next(q for q in stats['slowest_queries'] if q['fingerprint'] == 'SELECT name FROM items WHERE id = ?')
+        assert lookup['calls'] == 12
+
+    def test_swallowed_errors_are_recorded(self, client):
+        """SQL errors a route turns into a JSON 500 still show up against the endpoint and query"""
+        assert client.get('/broken').status_code == 500
+
+        stats = get_profiler().stats()
+        assert stats['endpoints']['GET /broken']['errors'] == 1
+        assert 'no such table: missing_table' in stats['endpoints']['GET /broken']['last_error']
+        assert stats['slowest_queries'][0]['errors'] == 1
+
+    def test_trace_counts_trigger_statements(self, client):
+        """Statements SQLite runs on its own (executemany rows, trigger bodies) are counted by the trace"""
+        app = client.application
+
+        @app.route('/bulk', methods=['POST'])
+        def bulk():
+            with get_db_connection() as conn:
+                conn.executemany('INSERT INTO items (name) VALUES (?)', [('a',), ('b',), ('c',)])
+                conn.commit()
+            return jsonify({'ok': True})
+
+        client.post('/bulk')
+        endpoint = get_profiler().stats()['endpoints']['POST /bulk']
+        assert endpoint['avg_queries'] == 1
+        # 3 inserts + 3 trigger firings + their 3 inner inserts + COMMIT
+        assert endpoint['avg_statements'] >= 9
+
+    def test_unsampled_requests_are_untouched(self, client):
+        """With a zero sample rate nothing is recorded and no header is added"""
+        get_profiler().sample_rate = 0.0
+        response = client.get('/items')
+
+        assert 'Server-Timing' not in response.headers
+        assert get_profiler().stats()['sampled_requests'] == 0
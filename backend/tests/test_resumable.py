@@ -0,0 +1,84 @@
+import hashlib
+import io
+import pytest
+from app.database import configure_pool, get_db_connection, init_db
+from app.utils.resumable import ResumableUploads, UploadSessionError
+
+CONTENT = b'%PDF-1.7\n' + bytes(range(256)) * 40
+
+@pytest.fixture
+def uploads(tmp_path):
+    configure_pool(str(tmp_path / 'sessions.db'))
+    init_db()
+    manager = ResumableUploads(chunk_size=4096, max_size=len(CONTENT) * 2)
+    manager.root = str(tmp_path)
+    yield manager
+    configure_pool()
+
+def send(manager, session_id, offset, data, length=None):
+    with get_db_connection() as conn:
+        session = manager.get(conn, session_id, 1)
+        return manager.append(conn, manager.root, session, offset, io.BytesIO(data),
+                              len(data) if length is None else length)
+
+def finish(manager, session_id):
+    with get_db_connection() as conn:
+        session = manager.get(conn, session_id, 1)
+        path, digest, size = manager.complete(conn, manager.root, session)
+        conn.commit()
+    with open(path, 'rb') as f:
+        return f.read(), digest, size
+
+class TestResumableUploads:
+    def test_chunks_assemble_with_incremental_hash(self, uploads):
+        """Chunks written in order produce the file and its SHA-256"""
+        with get_db_connection() as conn:
+            session = uploads.create(conn, uploads.root, 1, 'lecture.pdf', 'pdf', len(CONTENT))
+
+        offset = 0
+        while offset < len(CONTENT):
+            offset = send(uploads, session['id'], offset, CONTENT[offset:offset + 4096])
+
+        data, digest, size = finish(uploads, session['id'])
+        assert data == CONTENT
+        assert digest == hashlib.sha256(CONTENT).hexdigest()
+        assert size == len(CONTENT)
+
+    def test_resume_after_dropped_chunk(self, uploads):
+        """A short chunk advances the offset by what arrived and wrong offsets are refused"""
+        with get_db_connection() as conn:
+            session = uploads.create(conn, uploads.root, 1, 'lecture.pdf', 'pdf', len(CONTENT))
+
+        # The connection drops after 1000 of 4096 declared bytes
+        assert send(uploads, session['id'], 0, CONTENT[:1000], length=4096) == 1000
+        with pytest.raises(UploadSessionError) as error:
+            send(uploads, session['id'], 4096, CONTENT[4096:8192])
+        assert error.value.status == 409
+        assert error.value.offset == 1000
+
+        # Another worker (no in-memory hash state) takes over the rest
+        other = ResumableUploads(chunk_size=8192, max_size=uploads.max_size)
+        other.root = uploads.root
+        send(other, session['id'], 1000, CONTENT[1000:9000])
+        send(other, session['id'], 9000, CONTENT[9000:])
+        data, digest, _ = finish(other, session['id'])
+        assert data == CONTENT
+        assert digest == hashlib.sha256(CONTENT).hexdigest()
+
+    def test_validation(self, uploads):
+        """Oversized files, oversized chunks and mismatched content are rejected"""
+        with get_db_connection() as conn:
+            with pytest.raises(UploadSessionError) as error:
+                uploads.create(conn, uploads.root, 1, 'huge.pdf', 'pdf', uploads.max_size + 1)
+            assert error.value.status == 413
+            session = uploads.create(conn, uploads.root, 1, 'fake.pdf', 'pdf', len(CONTENT))
+
+        with pytest.raises(UploadSessionError) as error:
+            send(uploads, session['id'], 0, b'MZ' + CONTENT[:100])
+        assert error.value.status == 415
+        with pytest.raises(UploadSessionError) as error:
+            send(uploads, session['id'], 0, CONTENT[:5000])
+        assert error.value.status == 413
+        with pytest.raises(UploadSessionError) as error:
+            finish(uploads, session['id'])
+        assert error.value.status == 409
@@ -0,0 +1,68 @@
+import pytest
+from app.database import configure_pool, get_db_connection, init_db
+from app.utils.search import NEWS_SEARCH_RANK, NEWS_SEARCH_SNIPPET, build_match_query
+
+@pytest.fixture
+def db(tmp_path):
+    """Point the connection pool at a fresh, fully initialised database."""
+    configure_pool(str(tmp_path / 'search.db'))
+    init_db()
+    yield
+    configure_pool()
+
+def add_news(conn, title, content, **fields):
+    columns = ['title', 'content', 'author_id', 'author_name'] + list(fields)
+    values = [title, content, 1, 'admin'] + list(fields.values())
+    cursor = conn.execute(
+        f"INSERT INTO news ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})", values
+    )
+    return cursor.lastrowid
+
+def search(conn, text):
+    return [row[0] for row in conn.execute(f'''
+        SELECT news.id FROM news JOIN news_fts ON news_fts.rowid = news.id
+        WHERE news_fts MATCH ? ORDER BY {NEWS_SEARCH_RANK}
+    ''', (build_match_query(text),))]
+
+class TestNewsSearch:
+    def test_match_query_is_sanitized(self):
+        """User input becomes quoted prefix terms with no FTS operators"""
+        assert build_match_query('Université "AI" OR -x') == '"Université"* "AI"* "OR"* "x"*'
+        assert build_match_query('  ') == ''
+
+    def test_all_language_variants_are_indexed(self, db):
+        """Arabic and French fields, excerpts and tags are searchable"""
+        with get_db_connection() as conn:
+            arabic = add_news(conn, 'Opening', 'Body', title_ar='افتتاح المكتبة')
+            french = add_news(conn, 'Event', 'Body', content_fr='La bibliothèque universitaire')
+            tagged = add_news(conn, 'Notice', 'Body', tags='["robotics"]')
+            conn.commit()
+
+            assert search(conn, 'المكتبة') == [arabic]
+            assert search(conn, 'bibliotheque') == [french]
+            assert search(conn, 'robot') == [tagged]
+
+    def test_title_matches_rank_first(self, db):
+        """BM25 weights put title hits ahead of body-only hits"""
+        with get_db_connection() as conn:
+            body = add_news(conn, 'Weekly digest', 'Notes about the hackathon schedule')
+            title = add_news(conn, 'Hackathon results', 'Winners announced')
+            conn.commit()
+
+            assert search(conn, 'hackathon') == [title, body]
+            snippet = conn.execute(
+                f'SELECT {NEWS_SEARCH_SNIPPET} FROM news_fts WHERE news_fts MATCH ?',
+                (build_match_query('winners'),)
+            ).fetchone()[0]
+            assert '<mark>Winners</mark>' in snippet
+
+    def test_triggers_keep_index_in_sync(self, db):
+        """Edits and deletes are reflected in the index immediately"""
+        with get_db_connection() as conn:
+            news_id = add_news(conn, 'Old headline', 'Body')
+            conn.execute("UPDATE news SET title = 'New headline' WHERE id = ?", (news_id,))
+            assert search(conn, 'old') == []
+            assert search(conn, 'new') == [news_id]
+
+            conn.execute('DELETE FROM news WHERE id = ?', (news_id,))
+            assert search(conn, 'headline') == []
@@ -0,0 +1,87 @@
+import os
+import threading
+import time
+import pytest
+from PIL import Image
+from app.utils.transforms import InvalidTransformError, SingleFlight, TransformCache
+
+@pytest.fixture
+def photo(tmp_path):
+    path = tmp_path / 'photo.jpg'
+    Image.new('RGB', (1200, 800), (20, 120, 200)).save(path, 'JPEG')
+    return str(path)
+
+class TestTransformCache:
+    def test_parse_whitelist(self):
+        """Only whitelisted sizes and supported formats are accepted"""
+        cache = TransformCache(sizes=(150, 320))
+        assert cache.parse({}) is None
+        assert cache.parse({'w': '320'}, 'jpg') == (320, None, 'jpeg')
+        assert cache.parse({'w': '150', 'h': '150', 'fmt': 'webp'}) == (150, 150, 'webp')
+        for args in ({'w': '333'}, {'w': 'big'}, {'w': '150', 'fmt': 'bmp'}):
+            with pytest.raises(InvalidTransformError):
+                cache.parse(args)
+
+    def test_unwritable_source_format_falls_back(self):
+        """A resize of a GIF is served in a writable format instead of being rejected"""
+        assert TransformCache(sizes=(320,)).parse({'w': '320'}, 'gif') == (320, None, 'webp')
+        cache = TransformCache(sizes=(320,), formats=('jpeg', 'png'))
+        assert cache.parse({'w': '320'}, 'gif') == (320, None, 'png')
+        with pytest.raises(InvalidTransformError):
+            cache.parse({'w': '320', 'fmt': 'gif'}, 'gif')
+
+    def test_renders_once_then_hits(self, photo, tmp_path):
+        """A variant is rendered on the first request and read from disk afterwards"""
+        cache = TransformCache(str(tmp_path / 'cache'), sizes=(320, 150))
+        relative = cache.get(photo, 'photo', 320, None, 'webp')
+        assert cache.get(photo, 'photo', 320, None, 'webp') == relative
+        with Image.open(os.path.join(cache.root, relative)) as img:
+            assert (img.format, img.size) == ('WEBP', (320, 213))
+
+        cropped = cache.get(photo, 'photo', 150, 150, 'jpeg')
+        with Image.open(os.path.join(cache.root, cropped)) as img:
+            assert img.size == (150, 150)
+        stats = cache.stats()
+        assert (stats['hits'], stats['misses'], stats['entries']) == (1, 2, 2)
+
+    def test_evicts_least_recently_used_past_cap(self, photo, tmp_path):
+        """Past the byte cap the least recently used variant is deleted"""
+        cache = TransformCache(str(tmp_path / 'cache'), sizes=(64,))
+        first = cache.get(photo, 'a', 64, None, 'png')
+        second = cache.get(photo, 'b', 64, None, 'png')
+        cache.max_bytes = cache.stats()['bytes']
+        cache.get(photo, 'a', 64, None, 'png')  # first is now the most recent
+        third = cache.get(photo, 'c', 64, None, 'png')
+
+        assert not os.path.exists(os.path.join(cache.root, second))
+        assert os.path.exists(os.path.join(cache.root, first))
+        assert os.path.exists(os.path.join(cache.root, third))
+        assert cache.stats()['evictions'] == 1
+
+class TestSingleFlight:
+    def test_concurrent_callers_share_one_call(self):
+        """Callers arriving while a render is running wait for it instead of rendering again"""
+        flights = SingleFlight()
+        calls = []
+        started = threading.Event()
+
+        def render():
+            calls.append(1)
+            started.set()
+            time.sleep(0.1)
+            return 'done'
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(flights.do('key', render)))
+        leader.start()
+        started.wait()
+        followers = [threading.Thread(target=lambda: results.append(flights.do('key', render)))
+                     for _ in range(3)]
+        for thread in followers:
+            thread.start()
+        for thread in [leader] + followers:
+            thread.join()
+
+        assert results == ['done'] * 4
+        assert len(calls) == 1
+        assert flights.shared == 3
@@ -0,0 +1,123 @@
+import io
+import pytest
+from flask_jwt_extended import create_access_token
+from PIL import Image
+from app import create_app, limiter
+from app.routes import uploads as uploads_routes
+from app.database import configure_pool, get_db_connection
+from app.utils.images import get_image_processor
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('UPLOAD_FOLDER', str(tmp_path / 'uploads'))
+    monkeypatch.setenv('IMAGE_WORKERS', '0')
+    app = create_app('testing')
+    limiter.enabled = False
+    with app.app_context():
+        token = create_access_token(identity='1', additional_claims={'role': 'super_admin'})
+    client = app.test_client()
+    client.auth = {'Authorization': f'Bearer {token}'}
+    yield client
+    limiter.enabled = True
+    configure_pool()
+
+def png_bytes(color=(10, 120, 200)):
+    buffer = io.BytesIO()
+    Image.new('RGB', (40, 30), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+def upload(client, kind, name, content):
+    response = client.post(f'/api/uploads/{kind}', headers=client.auth,
+                           data={'file': (io.BytesIO(content), name)}, content_type='multipart/form-data')
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()
+
+class TestServeUploads:
+    def test_documents_are_not_reachable_through_public_routes(self, client):
+        """A document's blob is only served from the authenticated documents route"""
+        document = upload(client, 'document', 'secret.pdf', b'%PDF-1.4 private minutes')
+        name = document['filename']
+
+        assert client.get(f'/api/uploads/documents/{name}').status_code == 401
+        response = client.get(f'/api/uploads/documents/{name}', headers=client.auth)
+        assert response.status_code == 200
+        assert 'private' in response.headers['Cache-Control']
+
+        for folder in ('images', 'avatars'):
+            assert client.get(f'/api/uploads/{folder}/{name}').status_code == 404
+            assert client.get(f'/api/uploads/{folder}/{name}?w=64').status_code == 404
+
+    def test_blob_shared_with_a_document_is_never_publicly_cached(self, client):
+        """The same bytes uploaded as an image stay servable but not as a public immutable file"""
+        image = upload(client, 'image', 'photo.png', png_bytes())
+        response = client.get(image['url'])
+        assert response.status_code == 200
+        assert response.headers['Cache-Control'].startswith('public')
+
+        upload(client, 'document', 'photo.pdf', png_bytes())
+        response = client.get(image['url'])
+        assert response.status_code == 200
+        assert 'private' in response.headers['Cache-Control']
+
+class TestImageUploads:
+    def test_metadata_is_stripped_and_size_bounded(self, client):
+        """Published images are re-encoded without EXIF/GPS, upright and within IMAGE_MAX_DIMENSION"""
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: rotate 90 degrees clockwise
+        exif[0x8825] = {1: 'N', 2: (36.0, 49.0, 12.0)}  # GPS latitude
+        buffer = io.BytesIO()
+        Image.new('RGB', (3000, 1000), (200, 30, 30)).save(buffer, 'JPEG', exif=exif)
+
+        image = upload(client, 'image', 'holiday.jpg', buffer.getvalue())
+        assert image['url'].endswith('.jpg')
+        with Image.open(io.BytesIO(client.get(image['url']).get_data())) as published:
+            assert not published.getexif()
+            assert published.size == (683, 2048)
+
+    def test_nothing_is_published_until_processed(self, client, monkeypatch):
+        """The uploaded file is never served; the clean copy and the avatar appear once the job is ready"""
+        queued = []
+
+        class QueuedProcessor:
+            def submit(self, *args):
+                queued.append(args)
+                return 'pending'
+
+        monkeypatch.setattr(uploads_routes, 'get_image_processor', lambda: QueuedProcessor())
+        exif = Image.Exif()
+        exif[0x8825] = {1: 'N', 2: (36.0, 49.0, 12.0)}
+        buffer = io.BytesIO()
+        Image.new('RGB', (64, 48), (20, 160, 90)).save(buffer, 'JPEG', exif=exif)
+
+        avatar = upload(client, 'avatar', 'me.jpg', buffer.getvalue())
+        assert avatar['status'] == 'pending'
+        assert avatar['url'] is None
+        assert client.get(f"/api/uploads/avatars/{avatar['filename']}").status_code == 404
+        assert client.get(f"/api/uploads/avatars/{avatar['filename']}?w=64").status_code == 404
+        with get_db_connection() as conn:
+            assert conn.execute('SELECT avatar_url FROM users WHERE id = 1').fetchone()[0] is None
+
+        assert get_image_processor().submit(*queued[0]) == 'ready'
+        status = client.get(f"/api/uploads/{avatar['id']}/variants", headers=client.auth).get_json()
+        assert status['url'] == f"/api/uploads/avatars/{avatar['filename']}"
+        with Image.open(io.BytesIO(client.get(status['url']).get_data())) as published:
+            assert not published.getexif()
+        with get_db_connection() as conn:
+            assert conn.execute('SELECT avatar_url FROM users WHERE id = 1').fetchone()[0] == status['src']
+
+    def test_undecodable_files_are_rejected(self, client):
+        """Bytes that do not decode as an allowed image are refused before anything is stored"""
+        for kind, name, content in (('image', 'fake.png', b'<script>alert(1)</script>'),
+                                    ('avatar', 'shot.png', png_bytes()[:40])):
+            response = client.post(f'/api/uploads/{kind}', headers=client.auth,
+                                   data={'file': (io.BytesIO(content), name)}, content_type='multipart/form-data')
+            assert response.status_code == 400
+
+        buffer = io.BytesIO()
+        Image.new('RGB', (20, 20)).save(buffer, 'WEBP')
+        response = client.post('/api/uploads/avatar', headers=client.auth,
+                               data={'file': (io.BytesIO(buffer.getvalue()), 'me.png')},
+                               content_type='multipart/form-data')
+        assert response.status_code == 400
+        assert client.get('/api/uploads/my-uploads', headers=client.auth).get_json()['uploads'] == []